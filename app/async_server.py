@@ -0,0 +1,152 @@
+import asyncio
+import io
+import sys
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote_to_bytes
+from aiohttp import web
+from multidict import CIMultiDict
+from wire import BodyTooLarge
+
+# Codificações que o aiohttp já descomprime ao ler o corpo do pedido
+DECODED_ENCODINGS = ("deflate", "gzip")
+
+class RequestBody(io.RawIOBase):
+    """
+    wsgi.input lido a partir de uma thread do pool: cada leitura é uma corrotina
+    entregue ao event loop, pelo que um corpo grande (um PUT /blobs, por exemplo)
+    segue para a app em streaming, sem ficar todo em memória.
+    """
+    def __init__(self, content, loop):
+        self.content = content
+        self.loop = loop
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = asyncio.run_coroutine_threadsafe(self.content.read(len(buffer)), self.loop).result()
+        buffer[:len(data)] = data
+        return len(data)
+
+class AsyncNodeServer:
+    """
+    Modo de serviço assíncrono (aiohttp) do nó: o event loop aceita as ligações, lê
+    os pedidos e envia as respostas em streaming, e as rotas são as da app Flask do
+    nó, chamadas por WSGI num pool de threads. O contrato HTTP é por isso o mesmo
+    (todas as rotas, partições incluídas) e a replicação, o SyncReceiver, o group
+    commit e as esperas do min_index são os componentes partilhados do node.py: uma
+    thread só fica ocupada enquanto a app trata o pedido, e não durante a leitura
+    ou o envio do corpo, nem numa ligação keep-alive parada.
+    """
+    def __init__(self, wsgi_app, workers=64, max_body_bytes=64 * 1024 * 1024):
+        self.wsgi_app = wsgi_app
+        self.workers = workers
+        # Tamanho máximo de um corpo comprimido depois de descomprimido (protege contra bombas de compressão)
+        self.max_body_bytes = max_body_bytes
+        self._executor = None
+
+    def build_app(self):
+        app = web.Application()
+        app.router.add_route("*", "/{path:.*}", self.handle)
+        app.on_startup.append(self._on_startup)
+        app.on_cleanup.append(self._on_cleanup)
+        return app
+
+    def run(self, host="0.0.0.0", port=5000):
+        web.run_app(self.build_app(), host=host, port=port, print=None)
+
+    async def _on_startup(self, app):
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="async-wsgi")
+
+    async def _on_cleanup(self, app):
+        self._executor.shutdown(wait=False)
+
+    @staticmethod
+    async def _read_limited(request, max_length):
+        """
+        Lê o corpo do pedido, que o aiohttp já descomprime, à medida que chega: um
+        corpo que descomprimido exceda max_length dá BodyTooLarge sem ser lido até ao fim.
+        """
+        chunks, size = [], 0
+        async for chunk in request.content.iter_any():
+            size += len(chunk)
+            if size > max_length:
+                raise BodyTooLarge(f"Corpo descomprimido excede o limite de {max_length} bytes")
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    async def _environ(self, request):
+        """Ambiente WSGI do pedido aiohttp (BodyTooLarge se um corpo comprimido exceder o limite)."""
+        host, port = (request.transport.get_extra_info("sockname") or ("localhost", 0))[:2]
+        environ = {
+            "REQUEST_METHOD": request.method,
+            "SCRIPT_NAME": "",
+            # Como nos servidores WSGI, o caminho vai descodificado mas em latin-1 (a app volta a ler UTF-8)
+            "PATH_INFO": unquote_to_bytes(request.raw_path.split("?", 1)[0]).decode("latin-1"),
+            "QUERY_STRING": request.query_string,
+            "SERVER_NAME": str(host),
+            "SERVER_PORT": str(port),
+            "SERVER_PROTOCOL": f"HTTP/{request.version.major}.{request.version.minor}",
+            "REMOTE_ADDR": request.remote or "",
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": request.scheme,
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+            "wsgi.input_terminated": True
+        }
+        decoded = request.headers.get("Content-Encoding", "").strip().lower() in DECODED_ENCODINGS
+        for name, value in request.headers.items():
+            key = name.upper().replace("-", "_")
+            if decoded and key in ("CONTENT_ENCODING", "CONTENT_LENGTH"):
+                continue  # O corpo que a app vai ler já está descomprimido
+            if key not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+                key = f"HTTP_{key}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+        if decoded:
+            body = await self._read_limited(request, self.max_body_bytes)
+            environ["CONTENT_LENGTH"] = str(len(body))
+            environ["wsgi.input"] = io.BytesIO(body)
+        else:
+            environ["wsgi.input"] = io.BufferedReader(RequestBody(request.content, asyncio.get_running_loop()))
+        return environ
+
+    def _start(self, environ):
+        """Chama a app (numa thread do pool) até ela indicar o estado e os cabeçalhos da resposta."""
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started["status"], started["headers"] = status, headers
+        result = self.wsgi_app(environ, start_response)
+        chunks = iter(result)
+        # Uma app pode só chamar start_response ao produzir o primeiro pedaço do corpo
+        first = b"" if started else next(chunks, None)
+        return started["status"], started["headers"], first, chunks, result
+
+    async def handle(self, request):
+        loop = asyncio.get_running_loop()
+        try:
+            environ = await self._environ(request)
+        except BodyTooLarge as e:
+            return web.json_response({"error": str(e)}, status=413)
+        status, headers, first, chunks, result = await loop.run_in_executor(self._executor, self._start, environ)
+        try:
+            code, _, reason = status.partition(" ")
+            response = web.StreamResponse(status=int(code), reason=reason or None, headers=CIMultiDict(headers))
+            await response.prepare(request)
+            chunk = first
+            while chunk is not None:
+                if chunk:
+                    await response.write(chunk)
+                # Os geradores da app (blocos da cache de segmentos, pedaços de blobs) avançam no pool
+                chunk = await loop.run_in_executor(self._executor, next, chunks, None)
+            await response.write_eof()
+            return response
+        except ConnectionResetError:
+            logging.info(f"🔌 O cliente fechou a ligação durante a resposta a {request.method} {request.path}.")
+            raise
+        finally:
+            if hasattr(result, "close"):
+                await loop.run_in_executor(self._executor, result.close)
@@ -0,0 +1,137 @@
+import threading
+import time
+import logging
+from collections import deque
+
+class CommitTicket:
+    """Representa um pedido à espera de ser selado num bloco pelo GroupCommitter."""
+    def __init__(self, documents):
+        self.documents = documents
+        self.block = None
+        self.position = None
+        self.receipt = None
+        self.error = None
+        self._done = threading.Event()
+
+    def resolve(self, block, position, receipt=None):
+        self.block = block
+        self.position = position
+        self.receipt = receipt
+        self._done.set()
+
+    def fail(self, error):
+        # Um pedido já resolvido mantém o seu bloco
+        if self._done.is_set():
+            return
+        self.error = error
+        self._done.set()
+
+    def wait(self, timeout=None):
+        """Espera pelo bloco. Devolve (bloco, posição do primeiro documento, recibo de replicação)."""
+        if not self._done.wait(timeout):
+            raise TimeoutError("O lote não foi selado dentro do prazo")
+        if self.error:
+            raise self.error
+        return self.block, self.position, self.receipt
+
+class GroupCommitter:
+    """
+    Etapa de group-commit do líder: junta os documentos que chegam dentro de uma
+    janela de tempo (ou até ao limite de tamanho) e sela-os num único bloco.
+    Quem submete espera no máximo timeout segundos; se a thread do committer
+    falhar, os pedidos à espera recebem o erro em vez de ficarem bloqueados.
+    """
+    def __init__(self, seal, window_ms=20, max_size=256, timeout=10.0):
+        # seal(documents) cria o bloco com os documentos e devolve (bloco, recibo de replicação)
+        self.seal = seal
+        self.window = window_ms / 1000.0
+        self.max_size = max_size
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._pending = deque()
+        # Pedidos retirados da fila pela thread do committer e ainda não resolvidos
+        self._sealing = []
+        self._thread = None
+
+    def submit(self, documents, timeout=None):
+        """
+        Submete uma lista de documentos e bloqueia até estarem num bloco (no máximo
+        timeout segundos, por omissão o do committer; TimeoutError no fim do prazo).
+        """
+        if len(documents) > self.max_size:
+            raise ValueError(f"O lote excede o limite de {self.max_size} documentos")
+
+        ticket = CommitTicket(documents)
+        with self._cond:
+            self._ensure_started()
+            self._pending.append(ticket)
+            self._cond.notify()
+        try:
+            return ticket.wait(self.timeout if timeout is None else timeout)
+        except TimeoutError:
+            with self._cond:
+                if ticket in self._pending:
+                    # Ainda não foi retirado da fila: já não será selado
+                    self._pending.remove(ticket)
+                    raise
+            raise TimeoutError("O lote não foi confirmado dentro do prazo (pode ainda ser selado)")
+
+    def _ensure_started(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _pending_count(self):
+        return sum(len(ticket.documents) for ticket in self._pending)
+
+    def _next_batch(self):
+        """Espera pela janela de agregação e retira da fila os pedidos do próximo bloco."""
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+
+            deadline = time.monotonic() + self.window
+            while self._pending_count() < self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch, total = [], 0
+            while self._pending and (not batch or total + len(self._pending[0].documents) <= self.max_size):
+                ticket = self._pending.popleft()
+                batch.append(ticket)
+                total += len(ticket.documents)
+            self._sealing = batch
+            return batch
+
+    def _run(self):
+        try:
+            while True:
+                self._commit(self._next_batch())
+        except Exception as e:
+            # A thread vai terminar: ninguém pode ficar à espera de um lote que nunca será selado
+            logging.error(f"❌ Falha no group-commit: {e!r}")
+            with self._cond:
+                self._thread = None
+                stranded = self._sealing + list(self._pending)
+                self._sealing = []
+                self._pending.clear()
+            for ticket in stranded:
+                ticket.fail(RuntimeError(f"Falha no group-commit: {e!r}"))
+
+    def _commit(self, batch):
+        documents = [document for ticket in batch for document in ticket.documents]
+        try:
+            block, receipt = self.seal(documents)
+        except Exception as e:
+            logging.error(f"❌ Falha ao selar lote de {len(documents)} documentos: {e}")
+            for ticket in batch:
+                ticket.fail(e)
+            return
+
+        logging.info(f"📦 Bloco {block.index} selado com {len(documents)} documentos de {len(batch)} pedidos.")
+        position = 0
+        for ticket in batch:
+            ticket.resolve(block, position, receipt)
+            position += len(ticket.documents)
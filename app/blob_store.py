@@ -0,0 +1,166 @@
+import io
+import os
+import json
+import queue
+import hashlib
+import tempfile
+import threading
+import logging
+import requests
+from blockchain import blob_reference
+
+class BlobMismatch(Exception):
+    """O conteúdo recebido não corresponde ao digest anunciado."""
+
+class BlobStore:
+    """
+    Armazenamento local de documentos grandes endereçado pelo conteúdo: cada blob é
+    identificado pelo SHA-256 do seu conteúdo e guardado em pedaços (também
+    endereçados pelo seu SHA-256, pelo que pedaços repetidos só ocupam espaço uma
+    vez) com um manifesto que lista os pedaços e o tamanho total. Os blocos só levam
+    o digest e o tamanho, e o custo dos hashes e da replicação da cadeia deixa de
+    depender do tamanho dos documentos.
+    """
+    def __init__(self, directory=None, chunk_size=1024 * 1024):
+        # Sem diretório (nó só em memória) os blobs ficam num diretório temporário
+        self.directory = directory or tempfile.mkdtemp(prefix="cartorio-blobs-")
+        self.chunk_size = chunk_size
+        self.chunks_path = os.path.join(self.directory, "chunks")
+        self.manifests_path = os.path.join(self.directory, "manifests")
+        os.makedirs(self.chunks_path, exist_ok=True)
+        os.makedirs(self.manifests_path, exist_ok=True)
+
+    def _manifest_file(self, digest):
+        return os.path.join(self.manifests_path, digest[:2], digest + ".json")
+
+    def _chunk_file(self, chunk_digest):
+        return os.path.join(self.chunks_path, chunk_digest[:2], chunk_digest)
+
+    @staticmethod
+    def _write_atomically(path, payload):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temporary_path, "wb") as f:
+            f.write(payload)
+        os.replace(temporary_path, path)
+
+    def has(self, digest):
+        return os.path.exists(self._manifest_file(digest))
+
+    def manifest(self, digest):
+        """Manifesto do blob ({"size", "chunks"}), ou None se não existir localmente."""
+        try:
+            with open(self._manifest_file(digest)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def size(self, digest):
+        manifest = self.manifest(digest)
+        return manifest["size"] if manifest else None
+
+    def put_stream(self, stream, expected_digest=None):
+        """
+        Guarda o conteúdo lido de um objeto com read() (por exemplo, o corpo de um
+        pedido HTTP) sem o carregar todo em memória. Devolve (digest, tamanho).
+        """
+        content_hash = hashlib.sha256()
+        chunks, size = [], 0
+        while True:
+            chunk = _read_full(stream, self.chunk_size)
+            if not chunk:
+                break
+            content_hash.update(chunk)
+            size += len(chunk)
+            chunk_digest = hashlib.sha256(chunk).hexdigest()
+            if not os.path.exists(self._chunk_file(chunk_digest)):
+                self._write_atomically(self._chunk_file(chunk_digest), chunk)
+            chunks.append(chunk_digest)
+
+        digest = content_hash.hexdigest()
+        if expected_digest is not None and digest != expected_digest:
+            # Os pedaços já escritos podem ser partilhados com outros blobs: ficam
+            raise BlobMismatch(f"O conteúdo recebido tem o SHA-256 {digest}, não {expected_digest}")
+        if not self.has(digest):
+            self._write_atomically(self._manifest_file(digest), json.dumps({"size": size, "chunks": chunks}).encode())
+        return digest, size
+
+    def put_bytes(self, content):
+        return self.put_stream(io.BytesIO(content))
+
+    def iter_chunks(self, digest):
+        """Percorre o conteúdo do blob pedaço a pedaço (KeyError se não existir)."""
+        manifest = self.manifest(digest)
+        if manifest is None:
+            raise KeyError(digest)
+        return self._read_chunks(manifest["chunks"])
+
+    def _read_chunks(self, chunk_digests):
+        for chunk_digest in chunk_digests:
+            with open(self._chunk_file(chunk_digest), "rb") as f:
+                yield f.read()
+
+class BlobFetcher:
+    """
+    Obtém de outros nós os blobs referidos por blocos replicados: a pedido (quando
+    um cliente lê um blob que ainda não está cá) ou em bulk, numa thread que vai
+    buscando em segundo plano os blobs dos blocos novos.
+    """
+    def __init__(self, store, get_peer_addresses, timeout=30):
+        self.store = store
+        self.get_peer_addresses = get_peer_addresses
+        self.timeout = timeout
+        self.session = requests.Session()
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def fetch(self, digest, peers=None):
+        """Descarrega o blob do primeiro nó que o tiver. Devolve True se ficou guardado localmente."""
+        if self.store.has(digest):
+            return True
+        for address in peers or self.get_peer_addresses():
+            try:
+                with self.session.get(f"http://{address}/blobs/{digest}", params={"local": 1}, stream=True, timeout=self.timeout) as response:
+                    if response.status_code != 200:
+                        continue
+                    response.raw.decode_content = True
+                    self.store.put_stream(response.raw, expected_digest=digest)
+                logging.info(f"📥 Blob {digest[:16]}... obtido de {address}.")
+                return True
+            except (requests.exceptions.RequestException, BlobMismatch, OSError) as e:
+                logging.warning(f"Não foi possível obter o blob {digest[:16]}... de {address}: {e}")
+        return False
+
+    def on_block(self, block):
+        """Listener da cadeia: pede em segundo plano o blob de um bloco novo que ainda não esteja cá."""
+        # Filtro barato antes de descodificar os dados (corre no escritor da cadeia)
+        if b'"blob"' not in block.data_bytes or not block.index:
+            return
+        reference = blob_reference(block.data)
+        if reference and not self.store.has(reference[0]):
+            self._ensure_started()
+            self._queue.put(reference[0])
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            digest = self._queue.get()
+            if not self.fetch(digest):
+                logging.warning(f"⚠️ Blob {digest[:16]}... indisponível nos outros nós; será obtido quando for pedido.")
+
+def _read_full(stream, size):
+    """Lê até `size` bytes (os streams de rede podem devolver menos por chamada)."""
+    parts, remaining = [], size
+    while remaining > 0:
+        part = stream.read(remaining)
+        if not part:
+            break
+        parts.append(part)
+        remaining -= len(part)
+    return b"".join(parts)
@@ -1,37 +1,241 @@
 import hashlib
 import json
-from datetime import datetime
+import queue
+import re
+import struct
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime, timedelta
 import logging
+from storage import StoredChain
+from validation import SERIAL_VALIDATOR
+from document_index import DocumentIndex
+from merkle import merkle_root, merkle_path, blob_leaf
+from metrics import HASH_SECONDS, BLOCK_CREATE_SECONDS, CHAIN_SYNC_SECONDS
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+# O bloco gênese usa "0" como hash anterior; internamente é representado por b"".
+GENESIS_PREVIOUS_HASH = "0"
+_DIGEST_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+def document_leaf(document):
+    """Calcula a folha de Merkle de um documento (SHA-256 do seu conteúdo)."""
+    return hashlib.sha256(document.encode()).hexdigest()
+
+def blob_reference(data):
+    """
+    (digest, tamanho) do documento guardado no armazenamento de blobs a que o campo
+    `data` de um bloco se refere ({"blob": sha256, "size": bytes}), ou None.
+    """
+    if isinstance(data, dict) and data.keys() == {"blob", "size"} and isinstance(data["blob"], str) \
+            and _DIGEST_PATTERN.fullmatch(data["blob"]) and type(data["size"]) is int and data["size"] >= 0:
+        return data["blob"], data["size"]
+    return None
+
+def data_document_hashes(data):
+    """
+    Hashes SHA-256 dos documentos contidos no campo `data` de um bloco, pela
+    ordem em que aparecem (None nas posições que não contêm um documento). O
+    digest de um blob é o SHA-256 do seu conteúdo, tal como a folha de um documento.
+    """
+    if isinstance(data, str):
+        return [document_leaf(data)]
+    if isinstance(data, dict):
+        reference = blob_reference(data)
+        return [reference[0]] if reference else []
+    if isinstance(data, list):
+        return [_batch_entry_hash(entry) for entry in data]
+    return []
+
+def data_merkle_leaves(data):
+    """
+    Folhas de Merkle (em hexadecimal) do campo `data` de um bloco: o hash de cada
+    documento, exceto numa referência a um blob, cuja folha cobre o digest e o tamanho.
+    """
+    reference = blob_reference(data)
+    if reference:
+        return [blob_leaf(*reference)]
+    return data_document_hashes(data)
+
+def _batch_entry_hash(entry):
+    """
+    SHA-256 do documento de uma entrada de um bloco em lote, ou None se a entrada
+    não tiver exatamente a forma {"document", "leaf"} com a folha certa.
+    """
+    if not isinstance(entry, dict) or entry.keys() != {"document", "leaf"} or not isinstance(entry["document"], str):
+        return None
+    leaf = document_leaf(entry["document"])
+    return leaf if entry["leaf"] == leaf else None
+
+def _digest_from_hex(value):
+    return b"" if value == GENESIS_PREVIOUS_HASH else bytes.fromhex(value)
+
+def _digest_to_hex(digest):
+    return digest.hex() if digest else GENESIS_PREVIOUS_HASH
 
 class Block:
-    """Representa um único bloco na nossa blockchain."""
-    def __init__(self, index, timestamp, data, previous_hash, hash_value=None):
+    """
+    Representa um único bloco na nossa blockchain.
+
+    Para poupar memória, o bloco guarda os hashes como digests de 32 bytes, o
+    timestamp em microssegundos desde a época e os dados já na sua codificação
+    JSON canónica. As conversões para hexadecimal e ISO 8601 só acontecem na
+    fronteira da API (to_dict e as propriedades hash, previous_hash e timestamp).
+
+    Os blocos com raiz de Merkle têm um hash que cobre apenas o cabeçalho (índice,
+    timestamp, hash anterior, raiz e o SHA-256 dos dados canónicos): a raiz permite
+    provar a inclusão de um documento sem o resto do bloco, e o digest dos dados
+    impede que estes sejam alterados sem mudar o hash. Os blocos sem raiz (formato
+    original) continuam a ter o hash sobre os dados completos.
+
+    A época do líder que criou o bloco (0 nos blocos anteriores às épocas) também
+    entra no hash, para que um líder destituído não consiga fazer passar os seus
+    blocos por blocos do líder atual.
+    """
+    __slots__ = ("index", "timestamp_us", "data_bytes", "previous_hash_bytes", "hash_bytes", "merkle_root_bytes", "epoch")
+
+    # Formato binário: índice, timestamp, flags, hash anterior, hash, raiz de Merkle,
+    # seguidos da época (apenas se a flag estiver ativa) e dos dados
+    BINARY_HEADER = struct.Struct(">QqB32s32s32s")
+    BINARY_EPOCH = struct.Struct(">Q")
+    _HAS_PREVIOUS = 0x01
+    _HAS_MERKLE_ROOT = 0x02
+    _HAS_EPOCH = 0x04
+
+    def __init__(self, index, timestamp, data, previous_hash, hash_value=None, merkle_root=None, epoch=0):
         self.index = index
-        self.timestamp = timestamp
-        self.data = data
-        self.previous_hash = previous_hash
-        self.hash = hash_value if hash_value else self.calculate_hash()
+        self.epoch = epoch or 0
+        self.timestamp_us = (timestamp - _EPOCH) // _MICROSECOND if isinstance(timestamp, datetime) else timestamp
+        self.data_bytes = json.dumps(data, sort_keys=True).encode()
+        self.previous_hash_bytes = previous_hash if isinstance(previous_hash, bytes) else _digest_from_hex(previous_hash)
+        if not merkle_root:
+            self.merkle_root_bytes = b""
+        else:
+            self.merkle_root_bytes = merkle_root if isinstance(merkle_root, bytes) else bytes.fromhex(merkle_root)
+        if not hash_value:
+            self.hash_bytes = self.calculate_hash_bytes()
+        else:
+            self.hash_bytes = hash_value if isinstance(hash_value, bytes) else bytes.fromhex(hash_value)
+
+    @property
+    def timestamp(self):
+        return _EPOCH + timedelta(microseconds=self.timestamp_us)
+
+    @property
+    def data(self):
+        return json.loads(self.data_bytes)
+
+    @property
+    def previous_hash(self):
+        return _digest_to_hex(self.previous_hash_bytes)
+
+    @property
+    def hash(self):
+        return self.hash_bytes.hex()
+
+    @property
+    def merkle_root(self):
+        return self.merkle_root_bytes.hex() if self.merkle_root_bytes else None
+
+    @property
+    def data_hash(self):
+        """SHA-256 dos dados canónicos, que entra no cabeçalho dos blocos com raiz de Merkle."""
+        return hashlib.sha256(self.data_bytes).hexdigest()
+
+    def canonical_bytes(self):
+        """
+        Codificação canónica do bloco, byte a byte igual ao json.dumps(sort_keys=True)
+        dos campos do bloco, mas montada a partir dos dados já codificados.
+        """
+        # Os campos aparecem por ordem alfabética: data, data_hash, epoch, index, merkle_root, ...
+        epoch = b'"epoch": ' + str(self.epoch).encode() + b', ' if self.epoch else b""
+        if self.merkle_root_bytes:
+            return b"".join((
+                b'{"data_hash": "', self.data_hash.encode(), b'", ',
+                epoch, b'"index": ', str(self.index).encode(),
+                b', "merkle_root": "', self.merkle_root.encode(),
+                b'", "previous_hash": "', self.previous_hash.encode(),
+                b'", "timestamp": "', self.timestamp.isoformat().encode(), b'"}'
+            ))
+        return b"".join((
+            b'{"data": ', self.data_bytes, b', ', epoch,
+            b'"index": ', str(self.index).encode(),
+            b', "previous_hash": "', self.previous_hash.encode(),
+            b'", "timestamp": "', self.timestamp.isoformat().encode(), b'"}'
+        ))
+
+    def calculate_hash_bytes(self):
+        """Calcula o digest SHA-256 (32 bytes) de um bloco."""
+        started = time.perf_counter()
+        digest = hashlib.sha256(self.canonical_bytes()).digest()
+        HASH_SECONDS.observe(time.perf_counter() - started)
+        return digest
 
     def calculate_hash(self):
         """Calcula o hash SHA-256 de um bloco."""
-        # CORREÇÃO: Usar isoformat para consistência total com to_dict
-        block_string = json.dumps({
+        return self.calculate_hash_bytes().hex()
+
+    def calculate_merkle_root(self):
+        """
+        Recalcula a raiz de Merkle a partir dos documentos do bloco (b"" se alguma
+        entrada for inválida, por exemplo com uma folha errada ou campos a mais).
+        """
+        leaves = data_merkle_leaves(self.data)
+        if not leaves or None in leaves:
+            return b""
+        return merkle_root([bytes.fromhex(leaf) for leaf in leaves])
+
+    def has_valid_hash(self):
+        """Verifica se o hash guardado (e a raiz de Merkle, se existir) corresponde ao conteúdo do bloco."""
+        if self.merkle_root_bytes and self.merkle_root_bytes != self.calculate_merkle_root():
+            return False
+        return self.hash_bytes == self.calculate_hash_bytes()
+
+    def document_hashes(self):
+        """
+        Hashes SHA-256 dos documentos registados no bloco, pela ordem em que
+        aparecem (None nas posições que não contêm um documento).
+        """
+        if self.index == 0:
+            return []
+        return data_document_hashes(self.data)
+
+    def header_dict(self):
+        """
+        Cabeçalho do bloco, suficiente para recalcular o seu hash. Os blocos sem
+        raiz de Merkle só podem ser verificados com os dados, que são incluídos.
+        """
+        header = {
             "index": self.index,
             "timestamp": self.timestamp.isoformat(),
-            "data": self.data,
-            "previous_hash": self.previous_hash
-        }, sort_keys=True).encode()
-        return hashlib.sha256(block_string).hexdigest()
+            "previous_hash": self.previous_hash,
+            "hash": self.hash
+        }
+        if self.merkle_root_bytes:
+            header["merkle_root"] = self.merkle_root
+            header["data_hash"] = self.data_hash
+        else:
+            header["data"] = self.data
+        if self.epoch:
+            header["epoch"] = self.epoch
+        return header
 
     def to_dict(self):
         """Converte o objeto Bloco num dicionário para serialização JSON."""
-        return {
+        block_dict = {
             "index": self.index,
             "timestamp": self.timestamp.isoformat(),
             "data": self.data,
             "previous_hash": self.previous_hash,
             "hash": self.hash
         }
+        if self.merkle_root_bytes:
+            block_dict["merkle_root"] = self.merkle_root
+        if self.epoch:
+            block_dict["epoch"] = self.epoch
+        return block_dict
 
     @staticmethod
     def from_dict(block_dict):
@@ -41,85 +245,545 @@ class Block:
             timestamp=datetime.fromisoformat(block_dict['timestamp']),
             data=block_dict['data'],
             previous_hash=block_dict['previous_hash'],
-            hash_value=block_dict['hash']
+            hash_value=block_dict['hash'],
+            merkle_root=block_dict.get('merkle_root'),
+            epoch=block_dict.get('epoch', 0)
         )
 
-class Blockchain:
-    """Gere a cadeia de blocos, incluindo a sua adição e validação."""
+    def to_bytes(self):
+        """Serialização binária compacta: cabeçalho de largura fixa seguido dos dados canónicos."""
+        flags = (self._HAS_PREVIOUS if self.previous_hash_bytes else 0) | \
+            (self._HAS_MERKLE_ROOT if self.merkle_root_bytes else 0) | \
+            (self._HAS_EPOCH if self.epoch else 0)
+        header = self.BINARY_HEADER.pack(
+            self.index, self.timestamp_us, flags,
+            self.previous_hash_bytes, self.hash_bytes, self.merkle_root_bytes
+        )
+        if self.epoch:
+            header += self.BINARY_EPOCH.pack(self.epoch)
+        return header + self.data_bytes
+
+    @classmethod
+    def from_bytes(cls, payload):
+        """
+        Cria um objeto Bloco a partir da sua serialização binária, sem recodificar os
+        dados. Um payload truncado ou com flags desconhecidas dá ValueError.
+        """
+        try:
+            index, timestamp_us, flags, previous_hash, hash_value, root = cls.BINARY_HEADER.unpack_from(payload)
+            if flags & ~(cls._HAS_PREVIOUS | cls._HAS_MERKLE_ROOT | cls._HAS_EPOCH):
+                raise ValueError(f"Flags desconhecidas: {flags:#04x}")
+            block = cls.__new__(cls)
+            block.index = index
+            block.timestamp_us = timestamp_us
+            data_offset = cls.BINARY_HEADER.size
+            if flags & cls._HAS_EPOCH:
+                block.epoch = cls.BINARY_EPOCH.unpack_from(payload, data_offset)[0]
+                data_offset += cls.BINARY_EPOCH.size
+            else:
+                block.epoch = 0
+        except struct.error as e:
+            raise ValueError(f"Bloco binário inválido: {e}") from e
+        block.data_bytes = bytes(payload[data_offset:])
+        block.previous_hash_bytes = previous_hash if flags & cls._HAS_PREVIOUS else b""
+        block.hash_bytes = hash_value
+        block.merkle_root_bytes = root if flags & cls._HAS_MERKLE_ROOT else b""
+        return block
+
+class ChainGeneration:
+    """
+    A cadeia tal como é vista pelos snapshots publicados entre dois forks. Quando
+    um fork trunca a cadeia, os blocos descartados ficam guardados aqui para quem
+    ainda lê um snapshot anterior. É indexada pelo índice dos blocos: numa cadeia
+    arrancada a partir de um checkpoint, o primeiro bloco guardado é o base_index.
+    """
+    __slots__ = ("chain", "base_index", "discarded_from", "discarded")
+
+    def __init__(self, chain, base_index=0):
+        self.chain = chain
+        self.base_index = base_index
+        self.discarded_from = None
+        self.discarded = []
+
+    def detach(self, start):
+        """Guarda os blocos a partir de start, antes de a cadeia ser truncada (só no escritor)."""
+        self.discarded = self.chain[start - self.base_index:]
+        self.discarded_from = start
+
+    def _is_discarded(self, index):
+        return self.discarded_from is not None and index >= self.discarded_from
+
+    def __getitem__(self, index):
+        try:
+            if index < self.base_index:
+                raise IndexError("Bloco anterior ao checkpoint")
+            block = self.chain[index - self.base_index]
+        except Exception:
+            if not self._is_discarded(index):
+                raise
+        # Verificado depois da leitura: se entretanto houve um fork, o bloco lido pode já ser da cadeia nova
+        if self._is_discarded(index):
+            return self.discarded[index - self.discarded_from]
+        return block
+
+class ChainSnapshot:
+    """
+    Vista imutável da cadeia publicada pelo escritor: a geração da cadeia e o
+    índice do topo nesse momento. Os leitores só tocam nos blocos até tip_index.
+    """
+    __slots__ = ("chain", "tip_index")
+
+    def __init__(self, chain, tip_index):
+        self.chain = chain
+        self.tip_index = tip_index
+
+    def __len__(self):
+        return self.tip_index + 1
+
+    @property
+    def base_index(self):
+        return self.chain.base_index
+
+    @property
+    def tip(self):
+        return self.chain[self.tip_index]
+
+class ChainWriter:
+    """
+    Thread única que aplica, pela ordem de chegada, todas as alterações à cadeia.
+    Quem escreve submete uma função e bloqueia até ao resultado; uma alteração
+    submetida a partir da própria thread do escritor é executada de imediato.
+    """
     def __init__(self):
-        self.chain = [self.create_genesis_block()]
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, function, *args):
+        if threading.current_thread() is self._thread:
+            return function(*args)
+        future = Future()
+        self._ensure_started()
+        self._queue.put((future, function, args))
+        return future.result()
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="chain-writer", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        """Termina a thread do escritor depois de aplicar as alterações já submetidas."""
+        with self._start_lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            future, function, args = item
+            try:
+                future.set_result(function(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+class Blockchain:
+    """
+    Gere a cadeia de blocos, incluindo a sua adição e validação.
+
+    Todas as alterações à cadeia passam por um único escritor (ChainWriter), que
+    publica um ChainSnapshot após cada alteração. As leituras usam o snapshot mais
+    recente sem tomar locks: os blocos até ao topo publicado nunca mudam, exceto
+    num fork, e aí quem ainda lê um snapshot anterior continua a ver os blocos
+    descartados (ChainGeneration).
+
+    Uma cadeia arrancada a partir de um checkpoint começa no bloco do checkpoint
+    (base_index) em vez do bloco gênese; os blocos anteriores não existem localmente.
+    """
+    def __init__(self, store=None, validator=None, document_index=None):
+        self.validator = validator or SERIAL_VALIDATOR
+        # O índice de documentos de uma cadeia reaberta do disco só é construído
+        # (a partir do snapshot, se existir) na primeira consulta.
+        self.document_index = document_index if document_index is not None else DocumentIndex()
+        self._index_ready = False
+        self._index_lock = threading.Lock()
+        # Sem armazenamento a cadeia vive apenas em memória; com um BlockStore é
+        # reaberta a partir do disco e cada bloco novo é persistido no log.
+        if store is None:
+            self.chain = [self.create_genesis_block()]
+        else:
+            self.chain = StoredChain(store, encode=self._encode_block, decode=self._decode_block)
+            if len(self.chain) == 0:
+                self.chain.append(self.create_genesis_block())
+            logging.info(f"Blockchain reaberta do disco com {len(self.chain)} blocos.")
+        # Chamados pelo escritor a cada bloco acrescentado (por exemplo, para criar checkpoints)
+        self._block_listeners = []
+        # Chamados quando blocos já publicados são descartados (fork ou arranque de um checkpoint)
+        self._fork_listeners = []
+        self._writer = ChainWriter()
+        # Acorda quem espera (wait_for_index) a cada nova vista publicada
+        self._published = threading.Condition()
+        self._generation = ChainGeneration(self.chain, self.chain[0].index)
+        self._publish()
+        if store is None:
+            self._ensure_document_index()
+
+    def _publish(self):
+        """Publica (só no escritor) a vista da cadeia que os leitores passam a usar."""
+        self._snapshot = ChainSnapshot(self._generation, self.chain[-1].index)
+        with self._published:
+            self._published.notify_all()
+
+    def wait_for_index(self, index, timeout):
+        """Espera (até timeout segundos) que a cadeia local chegue ao bloco index. Devolve True se chegou."""
+        deadline = time.monotonic() + timeout
+        with self._published:
+            while self.length() - 1 < index:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._published.wait(remaining)
+        return True
+
+    def close(self):
+        """Pára o escritor da cadeia e fecha o armazenamento em disco, se existir."""
+        self._writer.stop()
+        if isinstance(self.chain, StoredChain):
+            self.chain.store.close()
+
+    def snapshot(self):
+        """Vista imutável e consistente da cadeia, obtida sem locks."""
+        return self._snapshot
+
+    def length(self):
+        return len(self._snapshot)
+
+    @property
+    def base_index(self):
+        """Índice do primeiro bloco guardado localmente (0, exceto após arrancar de um checkpoint)."""
+        return self._generation.base_index
+
+    def add_block_listener(self, callback):
+        """Regista callback(bloco), chamado no escritor a cada bloco acrescentado; deve ser rápido."""
+        self._block_listeners.append(callback)
+
+    def add_fork_listener(self, callback):
+        """Regista callback(índice), chamado no escritor quando os blocos a partir de índice são descartados."""
+        self._fork_listeners.append(callback)
+
+    def _notify_fork(self, index):
+        for listener in self._fork_listeners:
+            try:
+                listener(index)
+            except Exception as e:
+                logging.error(f"Erro num listener de forks: {e}")
+
+    def _notify_blocks(self, blocks):
+        for block in blocks:
+            for listener in self._block_listeners:
+                try:
+                    listener(block)
+                except Exception as e:
+                    logging.error(f"Erro num listener de blocos: {e}")
+
+    @staticmethod
+    def _encode_block(block):
+        return block.to_bytes()
+
+    @staticmethod
+    def _decode_block(payload):
+        return Block.from_bytes(payload)
 
     def create_genesis_block(self):
         """Cria o primeiro bloco da cadeia (Bloco Gênese)."""
         genesis_timestamp = datetime(2022, 12, 31, 21, 0, 0)
         return Block(0, genesis_timestamp, "Genesis Block", "0")
 
-    def add_block(self, data):
-        """Cria e adiciona um novo bloco à cadeia."""
+    def _ensure_document_index(self):
+        """Constrói o índice de documentos, retomando do snapshot quando este é compatível."""
+        with self._index_lock:
+            if self._index_ready:
+                return
+            snapshot = self.document_index.read_snapshot()
+            if snapshot:
+                block = self.get_block(snapshot["tip_index"])
+                if block is not None and block.hash == snapshot["tip_hash"]:
+                    self.document_index.load_snapshot(snapshot)
+                    logging.info(f"Índice de documentos carregado do snapshot (bloco {snapshot['tip_index']}).")
+            if self.document_index.tip_index < self.base_index > 0:
+                logging.warning("Sem snapshot do índice de documentos anterior ao checkpoint: os documentos anteriores não serão encontrados.")
+            # Blocos acrescentados durante a construção também são apanhados por este ciclo
+            while self.document_index.tip_index < self._snapshot.tip_index:
+                for block in self.iter_blocks(max(self.document_index.tip_index + 1, self.base_index)):
+                    self.document_index.add_block(block)
+            self._index_ready = True
+
+    def document_index_snapshot(self):
+        """Snapshot do índice de documentos (construindo-o, se ainda não existir)."""
+        self._ensure_document_index()
+        return self.document_index.to_snapshot()
+
+    def _index_block(self, block):
+        with self._index_lock:
+            if self._index_ready:
+                self.document_index.add_block(block)
+
+    def find_document(self, doc_hash):
+        """Localiza um documento pelo seu SHA-256 (hexadecimal) em tempo constante."""
+        self._ensure_document_index()
+        location = self.document_index.lookup(doc_hash)
+        if location is None:
+            return None
+        block_index, position = location
+        # Um documento anterior ao checkpoint de arranque está num bloco que não existe localmente
+        block = self.get_block(block_index)
+        return {"block_index": block_index, "position": position, "block_hash": block.hash if block else None}
+
+    def get_proof(self, block_index, position, to_index=None, max_headers=1000):
+        """
+        Prova de inclusão de um documento: o caminho de Merkle até à raiz do bloco e
+        os cabeçalhos dos blocos seguintes (até to_index, por omissão o topo), que
+        ligam o bloco ao topo da cadeia pelos hashes anteriores.
+        """
+        block = self.get_block(block_index)
+        if block is None:
+            raise LookupError("Bloco inexistente")
+        doc_hashes = block.document_hashes()
+        if not 0 <= position < len(doc_hashes):
+            raise LookupError("Posição inexistente no bloco")
+        if not block.merkle_root_bytes:
+            raise ValueError("O bloco não tem raiz de Merkle (formato antigo)")
+
+        tip_index = self._snapshot.tip_index
+        to_index = tip_index if to_index is None else min(to_index, tip_index)
+        last_index = min(to_index, block_index + max_headers)
+        data = block.data
+        proof = {
+            "doc_hash": doc_hashes[position],
+            "block_index": block_index,
+            "position": position,
+            "merkle_path": merkle_path([bytes.fromhex(leaf) for leaf in data_merkle_leaves(data)], position),
+            "header": block.header_dict(),
+            "headers": [b.header_dict() for b in self.iter_blocks(block_index + 1, max(0, last_index - block_index))],
+            "complete": last_index == to_index
+        }
+        reference = blob_reference(data)
+        if reference:
+            # A folha de um blob é blob_leaf(doc_hash, blob_size)
+            proof["blob_size"] = reference[1]
+        return proof
+
+    def get_head(self):
+        """Devolve o índice e o hash do último bloco da cadeia."""
+        last_block = self._snapshot.tip
+        return {"index": last_block.index, "hash": last_block.hash}
+
+    def iter_blocks(self, from_index=0, limit=None):
+        """Percorre um intervalo de blocos sem copiar a cadeia, sobre o snapshot do momento da chamada."""
+        snapshot = self._snapshot
+        end = len(snapshot) if limit is None else min(len(snapshot), from_index + limit)
+        for i in range(max(from_index, snapshot.base_index), end):
+            yield snapshot.chain[i]
+
+    def add_block(self, data, epoch=0):
+        """
+        Cria e adiciona um novo bloco à cadeia, com a raiz de Merkle dos seus
+        documentos e a época do líder que o cria.
+        """
+        started = time.perf_counter()
+        # A raiz de Merkle é calculada por quem escreve; só o encadeamento passa pelo escritor
+        leaves = data_merkle_leaves(data)
+        root = merkle_root([bytes.fromhex(leaf) for leaf in leaves]) if leaves and None not in leaves else None
+        new_block = self._writer.submit(self._append_new_block, data, root, epoch)
+        BLOCK_CREATE_SECONDS.labels("batch" if isinstance(data, list) else "single").observe(time.perf_counter() - started)
+        return new_block
+
+    def _append_new_block(self, data, root, epoch):
         last_block = self.chain[-1]
         new_block = Block(
             index=last_block.index + 1,
             timestamp=datetime.now(),
             data=data,
-            previous_hash=last_block.hash
+            previous_hash=last_block.hash_bytes,
+            merkle_root=root,
+            epoch=epoch
         )
         self.chain.append(new_block)
+        self._publish()
+        self._index_block(new_block)
+        self._notify_blocks((new_block,))
         return new_block
+
+    def add_batch_block(self, documents, epoch=0):
+        """
+        Cria um único bloco com vários documentos. O campo `data` passa a ser uma
+        lista ordenada em que cada documento leva a sua folha de Merkle.
+        """
+        data = [{"document": document, "leaf": document_leaf(document)} for document in documents]
+        return self.add_block(data, epoch)
     
     def add_replicated_block(self, new_block):
         """Adiciona um bloco recebido do líder após validação."""
+        # O hash é verificado fora do escritor; lá dentro só se confirma o encadeamento
+        if not new_block.has_valid_hash():
+            return False, "Hash do bloco inválido"
+        return self._writer.submit(self._append_replicated_block, new_block)
+
+    def _append_replicated_block(self, new_block):
         last_block = self.chain[-1]
         
         if new_block.index != last_block.index + 1:
             return False, "Índice inválido"
             
-        if new_block.previous_hash != last_block.hash:
+        if new_block.previous_hash_bytes != last_block.hash_bytes:
             return False, f"Hash anterior inválido. Esperado: {last_block.hash}, Recebido: {new_block.previous_hash}"
-            
-        if new_block.hash != new_block.calculate_hash():
-            return False, "Hash do bloco inválido"
-            
+
+        if new_block.epoch < last_block.epoch:
+            return False, f"Época do líder obsoleta ({new_block.epoch} < {last_block.epoch})"
+
         self.chain.append(new_block)
+        self._publish()
+        self._index_block(new_block)
+        self._notify_blocks((new_block,))
         return True, "Bloco adicionado com sucesso"
 
     @staticmethod
-    def is_chain_valid(chain_of_blocks):
+    def is_chain_valid(chain_of_blocks, validator=None):
         """Valida uma cadeia de blocos completa."""
         genesis_block = chain_of_blocks[0]
-        if genesis_block.index != 0 or genesis_block.previous_hash != "0":
+        if genesis_block.index != 0 or genesis_block.previous_hash_bytes:
             return False
+        return Blockchain.is_suffix_valid(genesis_block, chain_of_blocks[1:], validator)
 
-        for i in range(1, len(chain_of_blocks)):
-            current_block = chain_of_blocks[i]
-            previous_block = chain_of_blocks[i - 1]
+    @staticmethod
+    def is_suffix_valid(anchor_block, suffix_blocks, validator=None):
+        """Valida uma sequência de blocos que deve continuar a partir de anchor_block."""
+        return (validator or SERIAL_VALIDATOR).find_invalid(anchor_block, suffix_blocks) is None
 
-            if current_block.hash != current_block.calculate_hash():
-                return False
-            if current_block.previous_hash != previous_block.hash:
-                return False
-            if current_block.index != previous_block.index + 1:
-                return False
-        return True
+    def get_block(self, index):
+        """Devolve o bloco com o índice dado, ou None se não existir localmente."""
+        snapshot = self._snapshot
+        if snapshot.base_index <= index < len(snapshot):
+            return snapshot.chain[index]
+        return None
 
-    def replace_chain(self, new_chain_dicts):
+    def append_suffix(self, ancestor_index, suffix_dicts):
         """
-        Substitui a cadeia local por uma nova se ela for mais longa e válida.
+        Acrescenta os blocos recebidos a seguir ao ancestral comum, validando apenas
+        esse sufixo (dicionários ou blocos já descodificados do formato binário).
+        Se o ancestral não for o topo local (fork), a cadeia local é truncada até
+        ele, desde que a cadeia resultante seja mais longa.
         """
-        if len(new_chain_dicts) <= len(self.chain):
+        with CHAIN_SYNC_SECONDS.labels("append_suffix").time():
+            return self._append_suffix(ancestor_index, suffix_dicts)
+
+    def _append_suffix(self, ancestor_index, suffix_dicts):
+        ancestor = self.get_block(ancestor_index)
+        if ancestor is None:
+            return False, "Ancestral comum desconhecido"
+
+        if ancestor_index + 1 + len(suffix_dicts) <= self.length():
             logging.info("A cadeia recebida não é mais longa que a atual.")
             return False, "Cadeia não é mais longa"
 
         try:
-            new_chain = [Block.from_dict(b) for b in new_chain_dicts]
+            suffix = [b if isinstance(b, Block) else Block.from_dict(b) for b in suffix_dicts]
         except Exception as e:
-            logging.error(f"Erro ao converter a cadeia recebida: {e}")
+            logging.error(f"Erro ao converter os blocos recebidos: {e}")
             return False, "Formato de bloco inválido"
 
-        if not self.is_chain_valid(new_chain):
+        # A validação (possivelmente em paralelo) não ocupa o escritor
+        invalid_index = self.validator.find_invalid(ancestor, suffix)
+        if invalid_index is not None:
+            logging.warning(f"Os blocos recebidos são inválidos a partir do bloco {invalid_index}.")
+            return False, "Cadeia inválida"
+        return self._writer.submit(self._apply_suffix, ancestor, suffix)
+
+    def _apply_suffix(self, ancestor, suffix):
+        ancestor_index = ancestor.index
+        tip_index = self.chain[-1].index
+        # A cadeia pode ter mudado desde a validação: o ancestral tem de continuar lá
+        position = ancestor_index - self.base_index
+        if not 0 <= position < len(self.chain) or self.chain[position].hash_bytes != ancestor.hash_bytes:
+            return False, "Ancestral comum desconhecido"
+        if ancestor_index + len(suffix) <= tip_index:
+            logging.info("A cadeia recebida não é mais longa que a atual.")
+            return False, "Cadeia não é mais longa"
+
+        if ancestor_index == tip_index:
+            self.chain.extend(suffix)
+        else:
+            logging.warning(f"Fork detetado: a descartar {tip_index - ancestor_index} blocos locais após o bloco {ancestor_index}.")
+            with self._index_lock:
+                if self._index_ready:
+                    self.document_index.remove_blocks(self.chain[position + 1:], ancestor)
+            self._generation.detach(ancestor_index + 1)
+            del self.chain[position + 1:]
+            self._generation = ChainGeneration(self.chain, self.base_index)
+            self.chain.extend(suffix)
+            self._notify_fork(ancestor_index + 1)
+        self._publish()
+        for block in suffix:
+            self._index_block(block)
+        self._notify_blocks(suffix)
+        logging.info(f"{len(suffix)} blocos acrescentados após o bloco {ancestor_index}.")
+        return True, "Cadeia atualizada com sucesso"
+
+    def replace_chain(self, new_chain_dicts):
+        """
+        Substitui a cadeia local por uma nova se ela for mais longa e válida.
+        Apenas os blocos posteriores ao último bloco em comum são validados.
+        """
+        with CHAIN_SYNC_SECONDS.labels("replace_chain").time():
+            return self._replace_chain(new_chain_dicts)
+
+    def _replace_chain(self, new_chain_dicts):
+        snapshot = self._snapshot
+        if len(new_chain_dicts) <= len(snapshot):
+            logging.info("A cadeia recebida não é mais longa que a atual.")
+            return False, "Cadeia não é mais longa"
+
+        try:
+            # Procura, a partir do topo, o bloco mais alto que as duas cadeias partilham
+            ancestor_index = next(
+                i for i in range(snapshot.tip_index, snapshot.base_index - 1, -1)
+                if new_chain_dicts[i]['hash'] == snapshot.chain[i].hash
+            )
+        except StopIteration:
             logging.warning("A cadeia recebida é inválida.")
             return False, "Cadeia inválida"
+        except (KeyError, TypeError) as e:
+            logging.error(f"Erro ao converter a cadeia recebida: {e}")
+            return False, "Formato de bloco inválido"
+
+        return self.append_suffix(ancestor_index, new_chain_dicts[ancestor_index + 1:])
 
-        logging.info(f"Substituindo a cadeia local ({len(self.chain)} blocos) pela nova ({len(new_chain)} blocos).")
-        self.chain = new_chain
-        return True, "Cadeia substituída com sucesso"
+    def bootstrap(self, checkpoint_block, document_index_snapshot):
+        """
+        Substitui uma cadeia que só tem o bloco gênese pelo bloco de um checkpoint
+        (já verificado), que passa a ser o primeiro bloco local, e carrega o índice
+        de documentos até ele.
+        """
+        return self._writer.submit(self._apply_bootstrap, checkpoint_block, document_index_snapshot)
 
+    def _apply_bootstrap(self, checkpoint_block, document_index_snapshot):
+        if self.chain[-1].index != 0:
+            return False, "A cadeia local já tem blocos"
+        self._generation.detach(0)
+        del self.chain[0:]
+        self.chain.append(checkpoint_block)
+        self._generation = ChainGeneration(self.chain, checkpoint_block.index)
+        self._notify_fork(0)
+        with self._index_lock:
+            self.document_index.load_snapshot(document_index_snapshot)
+            self._index_ready = True
+        self._publish()
+        if self.document_index.snapshot_path:
+            self.document_index.save_snapshot()
+        logging.info(f"📌 Cadeia arrancada a partir do checkpoint do bloco {checkpoint_block.index}.")
+        return True, "Cadeia arrancada a partir do checkpoint"
@@ -0,0 +1,214 @@
+import os
+import hmac
+import json
+import hashlib
+import time
+import threading
+import logging
+import requests
+from blockchain import Block
+
+class InvalidCheckpoint(Exception):
+    """O checkpoint não tem uma assinatura válida ou não corresponde ao seu bloco."""
+
+def encode_document_index(snapshot):
+    """Serialização canónica do snapshot do índice de documentos, cujo SHA-256 é assinado no checkpoint."""
+    return json.dumps(snapshot, sort_keys=True, separators=(",", ":")).encode()
+
+class CheckpointManager:
+    """
+    Checkpoints periódicos da cadeia: o bloco do topo (índice, hash e conteúdo) e o
+    SHA-256 do snapshot do índice de documentos até esse bloco, assinados com
+    HMAC-SHA256 com o segredo partilhado pelo cluster. O checkpoint tem tamanho
+    constante; o snapshot do índice, que cresce com a cadeia, é servido à parte e
+    verificado pelo digest. Um nó novo que confie no checkpoint só precisa de
+    validar os blocos posteriores. Só o líder cria e assina checkpoints: os
+    seguidores vão buscar o do líder e verificam-no antes de o adotar.
+    """
+    def __init__(self, blockchain, secret, node_address, every=10000, path=None,
+                 is_leader=None, get_leader_address=None, fetch_attempts=5, retry_interval=1.0):
+        self.blockchain = blockchain
+        self.secret = secret.encode() if isinstance(secret, str) else secret
+        self.node_address = node_address
+        self.every = every
+        self.path = path
+        # Sem coordenador (um nó isolado) o nó faz de líder
+        self.is_leader = is_leader or (lambda: True)
+        self.get_leader_address = get_leader_address or (lambda: None)
+        # Tentativas (com backoff) de obter o checkpoint do líder, que pode ainda estar a criá-lo
+        self.fetch_attempts = fetch_attempts
+        self.retry_interval = retry_interval
+        # O snapshot do índice fica ao lado do checkpoint (checkpoint.json -> checkpoint.doc_index.json)
+        self.document_index_path = os.path.splitext(path)[0] + ".doc_index.json" if path else None
+        # (checkpoint, checkpoint serializado, snapshot do índice serializado), trocado de uma só vez
+        self._state = (None, None, None)
+        self._requested = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return bool(self.secret) and self.every > 0
+
+    @property
+    def latest(self):
+        return self._state[0]
+
+    def latest_bytes(self):
+        """Último checkpoint já serializado em JSON (ou None)."""
+        return self._state[1]
+
+    def latest_document_index(self):
+        """(checkpoint, snapshot do índice de documentos na serialização canónica) do último checkpoint."""
+        return self._state[0], self._state[2]
+
+    def _signature(self, checkpoint):
+        payload = {key: value for key, value in checkpoint.items() if key != "signature"}
+        message = json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()
+        return hmac.new(self.secret, message, hashlib.sha256).hexdigest()
+
+    def verify(self, checkpoint):
+        """Confirma a assinatura e a coerência do checkpoint; devolve o bloco do checkpoint."""
+        signature = checkpoint.get("signature", "")
+        if not hmac.compare_digest(signature, self._signature(checkpoint)):
+            raise InvalidCheckpoint("Assinatura do checkpoint inválida")
+        block = Block.from_dict(checkpoint["block"])
+        document_index = checkpoint["document_index"]
+        if block.index != checkpoint["index"] or block.hash != checkpoint["hash"] or not block.has_valid_hash():
+            raise InvalidCheckpoint("O bloco do checkpoint não corresponde ao seu hash")
+        if document_index["tip_index"] != block.index or document_index["tip_hash"] != block.hash:
+            raise InvalidCheckpoint("O índice de documentos não corresponde ao bloco do checkpoint")
+        return block
+
+    def verify_document_index(self, checkpoint, payload):
+        """Confirma que o snapshot do índice recebido é o do checkpoint (já verificado); devolve-o."""
+        if hashlib.sha256(payload).hexdigest() != checkpoint["document_index"]["sha256"]:
+            raise InvalidCheckpoint("O snapshot do índice de documentos não corresponde ao checkpoint")
+        return json.loads(payload)
+
+    def fetch(self, address, timeout=30, index_timeout=300):
+        """
+        Obtém e verifica o último checkpoint de outro nó e o snapshot do seu índice de
+        documentos. Devolve (checkpoint, bloco, snapshot serializado, snapshot) ou None
+        se o nó ainda não tiver nenhum; InvalidCheckpoint se não passar na verificação.
+        """
+        response = requests.get(f"http://{address}/snapshot", timeout=timeout)
+        if response.status_code != 200:
+            return None
+        checkpoint = response.json()
+        block = self.verify(checkpoint)
+        # O snapshot do índice de documentos vem à parte e é verificado pelo digest assinado
+        response = requests.get(f"http://{address}/snapshot/document_index", params={"index": block.index}, timeout=index_timeout)
+        response.raise_for_status()
+        document_index = self.verify_document_index(checkpoint, response.content)
+        return checkpoint, block, response.content, document_index
+
+    def follow_leader(self, index):
+        """Num seguidor, adota o checkpoint do líder do bloco index (ou um posterior) se a cadeia local o tiver."""
+        for attempt in range(self.fetch_attempts):
+            if attempt:
+                time.sleep(self.retry_interval * 2 ** (attempt - 1))
+            leader = self.get_leader_address()
+            if not leader or leader == self.node_address:
+                continue
+            try:
+                fetched = self.fetch(leader)
+            except (requests.exceptions.RequestException, ValueError, KeyError, InvalidCheckpoint) as e:
+                logging.warning(f"Checkpoint do líder {leader} recusado ({e}).")
+                continue
+            if fetched is None or fetched[0]["index"] < index:
+                continue
+            checkpoint, block, document_index_bytes, _ = fetched
+            local_block = self.blockchain.get_block(block.index)
+            if local_block is None or local_block.hash != block.hash:
+                logging.warning(f"O checkpoint do líder (bloco {block.index}) não corresponde à cadeia local.")
+                return None
+            self.adopt(checkpoint, document_index_bytes)
+            logging.info(f"📌 Checkpoint do bloco {block.index} obtido do líder {leader}.")
+            return checkpoint
+        return None
+
+    def on_block(self, block):
+        """Chamado pelo escritor da cadeia a cada bloco novo: pede um checkpoint a cada `every` blocos."""
+        if self.enabled and block.index % self.every == 0:
+            self._ensure_started()
+            self._requested.set()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._requested.wait()
+            self._requested.clear()
+            try:
+                if self.is_leader():
+                    self.create()
+                else:
+                    self.follow_leader((self.blockchain.length() - 1) // self.every * self.every)
+            except Exception as e:
+                logging.error(f"❌ Falha ao criar o checkpoint: {e}")
+
+    def create(self):
+        """Cria (fora do escritor da cadeia) um checkpoint no topo do índice de documentos."""
+        document_index = self.blockchain.document_index_snapshot()
+        block = self.blockchain.get_block(document_index["tip_index"])
+        if block is None or block.hash != document_index["tip_hash"]:
+            return None  # A cadeia mudou entretanto (fork); fica para o próximo pedido
+        document_index_bytes = encode_document_index(document_index)
+        checkpoint = {
+            "index": block.index,
+            "hash": block.hash,
+            "block": block.to_dict(),
+            "document_index": {
+                "tip_index": document_index["tip_index"],
+                "tip_hash": document_index["tip_hash"],
+                "documents": len(document_index["entries"]),
+                "sha256": hashlib.sha256(document_index_bytes).hexdigest()
+            },
+            "created_by": self.node_address
+        }
+        checkpoint["signature"] = self._signature(checkpoint)
+        self._set_latest(checkpoint, document_index_bytes)
+        logging.info(f"📌 Checkpoint criado no bloco {block.index} ({len(document_index['entries'])} documentos).")
+        return checkpoint
+
+    def adopt(self, checkpoint, document_index_bytes):
+        """Guarda como o mais recente um checkpoint já verificado (por exemplo, o do arranque)."""
+        self._set_latest(checkpoint, document_index_bytes)
+
+    def _set_latest(self, checkpoint, document_index_bytes):
+        serialized = json.dumps(checkpoint).encode()
+        if self.path:
+            # O índice é gravado primeiro: um checkpoint em disco tem sempre o seu índice
+            self._write_atomically(self.document_index_path, document_index_bytes)
+            self._write_atomically(self.path, serialized)
+        self._state = (checkpoint, serialized, document_index_bytes)
+
+    @staticmethod
+    def _write_atomically(path, payload):
+        temporary_path = path + ".tmp"
+        with open(temporary_path, "wb") as f:
+            f.write(payload)
+        os.replace(temporary_path, path)
+
+    def load(self):
+        """Lê do disco o último checkpoint, se existir e for válido."""
+        if not self.enabled or not self.path or not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, "rb") as f:
+                serialized = f.read()
+            with open(self.document_index_path, "rb") as f:
+                document_index_bytes = f.read()
+            checkpoint = json.loads(serialized)
+            self.verify(checkpoint)
+            self.verify_document_index(checkpoint, document_index_bytes)
+        except (OSError, ValueError, KeyError, InvalidCheckpoint) as e:
+            logging.warning(f"Checkpoint em disco ignorado ({e}).")
+            return None
+        self._state = (checkpoint, serialized, document_index_bytes)
+        return checkpoint
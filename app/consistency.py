@@ -0,0 +1,48 @@
+import re
+
+# Estados de uma cadeia local face a um commit token
+COMMITTED = "committed"   # o bloco do token já está na cadeia local
+BEHIND = "behind"         # a cadeia local ainda não chegou ao índice do token
+DIVERGED = "diverged"     # no índice do token a cadeia local tem outro bloco
+
+def commit_token(block, partition=None):
+    """
+    Commit token devolvido por /register: índice e hash do bloco criado (e a
+    partição, no modo particionado). Uma leitura com min_index=<índice> (e,
+    opcionalmente, min_hash=<hash>) só é servida por um nó que já tenha esse bloco.
+    """
+    token = {"index": block.index, "hash": block.hash}
+    if partition is not None:
+        token["partition"] = partition
+    return token
+
+def parse_min_index(args):
+    """Lê min_index e min_hash dos parâmetros de uma leitura (ValueError se forem inválidos)."""
+    try:
+        min_index = int(args["min_index"])
+    except ValueError:
+        raise ValueError("min_index deve ser um inteiro")
+    if min_index < 0:
+        raise ValueError("min_index não pode ser negativo")
+    min_hash = args.get("min_hash")
+    if min_hash is not None and not re.fullmatch(r"[0-9a-f]{64}", min_hash):
+        raise ValueError("min_hash deve ser um SHA-256 em hexadecimal")
+    return min_index, min_hash
+
+def commit_state(chain, min_index, min_hash=None):
+    if chain.length() - 1 < min_index:
+        return BEHIND
+    if min_hash is not None:
+        block = chain.get_block(min_index)
+        # Antes do checkpoint de arranque o bloco não existe localmente, mas a cadeia passa por ele
+        if block is not None and block.hash != min_hash:
+            return DIVERGED
+    return COMMITTED
+
+def wait_for_commit(chain, min_index, min_hash=None, timeout=0.5):
+    """Espera (até ao prazo) que o bloco do token chegue à cadeia local. Devolve (estado, esperou)."""
+    state = commit_state(chain, min_index, min_hash)
+    if state != BEHIND or timeout <= 0:
+        return state, False
+    chain.wait_for_index(min_index, timeout)
+    return commit_state(chain, min_index, min_hash), True
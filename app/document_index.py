@@ -0,0 +1,83 @@
+import os
+import json
+import threading
+import logging
+
+class DocumentIndex:
+    """
+    Índice de conteúdo da blockchain: SHA-256 de cada documento -> (índice do
+    bloco, posição do documento no bloco). É mantido incrementalmente a cada
+    alteração da cadeia e pode ser guardado num snapshot em disco.
+    """
+    def __init__(self, snapshot_path=None, snapshot_every=10000):
+        self.snapshot_path = snapshot_path
+        self.snapshot_every = snapshot_every
+        self.tip_index = -1
+        self.tip_hash = None
+        self._entries = {}
+        self._snapshot_tip = -1
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def lookup(self, doc_hash):
+        """Devolve (índice do bloco, posição) do primeiro registo do documento, ou None."""
+        return self._entries.get(doc_hash)
+
+    def add_block(self, block):
+        with self._lock:
+            for position, doc_hash in enumerate(block.document_hashes()):
+                # Um documento registado mais do que uma vez aponta para o primeiro registo
+                if doc_hash is not None:
+                    self._entries.setdefault(doc_hash, (block.index, position))
+            self.tip_index = block.index
+            self.tip_hash = block.hash
+        if self.snapshot_path and self.tip_index - self._snapshot_tip >= self.snapshot_every:
+            self.save_snapshot()
+
+    def remove_blocks(self, blocks, new_tip):
+        """Retira do índice os blocos descartados por um fork."""
+        with self._lock:
+            for block in blocks:
+                for doc_hash in block.document_hashes():
+                    if self._entries.get(doc_hash, (None,))[0] == block.index:
+                        del self._entries[doc_hash]
+            self.tip_index = new_tip.index
+            self.tip_hash = new_tip.hash
+
+    def to_snapshot(self):
+        with self._lock:
+            return {
+                "tip_index": self.tip_index,
+                "tip_hash": self.tip_hash,
+                "entries": {doc_hash: list(location) for doc_hash, location in self._entries.items()}
+            }
+
+    def load_snapshot(self, snapshot):
+        with self._lock:
+            self.tip_index = snapshot["tip_index"]
+            self.tip_hash = snapshot["tip_hash"]
+            self._entries = {doc_hash: tuple(location) for doc_hash, location in snapshot["entries"].items()}
+            self._snapshot_tip = self.tip_index
+
+    def save_snapshot(self):
+        """Grava o índice em disco de forma atómica (ficheiro temporário + rename)."""
+        snapshot = self.to_snapshot()
+        temporary_path = self.snapshot_path + ".tmp"
+        with open(temporary_path, "w") as f:
+            json.dump(snapshot, f)
+        os.replace(temporary_path, self.snapshot_path)
+        self._snapshot_tip = snapshot["tip_index"]
+        logging.info(f"💾 Snapshot do índice de documentos gravado até ao bloco {snapshot['tip_index']}.")
+
+    def read_snapshot(self):
+        """Lê o snapshot em disco, se existir."""
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return None
+        try:
+            with open(self.snapshot_path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Snapshot do índice de documentos ilegível ({e}). Será reconstruído.")
+            return None
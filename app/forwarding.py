@@ -0,0 +1,50 @@
+import time
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+
+# Cabeçalho que marca um pedido já reencaminhado, para nunca ser reencaminhado de novo
+FORWARDED_HEADER = "X-Cartorio-Forwarded-By"
+
+class LeaderUnavailable(Exception):
+    """Não foi possível encontrar um líder dentro do prazo (por exemplo, durante uma eleição)."""
+
+class LeaderProxy:
+    """
+    Reencaminha para o líder os pedidos de escrita recebidos por um seguidor,
+    através de um pool de ligações HTTP persistentes. O endereço do líder vem da
+    cache do ZooKeeperCoordinator; enquanto não houver líder (eleição em curso),
+    os pedidos esperam com backoff exponencial até ao prazo.
+    """
+    def __init__(self, node_address, get_leader_address, timeout=15, election_wait=5.0, pool_size=16):
+        self.node_address = node_address
+        self.get_leader_address = get_leader_address
+        self.timeout = timeout
+        self.election_wait = election_wait
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=pool_size))
+
+    def forward(self, path, body):
+        """Envia o pedido ao líder e devolve a sua resposta (requests.Response)."""
+        deadline = time.monotonic() + self.election_wait
+        delay = 0.05
+        while True:
+            leader = self.get_leader_address()
+            if leader and leader != self.node_address:
+                try:
+                    response = self.session.post(
+                        f"http://{leader}{path}", json=body,
+                        headers={FORWARDED_HEADER: self.node_address}, timeout=self.timeout
+                    )
+                    # 403: o destino já não é o líder (a cache ainda não foi atualizada)
+                    if response.status_code != 403:
+                        return response
+                    logging.info(f"↪️ {leader} recusou o pedido reencaminhado: já não é o líder.")
+                except requests.exceptions.ConnectionError as e:
+                    # Apenas falhas de ligação são repetidas; um timeout pode já ter registado o documento
+                    logging.warning(f"↪️ Não foi possível contactar o líder {leader}: {e}")
+
+            if time.monotonic() + delay > deadline:
+                raise LeaderUnavailable("Nenhum líder disponível para receber o pedido")
+            time.sleep(delay)
+            delay = min(delay * 2, 1.0)
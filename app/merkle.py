@@ -0,0 +1,53 @@
+import hashlib
+import json
+
+# Prefixos de domínio (como no RFC 6962) para que uma folha nunca se confunda com um nó interno
+LEAF_PREFIX = b"\x00"
+NODE_PREFIX = b"\x01"
+
+def blob_leaf(digest, size):
+    """
+    Folha (SHA-256 em hexadecimal) de uma referência a um blob: cobre o digest e o
+    tamanho, para que nenhum dos dois possa ser alterado sem mudar a raiz.
+    """
+    return hashlib.sha256(json.dumps({"blob": digest, "size": size}, sort_keys=True).encode()).hexdigest()
+
+def leaf_hash(doc_hash):
+    """Nó folha da árvore a partir do SHA-256 (32 bytes) de um documento."""
+    return hashlib.sha256(LEAF_PREFIX + doc_hash).digest()
+
+def node_hash(left, right):
+    return hashlib.sha256(NODE_PREFIX + left + right).digest()
+
+def _next_level(level):
+    # Um nó sem par sobe para o nível seguinte sem ser re-hasheado
+    return [node_hash(level[i], level[i + 1]) if i + 1 < len(level) else level[i] for i in range(0, len(level), 2)]
+
+def merkle_root(doc_hashes):
+    """Raiz de Merkle (32 bytes) sobre os SHA-256 dos documentos, pela ordem dada."""
+    if not doc_hashes:
+        return b""
+    level = [leaf_hash(doc_hash) for doc_hash in doc_hashes]
+    while len(level) > 1:
+        level = _next_level(level)
+    return level[0]
+
+def merkle_path(doc_hashes, position):
+    """Caminho de irmãos (de tamanho logarítmico) desde a folha na posição dada até à raiz."""
+    level = [leaf_hash(doc_hash) for doc_hash in doc_hashes]
+    path = []
+    while len(level) > 1:
+        sibling = position ^ 1
+        if sibling < len(level):
+            path.append({"side": "left" if sibling < position else "right", "hash": level[sibling].hex()})
+        level = _next_level(level)
+        position //= 2
+    return path
+
+def verify_path(doc_hash, path, root):
+    """Verifica que o documento com o SHA-256 dado pertence à árvore com a raiz dada."""
+    node = leaf_hash(doc_hash)
+    for step in path:
+        sibling = bytes.fromhex(step["hash"])
+        node = node_hash(sibling, node) if step["side"] == "left" else node_hash(node, sibling)
+    return node == root
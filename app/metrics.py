@@ -0,0 +1,290 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Limites (em segundos) dos histogramas: de 50 µs a 10 s
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+def _format_value(value):
+    if value is None or value != value:
+        return "NaN"
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    """Base das métricas: nome, ajuda, etiquetas e um filho por combinação de valores das etiquetas."""
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._children_lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self._new_child()
+        (REGISTRY if registry is None else registry).register(self)
+
+    def labels(self, *values):
+        """Devolve o filho para os valores das etiquetas dados (criado na primeira utilização)."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"A métrica {self.name} espera as etiquetas {self.labelnames}")
+            with self._children_lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def remove(self, *values):
+        """Esquece o filho de uma combinação de etiquetas (por exemplo, de um seguidor que saiu)."""
+        with self._children_lock:
+            self._children.pop(values, None)
+
+    def _samples(self):
+        if not self.labelnames:
+            return [((), self._default)]
+        with self._children_lock:
+            return list(self._children.items())
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in self._samples():
+            lines.extend(self._render_child(values, child))
+        return lines
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+class Counter(_Metric):
+    """Contador monotónico (por exemplo, falhas de replicação por seguidor)."""
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"]
+
+class _GaugeChild:
+    __slots__ = ("value", "function")
+
+    def __init__(self):
+        self.value = 0
+        self.function = None
+
+    def set(self, value):
+        self.value = value
+
+    def set_function(self, function):
+        """O valor passa a ser lido de function() no momento da recolha."""
+        self.function = function
+
+    def get(self):
+        return self.function() if self.function else self.value
+
+class Gauge(_Metric):
+    """Valor instantâneo, definido diretamente ou calculado na recolha (comprimento da cadeia, liderança)."""
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._default.set(value)
+
+    def set_function(self, function):
+        self._default.set_function(function)
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.get())}"]
+
+class _SummaryChild:
+    __slots__ = ("count", "sum", "_lock")
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.count += 1
+            self.sum += value
+
+    def time(self):
+        return _timer(self.observe)
+
+class Summary(_Metric):
+    """
+    Só contagem e soma, sem quantis nem buckets: o instrumento mais barato, para os
+    caminhos chamados milhões de vezes (como o cálculo dos hashes).
+    """
+    kind = "summary"
+
+    def _new_child(self):
+        return _SummaryChild()
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+    def _render_child(self, values, child):
+        labels = _format_labels(self.labelnames, values)
+        return [f"{self.name}_count{labels} {child.count}", f"{self.name}_sum{labels} {_format_value(child.sum)}"]
+
+class _HistogramChild:
+    __slots__ = ("upper_bounds", "counts", "sum", "_lock")
+
+    def __init__(self, upper_bounds):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        bucket = bisect.bisect_left(self.upper_bounds, value)
+        with self._lock:
+            self.counts[bucket] += 1
+            self.sum += value
+
+    def time(self):
+        return _timer(self.observe)
+
+class Histogram(_Metric):
+    """Distribuição das observações em buckets cumulativos, como no Prometheus."""
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.upper_bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.upper_bounds)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+    def _render_child(self, values, child):
+        with child._lock:
+            counts, total = list(child.counts), child.sum
+        lines, cumulative = [], 0
+        for bound, count in zip(self.upper_bounds + (float("inf"),), counts):
+            cumulative += count
+            labels = _format_labels(self.labelnames, values, [("le", _format_value(bound))])
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        return lines
+
+@contextmanager
+def _timer(observe):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(time.perf_counter() - started)
+
+class Registry:
+    """Conjunto das métricas de um processo, exportadas no formato de texto do Prometheus."""
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if any(existing.name == metric.name for existing in self._metrics):
+                raise ValueError(f"Métrica duplicada: {metric.name}")
+            self._metrics.append(metric)
+
+    def get(self, name):
+        return next((metric for metric in self._metrics if metric.name == name), None)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+# Métricas do nó. São definidas aqui, uma única vez por processo, e os módulos
+# instrumentados importam-nas diretamente.
+HASH_SECONDS = Summary("cartorio_block_hash_seconds", "Tempo de cálculo do hash SHA-256 de um bloco.")
+BLOCK_CREATE_SECONDS = Histogram(
+    "cartorio_block_create_seconds", "Tempo de criação de um bloco no líder (da chamada até estar na cadeia).", ["kind"]
+)
+REPLICATION_RTT_SECONDS = Histogram(
+    "cartorio_replication_rtt_seconds", "Tempo de ida e volta de cada /sync enviado a um seguidor.", ["follower"]
+)
+REPLICATION_FAILURES = Counter(
+    "cartorio_replication_failures_total", "Falhas de replicação por seguidor e motivo.", ["follower", "reason"]
+)
+SYNC_REJECTIONS = Counter(
+    "cartorio_sync_rejections_total", "Pedidos /sync recusados por este nó, por motivo.", ["reason"]
+)
+CHAIN_SYNC_SECONDS = Histogram(
+    "cartorio_chain_sync_seconds", "Duração de replace_chain e append_suffix (validação e aplicação).", ["operation"],
+    buckets=DEFAULT_BUCKETS + (30.0, 60.0, 300.0)
+)
+REPLICATION_BACKFILL_BLOCKS = Counter(
+    "cartorio_replication_backfill_blocks_total", "Blocos reenviados a seguidores para preencher lacunas.", ["follower"]
+)
+REPLICATION_LAG_BLOCKS = Gauge(
+    "cartorio_replication_lag_blocks", "Blocos do líder ainda não confirmados por cada seguidor.", ["follower"]
+)
+MIN_INDEX_READS = Counter(
+    "cartorio_min_index_reads_total",
+    "Leituras com commit token (min_index), por resultado: imediata, após espera, redirecionada ou indisponível.",
+    ["outcome"]
+)
+SEGMENT_CACHE_LOOKUPS = Counter(
+    "cartorio_segment_cache_lookups_total", "Segmentos de blocos serializados pedidos à cache de /blockchain, por resultado.", ["result"]
+)
+ZK_CALL_SECONDS = Histogram(
+    "cartorio_zookeeper_call_seconds", "Latência das chamadas ao ZooKeeper, por operação.", ["operation"]
+)
+
+CHAIN_LENGTH = Gauge("cartorio_chain_length", "Número de blocos da cadeia local.")
+IS_LEADER = Gauge("cartorio_is_leader", "1 se este nó é o líder, 0 caso contrário.")
+LEADER_EPOCH = Gauge("cartorio_leader_epoch", "Maior época de líder conhecida por este nó.")
+PARTITION_CHAIN_LENGTH = Gauge(
+    "cartorio_partition_chain_length", "Número de blocos da cadeia local de cada partição.", ["partition"]
+)
+PARTITION_IS_LEADER = Gauge(
+    "cartorio_partition_is_leader", "1 se este nó é o líder da partição, 0 caso contrário.", ["partition"]
+)
+
+def render():
+    """Exporta todas as métricas do processo (para o endpoint /metrics)."""
+    return REGISTRY.render()
@@ -1,10 +1,28 @@
-from flask import Flask, request, jsonify
-from blockchain import Blockchain, Block
+from flask import Flask, Response, request, jsonify, redirect
+from blockchain import Blockchain, Block, document_leaf
 from zk_utils import ZooKeeperCoordinator
+from batching import GroupCommitter
+from storage import BlockStore
+from validation import ChainValidator
+from replication import ReplicationManager, SyncReceiver, WRITE_CONCERNS, LEADER_EPOCH_HEADER, parse_leader_epoch
+from document_index import DocumentIndex
+from forwarding import LeaderProxy, LeaderUnavailable, FORWARDED_HEADER
+from checkpoint import CheckpointManager, InvalidCheckpoint
+from blob_store import BlobStore, BlobFetcher, BlobMismatch
+from partitions import PartitionSet, PartitionAnchorer
+from segment_cache import SegmentCache, blocks_etag
+from consistency import commit_token, parse_min_index, wait_for_commit, COMMITTED, DIVERGED
+from wire import (
+    BLOCKS_CONTENT_TYPE, ACCEPT_ENCODING, BlockDecoder, BodyTooLarge, decode_sync_body,
+    choose_encoding, compress_stream, decompress_stream
+)
+import metrics
 import threading
 import requests
 import os
-import time
+import re
+import json
+import hashlib
 import logging
 
 # Configurar logging para um formato mais claro
@@ -18,10 +36,169 @@ app = Flask(__name__)
 
 # Obter o endereço do nó a partir das variáveis de ambiente
 NODE_ADDRESS = os.environ.get("NODE_ADDRESS", "localhost:5000")
+# Servidor HTTP: "flask" (servidor de desenvolvimento com threads) ou "async" (aiohttp)
+SERVER_MODE = os.environ.get("SERVER_MODE", "flask")
+# Threads do servidor assíncrono que executam as rotas (uma escrita ocupa a sua enquanto espera pela write concern)
+ASYNC_WORKERS = int(os.environ.get("ASYNC_WORKERS", "64"))
+# Janela de agregação (ms) e tamanho máximo dos blocos criados por /register/batch
+BATCH_WINDOW_MS = int(os.environ.get("BATCH_WINDOW_MS", "20"))
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", "256"))
+# Prazo (s) que um pedido de /register/batch espera que o seu lote seja selado
+BATCH_COMMIT_TIMEOUT_S = float(os.environ.get("BATCH_COMMIT_TIMEOUT_S", "10"))
+# Reencaminhamento transparente das escritas recebidas por seguidores para o líder
+FORWARD_WRITES = os.environ.get("FORWARD_WRITES", "1") == "1"
+FORWARD_TIMEOUT_S = float(os.environ.get("FORWARD_TIMEOUT_S", "15"))
+FORWARD_ELECTION_WAIT_S = float(os.environ.get("FORWARD_ELECTION_WAIT_S", "5"))
+# Diretório do armazenamento persistente (sem ele a blockchain vive apenas em memória)
+DATA_DIR = os.environ.get("DATA_DIR")
+FSYNC_POLICY = os.environ.get("FSYNC_POLICY", "batch")
+FSYNC_INTERVAL_S = float(os.environ.get("FSYNC_INTERVAL_S", "1.0"))
+# De quantos em quantos blocos o índice de documentos é gravado em DATA_DIR
+DOC_INDEX_SNAPSHOT_EVERY = int(os.environ.get("DOC_INDEX_SNAPSHOT_EVERY", "10000"))
+# Processos usados para validar cadeias longas recebidas (abaixo do limiar valida em série)
+VALIDATION_WORKERS = int(os.environ.get("VALIDATION_WORKERS", str(os.cpu_count() or 1)))
+VALIDATION_PARALLEL_THRESHOLD = int(os.environ.get("VALIDATION_PARALLEL_THRESHOLD", "16384"))
+# Fila máxima de blocos por seguidor e timeout de cada envio de replicação
+REPLICATION_QUEUE_SIZE = int(os.environ.get("REPLICATION_QUEUE_SIZE", "1024"))
+REPLICATION_TIMEOUT_S = float(os.environ.get("REPLICATION_TIMEOUT_S", "5"))
+REPLICATION_MAX_BATCH = int(os.environ.get("REPLICATION_MAX_BATCH", "64"))
+# Formato dos blocos enviados a outros nós ("binary" ou "json") e tamanho a partir do qual um /sync é comprimido
+WIRE_FORMAT = os.environ.get("WIRE_FORMAT", "binary")
+WIRE_COMPRESS_MIN_BYTES = int(os.environ.get("WIRE_COMPRESS_MIN_BYTES", str(16 * 1024)))
+# Tamanho máximo de um corpo de /sync depois de descomprimido (protege contra bombas de compressão)
+WIRE_MAX_BODY_BYTES = int(os.environ.get("WIRE_MAX_BODY_BYTES", str(64 * 1024 * 1024)))
+# Blocos em falta reenviados por /sync a um seguidor atrasado, intervalo entre tentativas
+# quando não há blocos novos, e blocos fora de ordem que um seguidor guarda à espera da lacuna
+REPLICATION_MAX_BACKFILL = int(os.environ.get("REPLICATION_MAX_BACKFILL", "1024"))
+REPLICATION_CATCH_UP_INTERVAL_S = float(os.environ.get("REPLICATION_CATCH_UP_INTERVAL_S", "1.0"))
+REPLICATION_REORDER_BUFFER = int(os.environ.get("REPLICATION_REORDER_BUFFER", "256"))
+# Checkpoints assinados (HMAC com o segredo do cluster) de N em N blocos; sem segredo ficam desligados
+CHECKPOINT_SECRET = os.environ.get("CHECKPOINT_SECRET")
+CHECKPOINT_EVERY = int(os.environ.get("CHECKPOINT_EVERY", "10000"))
+# Um nó novo arranca a partir do checkpoint de outro nó em vez de validar a cadeia desde o gênese
+BOOTSTRAP_FROM_CHECKPOINT = os.environ.get("BOOTSTRAP_FROM_CHECKPOINT", "1") == "1"
+# Armazenamento de blobs (documentos grandes fora dos blocos): diretório, tamanho dos pedaços
+# e se os seguidores vão buscar em segundo plano os blobs dos blocos replicados
+BLOB_DIR = os.environ.get("BLOB_DIR") or (os.path.join(DATA_DIR, "blobs") if DATA_DIR else None)
+BLOB_CHUNK_SIZE = int(os.environ.get("BLOB_CHUNK_SIZE", str(1024 * 1024)))
+BLOB_PREFETCH = os.environ.get("BLOB_PREFETCH", "1") == "1"
+BLOB_FETCH_TIMEOUT_S = float(os.environ.get("BLOB_FETCH_TIMEOUT_S", "30"))
+# Modo particionado: número de cadeias independentes, cada uma com o seu líder (1 = cadeia única),
+# intervalo dos blocos âncora na cadeia principal (0 desliga) e do reequilíbrio dos líderes
+PARTITIONS = int(os.environ.get("PARTITIONS", "1"))
+PARTITION_ANCHOR_INTERVAL_S = float(os.environ.get("PARTITION_ANCHOR_INTERVAL_S", "10"))
+PARTITION_REBALANCE_INTERVAL_S = float(os.environ.get("PARTITION_REBALANCE_INTERVAL_S", "5"))
+# Leituras com commit token (min_index): quanto tempo um nó atrasado espera pela replicação
+# e se depois redireciona o cliente para o líder (senão responde 503)
+READ_WAIT_MS = int(os.environ.get("READ_WAIT_MS", "500"))
+READ_REDIRECT_TO_LEADER = os.environ.get("READ_REDIRECT_TO_LEADER", "1") == "1"
+# Cache das respostas de /blockchain: blocos por segmento serializado e memória máxima (MB) por cadeia
+SEGMENT_CACHE_BLOCKS = int(os.environ.get("SEGMENT_CACHE_BLOCKS", "256"))
+SEGMENT_CACHE_MB = int(os.environ.get("SEGMENT_CACHE_MB", "64"))
+# Write concern por omissão de /register ("leader", "majority" ou "all") e prazo de espera
+DEFAULT_WRITE_CONCERN = os.environ.get("DEFAULT_WRITE_CONCERN", "leader")
+WRITE_CONCERN_TIMEOUT_MS = int(os.environ.get("WRITE_CONCERN_TIMEOUT_MS", "2000"))
+# Número de nós do cluster (líder incluído) sobre o qual se calcula a maioria: não desce quando
+# os seguidores caem (0 = contar apenas os nós ativos)
+REPLICATION_FACTOR = int(os.environ.get("REPLICATION_FACTOR", "3"))
 
 # Iniciar componentes principais
-blockchain = Blockchain()
+# O pool de validação é criado antes de qualquer thread (fsync, ZooKeeper, escritor, servidor)
+chain_validator = ChainValidator(workers=VALIDATION_WORKERS, parallel_threshold=VALIDATION_PARALLEL_THRESHOLD)
+chain_validator.start()
+block_store = BlockStore(DATA_DIR, fsync_policy=FSYNC_POLICY, fsync_interval=FSYNC_INTERVAL_S) if DATA_DIR else None
+document_index = DocumentIndex(
+    snapshot_path=os.path.join(DATA_DIR, "doc_index.json") if DATA_DIR else None,
+    snapshot_every=DOC_INDEX_SNAPSHOT_EVERY
+)
+blockchain = Blockchain(store=block_store, validator=chain_validator, document_index=document_index)
+checkpoint_manager = CheckpointManager(
+    blockchain, CHECKPOINT_SECRET, NODE_ADDRESS, every=CHECKPOINT_EVERY,
+    path=os.path.join(DATA_DIR, "checkpoint.json") if DATA_DIR else None,
+    is_leader=lambda: zk_coordinator.is_leader, get_leader_address=lambda: zk_coordinator.get_leader_address()
+)
+checkpoint_manager.load()
+blockchain.add_block_listener(checkpoint_manager.on_block)
 zk_coordinator = ZooKeeperCoordinator(NODE_ADDRESS)
+replication_manager = ReplicationManager(
+    NODE_ADDRESS, zk_coordinator.get_active_node_addresses,
+    queue_size=REPLICATION_QUEUE_SIZE, timeout=REPLICATION_TIMEOUT_S, max_batch=REPLICATION_MAX_BATCH,
+    blockchain=blockchain, max_backfill=REPLICATION_MAX_BACKFILL, catch_up_interval=REPLICATION_CATCH_UP_INTERVAL_S,
+    binary=WIRE_FORMAT == "binary", compress_min_bytes=WIRE_COMPRESS_MIN_BYTES,
+    get_epoch=lambda: zk_coordinator.epoch, replication_factor=REPLICATION_FACTOR
+)
+sync_receiver = SyncReceiver(blockchain, buffer_size=REPLICATION_REORDER_BUFFER)
+zk_coordinator.add_membership_listener(replication_manager.on_membership_change)
+def blob_peer_addresses():
+    """Nós a quem pedir um blob em falta: primeiro o líder, depois os restantes."""
+    leader_address = zk_coordinator.get_leader_address()
+    others = [addr for addr in zk_coordinator.get_active_node_addresses() if addr not in (NODE_ADDRESS, leader_address)]
+    return ([leader_address] if leader_address and leader_address != NODE_ADDRESS else []) + others
+
+blob_store = BlobStore(BLOB_DIR, chunk_size=BLOB_CHUNK_SIZE)
+blob_fetcher = BlobFetcher(blob_store, blob_peer_addresses, timeout=BLOB_FETCH_TIMEOUT_S)
+if BLOB_PREFETCH:
+    blockchain.add_block_listener(blob_fetcher.on_block)
+leader_proxy = LeaderProxy(
+    NODE_ADDRESS, zk_coordinator.get_leader_address,
+    timeout=FORWARD_TIMEOUT_S, election_wait=FORWARD_ELECTION_WAIT_S
+)
+# Garante que os blocos criados pelo líder entram nas filas de replicação pela ordem da cadeia
+leader_append_lock = threading.Lock()
+# Indicadores do nó lidos no momento da recolha de /metrics
+metrics.CHAIN_LENGTH.set_function(blockchain.length)
+metrics.IS_LEADER.set_function(lambda: int(zk_coordinator.is_leader))
+metrics.LEADER_EPOCH.set_function(lambda: zk_coordinator.leader_epoch)
+
+def make_partition_blockchain(partition_id):
+    """Cadeia de uma partição, guardada em DATA_DIR/partitions/<id> quando há armazenamento persistente."""
+    directory = os.path.join(DATA_DIR, "partitions", str(partition_id)) if DATA_DIR else None
+    return Blockchain(
+        store=BlockStore(directory, fsync_policy=FSYNC_POLICY, fsync_interval=FSYNC_INTERVAL_S) if directory else None,
+        validator=chain_validator,
+        document_index=DocumentIndex(
+            snapshot_path=os.path.join(directory, "doc_index.json") if directory else None,
+            snapshot_every=DOC_INDEX_SNAPSHOT_EVERY
+        )
+    )
+
+# No modo particionado os documentos vão para as cadeias das partições e a cadeia
+# principal (com o líder de /cartorio/leader) passa a registar apenas os blocos âncora
+partition_set = PartitionSet(
+    PARTITIONS, NODE_ADDRESS, zk_coordinator, make_partition_blockchain,
+    rebalance_interval=PARTITION_REBALANCE_INTERVAL_S,
+    replication_options={
+        "queue_size": REPLICATION_QUEUE_SIZE, "timeout": REPLICATION_TIMEOUT_S, "max_batch": REPLICATION_MAX_BATCH,
+        "max_backfill": REPLICATION_MAX_BACKFILL, "catch_up_interval": REPLICATION_CATCH_UP_INTERVAL_S,
+        "binary": WIRE_FORMAT == "binary", "compress_min_bytes": WIRE_COMPRESS_MIN_BYTES,
+        "replication_factor": REPLICATION_FACTOR
+    },
+    reorder_buffer=REPLICATION_REORDER_BUFFER,
+    forward_options={"timeout": FORWARD_TIMEOUT_S, "election_wait": FORWARD_ELECTION_WAIT_S},
+    batch_options={"window_ms": BATCH_WINDOW_MS, "max_size": BATCH_MAX_SIZE, "timeout": BATCH_COMMIT_TIMEOUT_S}
+) if PARTITIONS > 1 else None
+
+def attach_segment_cache(chain):
+    cache = SegmentCache(segment_size=SEGMENT_CACHE_BLOCKS, max_bytes=SEGMENT_CACHE_MB * 1024 * 1024)
+    chain.add_block_listener(cache.on_block)
+    chain.add_fork_listener(cache.on_fork)
+    return cache
+
+# Blocos já serializados de cada cadeia servida por /blockchain (a principal e as das partições)
+segment_caches = {
+    chain: attach_segment_cache(chain)
+    for chain in [blockchain] + ([partition.blockchain for partition in partition_set.partitions] if partition_set is not None else [])
+}
+
+def write_anchor_block(data):
+    with leader_append_lock:
+        block = blockchain.add_block(data, epoch=zk_coordinator.epoch)
+        replication_manager.replicate(block)
+    return block
+
+partition_anchorer = PartitionAnchorer(
+    partition_set, lambda: zk_coordinator.is_leader, write_anchor_block, interval=PARTITION_ANCHOR_INTERVAL_S
+) if partition_set is not None else None
 
 def synchronize_blockchain_on_startup():
     """
@@ -29,8 +206,8 @@ def synchronize_blockchain_on_startup():
     Um nó que (re)inicia precisa de "apanhar" o trabalho que perdeu.
     """
     logging.info("--- INICIANDO PROCESSO DE SINCRONIZAÇÃO DA BLOCKCHAIN ---")
-    # Pequena pausa para permitir que outros nós se registem no ZK
-    time.sleep(5) 
+    # Os nós ativos vêm da cache do coordenador, preenchida assim que o watch do ZK dispara
+    zk_coordinator.wait_until_ready()
 
     my_address = NODE_ADDRESS
     other_nodes = [addr for addr in zk_coordinator.get_active_node_addresses() if addr != my_address]
@@ -40,117 +217,682 @@ def synchronize_blockchain_on_startup():
         return
 
     logging.info(f"Nós ativos encontrados para sincronização: {other_nodes}")
-    longest_chain = None
-    best_node = None
+    heads = []
 
-    # Encontrar a blockchain mais longa entre todos os nós ativos
+    # Comparar apenas o topo (índice e hash) de cada nó, sem descarregar as cadeias
     for address in other_nodes:
         try:
-            logging.info(f"A pedir blockchain do nó {address}...")
-            response = requests.get(f"http://{address}/blockchain", timeout=5)
+            logging.info(f"A pedir o topo da blockchain do nó {address}...")
+            response = requests.get(f"http://{address}/blockchain/head", timeout=5)
             if response.status_code == 200:
-                data = response.json()
-                chain_dicts = data['chain']
-                if longest_chain is None or len(chain_dicts) > len(longest_chain):
-                    longest_chain = chain_dicts
-                    best_node = address
-                    logging.info(f"Nova blockchain mais longa encontrada em {address} com {len(longest_chain)} blocos.")
+                heads.append((response.json(), address))
             else:
                 logging.warning(f"Resposta inválida de {address}: {response.status_code}")
         except requests.exceptions.RequestException as e:
-            logging.warning(f"Não foi possível obter a blockchain de {address}: {e}")
-
-    # Se uma cadeia mais longa foi encontrada, tenta substituir a local
-    if longest_chain:
-        logging.info(f"A tentar substituir a cadeia local pela do nó {best_node}.")
-        success, reason = blockchain.replace_chain(longest_chain)
-        if not success:
-            logging.error(f"Falha ao substituir a cadeia! Razão: {reason}. A continuar com a blockchain local.")
-    else:
+            logging.warning(f"Não foi possível obter o topo da blockchain de {address}: {e}")
+
+    local_head = blockchain.get_head()
+    candidates = sorted((item for item in heads if item[0]['index'] > local_head['index']), key=lambda item: -item[0]['index'])
+    if not heads:
         logging.warning("Não foi possível sincronizar com nenhum nó. A continuar com a blockchain local.")
+    elif not candidates:
+        logging.info("A blockchain local já está atualizada.")
+    # Do nó com a cadeia mais longa para o seguinte: um nó que falhe (ou envie blocos corrompidos) é saltado
+    for head, address in candidates:
+        logging.info(f"A sincronizar com {address}, que tem {head['index'] + 1} blocos.")
+        try:
+            if blockchain.get_head()['index'] == 0 and BOOTSTRAP_FROM_CHECKPOINT and checkpoint_manager.enabled \
+                    and head['index'] >= CHECKPOINT_EVERY:
+                bootstrap_from_checkpoint(address)
+            if catch_up_from(address, head['index']):
+                break
+        except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+            logging.error(f"Falha ao sincronizar com {address}: {e}.")
+    else:
+        if candidates:
+            logging.warning("Nenhum nó permitiu a sincronização. A continuar com a blockchain local.")
     logging.info("--- PROCESSO DE SINCRONIZAÇÃO CONCLUÍDO ---")
 
+def bootstrap_from_checkpoint(address):
+    """
+    Arranca a cadeia local a partir do último checkpoint de outro nó: confia no
+    bloco do checkpoint (assinado pelo cluster) e só os blocos seguintes são
+    descarregados e validados.
+    """
+    try:
+        fetched = checkpoint_manager.fetch(address)
+    except (requests.exceptions.RequestException, ValueError, KeyError, InvalidCheckpoint) as e:
+        logging.warning(f"Checkpoint de {address} recusado ({e}). A sincronizar desde o gênese.")
+        return False
+    if fetched is None:
+        logging.info(f"O nó {address} não tem checkpoint. A sincronizar desde o gênese.")
+        return False
+    checkpoint, block, document_index_bytes, document_index = fetched
 
-@app.route('/register', methods=['POST'])
-def register_document():
-    if not zk_coordinator.is_leader:
+    success, reason = blockchain.bootstrap(block, document_index)
+    if success:
+        checkpoint_manager.adopt(checkpoint, document_index_bytes)
+        logging.info(f"📌 Checkpoint do bloco {block.index} obtido de {address}.")
+    else:
+        logging.warning(f"Não foi possível arrancar a partir do checkpoint: {reason}.")
+    return success
+
+def fetch_blocks(address, from_index=0, limit=None, prefix=""):
+    """
+    Descarrega um intervalo de blocos de outro nó, um bloco de cada vez: no formato
+    binário, comprimido se o outro nó o suportar, ou em NDJSON com nós que não o conheçam.
+    Com prefix ("/partitions/<id>") os blocos vêm da cadeia de uma partição.
+    """
+    params = {"from_index": from_index, "format": "ndjson"}
+    if limit is not None:
+        params["limit"] = limit
+    headers = {"Accept-Encoding": ACCEPT_ENCODING}
+    if WIRE_FORMAT == "binary":
+        headers["Accept"] = f"{BLOCKS_CONTENT_TYPE}, application/x-ndjson;q=0.5"
+    with requests.get(f"http://{address}{prefix}/blockchain", params=params, headers=headers, stream=True, timeout=5) as response:
+        response.raise_for_status()
+        if response.headers.get("Content-Type", "").startswith(BLOCKS_CONTENT_TYPE):
+            # A descompressão é feita aqui, para aceitar também codificações que o urllib3 não conhece
+            decoder = BlockDecoder()
+            chunks = response.raw.stream(64 * 1024, decode_content=False)
+            for chunk in decompress_stream(chunks, response.headers.get("Content-Encoding")):
+                yield from decoder.feed(chunk)
+            decoder.close()
+            return
+        for line in response.iter_lines():
+            if line:
+                yield Block.from_dict(json.loads(line))
+
+def remote_hash_at(address, index, prefix=""):
+    """Obtém o hash do bloco com o índice dado noutro nó."""
+    for block in fetch_blocks(address, index, limit=1, prefix=prefix):
+        return block.hash
+    return None
+
+def find_common_ancestor(address, remote_tip_index, chain=None, prefix=""):
+    """
+    Procura o bloco mais alto que a cadeia local partilha com outro nó. Como cada
+    bloco fixa todos os anteriores pelo hash, basta uma pesquisa binária por índice.
+    """
+    chain = chain if chain is not None else blockchain
+    high = min(chain.get_head()['index'], remote_tip_index)
+    # Caso comum: o topo local continua a fazer parte da cadeia remota
+    if remote_hash_at(address, high, prefix) == chain.get_block(high).hash:
+        return high
+
+    low = chain.base_index  # O bloco gênese (ou o do checkpoint de arranque) é comum a todos os nós
+    while high - low > 1:
+        mid = (low + high) // 2
+        if remote_hash_at(address, mid, prefix) == chain.get_block(mid).hash:
+            low = mid
+        else:
+            high = mid
+    return low
+
+def catch_up_from(address, remote_tip_index, chain=None, prefix=""):
+    """
+    Pede a outro nó apenas os blocos posteriores ao ancestral comum e acrescenta-os.
+    Devolve True se a cadeia foi atualizada; ValueError se o nó enviar blocos ilegíveis.
+    """
+    chain = chain if chain is not None else blockchain
+    ancestor_index = find_common_ancestor(address, remote_tip_index, chain, prefix)
+    logging.info(f"Ancestral comum com {address}{prefix}: bloco {ancestor_index}. A pedir os blocos seguintes...")
+    suffix = list(fetch_blocks(address, ancestor_index + 1, prefix=prefix))
+    success, reason = chain.append_suffix(ancestor_index, suffix)
+    if success:
+        logging.info(f"{len(suffix)} blocos sincronizados a partir do nó {address}.")
+    else:
+        logging.error(f"Falha ao sincronizar com {address}! Razão: {reason}.")
+    return success
+
+def synchronize_partitions_on_startup():
+    """Põe em dia a cadeia local de cada partição a partir do nó que tiver a mais longa."""
+    other_nodes = [addr for addr in zk_coordinator.get_active_node_addresses() if addr != NODE_ADDRESS]
+    for partition in partition_set.partitions:
+        prefix = f"/partitions/{partition.id}"
+        heads = []
+        for address in other_nodes:
+            try:
+                response = requests.get(f"http://{address}{prefix}/blockchain/head", timeout=5)
+                if response.status_code == 200:
+                    heads.append((response.json(), address))
+            except requests.exceptions.RequestException as e:
+                logging.warning(f"Não foi possível obter o topo da partição {partition.id} de {address}: {e}")
+        local_index = partition.blockchain.get_head()['index']
+        for head, address in sorted(heads, key=lambda item: -item[0]['index']):
+            if head['index'] <= local_index:
+                break
+            try:
+                if catch_up_from(address, head['index'], partition.blockchain, prefix):
+                    break
+            except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+                logging.error(f"Falha ao sincronizar a partição {partition.id} com {address}: {e}.")
+
+def forward_write_to_leader(proxy=None):
+    """
+    Num seguidor, reencaminha o pedido de escrita atual para o líder (o da cadeia
+    principal ou, com o proxy de uma partição, o dessa partição). Pedidos que já
+    vêm reencaminhados (ou com o reencaminhamento desligado) são recusados com 403.
+    """
+    proxy = proxy or leader_proxy
+    leader_address = proxy.get_leader_address()
+    if not FORWARD_WRITES or request.headers.get(FORWARDED_HEADER):
         logging.warning(f"Tentativa de registo num nó não-líder ({NODE_ADDRESS}).")
-        leader_address = zk_coordinator.get_leader_address()
         return jsonify({"error": "Apenas o líder pode registar documentos.", "leader_hint": leader_address or "Nenhum"}), 403
 
+    logging.info(f"↪️ A reencaminhar {request.path} para o líder ({leader_address or 'em eleição'})...")
+    try:
+        response = proxy.forward(request.path, request.json)
+    except LeaderUnavailable as e:
+        return jsonify({"error": str(e), "leader_hint": "Nenhum"}), 503
+    except requests.exceptions.RequestException as e:
+        logging.error(f"❌ Falha ao reencaminhar o pedido para o líder: {e}")
+        return jsonify({"error": "Falha ao contactar o líder", "leader_hint": leader_address or "Nenhum"}), 502
+    return Response(response.content, status=response.status_code, content_type=response.headers.get("Content-Type"))
+
+def route_to_partition(body):
+    """
+    Partição dona do documento do pedido de registo (pelo namespace ou pelo SHA-256
+    do documento, ou do blob), ou None se o pedido não trouxer nenhum documento.
+    """
+    blob_digest, document = body.get("blob"), body.get("document")
+    if blob_digest is not None:
+        doc_hash = blob_digest
+    elif isinstance(document, str) and document:
+        doc_hash = document_leaf(document)
+    else:
+        return None
+    return partition_set.route(doc_hash, body.get("namespace"))
+
+def read_target():
+    """
+    Cadeia e coordenador a que se refere a leitura atual: a de uma partição (pelo
+    caminho, por ?partition= ou, em /verify, pelo documento) ou a cadeia principal.
+    """
+    view_args = request.view_args or {}
+    if partition_set is None:
+        return blockchain, zk_coordinator
+    partition_id = view_args.get("partition_id", request.args.get("partition"))
+    if partition_id is not None:
+        partition_id = int(partition_id)
+        if not 0 <= partition_id < len(partition_set):
+            return None, None
+        partition = partition_set[partition_id]
+    elif "doc_hash" in view_args and re.fullmatch(r"[0-9a-f]{64}", view_args["doc_hash"].lower()):
+        partition = partition_set.route(view_args["doc_hash"].lower(), request.args.get("namespace"))
+    else:
+        return blockchain, zk_coordinator
+    return partition.blockchain, partition.coordinator
+
+@app.before_request
+def enforce_min_index():
+    """
+    Read-your-writes nos seguidores: uma leitura com min_index (o commit token de
+    /register) espera até READ_WAIT_MS que o bloco seja replicado para este nó e,
+    se não chegar a tempo, é redirecionada para o líder (307).
+    """
+    if request.method != "GET" or "min_index" not in request.args:
+        return None
+    try:
+        min_index, min_hash = parse_min_index(request.args)
+        chain, coordinator = read_target()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if chain is None:
+        return None  # Partição inexistente: a própria rota responde 404
+
+    state, waited = wait_for_commit(chain, min_index, min_hash, READ_WAIT_MS / 1000.0)
+    if state == COMMITTED:
+        metrics.MIN_INDEX_READS.labels("waited" if waited else "immediate").inc()
+        return None
+    leader_address = coordinator.get_leader_address()
+    if coordinator.is_leader and state == DIVERGED:
+        metrics.MIN_INDEX_READS.labels("unavailable").inc()
+        return jsonify({"error": "O bloco do commit token não faz parte da cadeia do líder", "min_index": min_index}), 409
+    if READ_REDIRECT_TO_LEADER and leader_address and leader_address != NODE_ADDRESS:
+        metrics.MIN_INDEX_READS.labels("redirected").inc()
+        logging.info(f"↪️ Leitura com min_index={min_index} redirecionada para o líder {leader_address} (topo local: {chain.length() - 1}).")
+        return redirect(f"http://{leader_address}{request.full_path}", code=307)
+    metrics.MIN_INDEX_READS.labels("unavailable").inc()
+    response = jsonify({
+        "error": "Este nó ainda não tem o bloco do commit token",
+        "min_index": min_index,
+        "tip_index": chain.length() - 1,
+        "leader_hint": leader_address or "Nenhum"
+    })
+    response.headers["Retry-After"] = "1"
+    return response, 503
+
+@app.route('/register', methods=['POST'])
+def register_document():
+    blob_digest = request.json.get("blob")
+    if blob_digest is not None and (not isinstance(blob_digest, str) or not re.fullmatch(r"[0-9a-f]{64}", blob_digest)):
+        return jsonify({"error": "blob deve ser um SHA-256 em hexadecimal"}), 400
+    partition = route_to_partition(request.json) if partition_set is not None else None
+    if partition_set is not None and partition is None:
+        return jsonify({"error": "Documento não fornecido"}), 400
+    if partition is not None and not partition.is_leader:
+        return forward_write_to_leader(partition.leader_proxy)
+    if partition is None and not zk_coordinator.is_leader:
+        return forward_write_to_leader()
+
     data = request.json.get("document")
-    if not data: return jsonify({"error": "Documento não fornecido"}), 400
+    if blob_digest is not None:
+        # O documento já foi enviado com PUT /blobs: o bloco só leva o digest e o tamanho
+        if not blob_fetcher.fetch(blob_digest):
+            return jsonify({"error": "Blob desconhecido: envie-o primeiro com PUT /blobs"}), 409
+        data = {"blob": blob_digest, "size": blob_store.size(blob_digest)}
+    elif not isinstance(data, str) or not data:
+        # Só o caminho dos blobs produz documentos estruturados (a referência {"blob", "size"})
+        return jsonify({"error": "Documento não fornecido: document deve ser um texto não vazio"}), 400
+    try:
+        write_concern, timeout_s = parse_write_concern(request.json)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    logging.info(f"👑 LÍDER: Recebido documento para registro: '{data[:50]}...'")
-    block = blockchain.add_block(data)
+    logging.info(f"👑 LÍDER: Recebido documento para registro: '{blob_digest or data[:50]}...'")
+    if partition is not None:
+        block, receipt = partition.add_block(data)
+    else:
+        with leader_append_lock:
+            block = blockchain.add_block(data, epoch=zk_coordinator.epoch)
+            receipt = replication_manager.replicate(block)
     logging.info(f"📦 Bloco {block.index} criado com hash {block.hash[:16]}...")
 
-    logging.info(f"🔄 Iniciando replicação do bloco {block.index}...")
-    threading.Thread(target=replicate_block, args=(block,), daemon=True).start()
-    
-    return jsonify({"message": "Documento registado e replicação iniciada.", "block": block.to_dict()}), 201
+    concern = await_write_concern(receipt, write_concern, timeout_s)
+    response = {
+        "message": "Documento registado e replicação iniciada.",
+        "block": block.to_dict(),
+        "write_concern": concern,
+        "commit_token": commit_token(block, partition.id if partition is not None else None)
+    }
+    if partition is not None:
+        response["partition"] = partition.id
+    return jsonify(response), 201 if concern["satisfied"] else 202
 
-def replicate_block(block):
-    followers = [addr for addr in zk_coordinator.get_active_node_addresses() if addr != NODE_ADDRESS]
-    if not followers: return
+@app.route('/register/batch', methods=['POST'])
+def register_batch():
+    partition = None
+    if partition_set is not None:
+        # Um lote fica num único bloco, pelo que tem de pertencer a uma única partição
+        namespace = (request.json or {}).get("namespace")
+        if not namespace:
+            return jsonify({"error": "No modo particionado os lotes precisam de um namespace"}), 400
+        partition = partition_set.route(None, namespace)
+        if not partition.is_leader:
+            return forward_write_to_leader(partition.leader_proxy)
+    elif not zk_coordinator.is_leader:
+        return forward_write_to_leader()
 
-    logging.info(f"🔍 Seguidores ativos encontrados: {followers}")
-    success_count = 0
-    for address in followers:
-        try:
-            logging.info(f"  -> Replicando para http://{address}/sync...")
-            response = requests.post(f"http://{address}/sync", json={"block": block.to_dict()}, timeout=5)
-            if response.status_code == 200:
-                logging.info(f"   ✅ Bloco replicado com sucesso para {address}")
-                success_count += 1
-            else:
-                logging.error(f"   ❌ Falha ao replicar para {address}: Status {response.status_code}, Resposta: {response.text}")
-        except requests.exceptions.RequestException as e:
-            logging.error(f"   ❌ Erro de conexão ao replicar para {address}: {e}")
-    logging.info(f"📊 Replicação concluída: {success_count}/{len(followers)} seguidores atualizados.")
+    documents = (request.json or {}).get("documents")
+    if not isinstance(documents, list) or not documents or not all(isinstance(d, str) and d for d in documents):
+        return jsonify({"error": "Lista de documentos não fornecida ou inválida"}), 400
+    if len(documents) > BATCH_MAX_SIZE:
+        return jsonify({"error": f"O lote excede o limite de {BATCH_MAX_SIZE} documentos"}), 413
+    try:
+        write_concern, timeout_s = parse_write_concern(request.json)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    logging.info(f"👑 LÍDER: Recebido lote de {len(documents)} documentos para registo.")
+    committer = partition.group_committer if partition is not None else group_committer
+    try:
+        block, position, receipt = committer.submit(documents)
+    except TimeoutError as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        logging.error(f"❌ Erro ao registar o lote: {e}")
+        return jsonify({"error": f"Falha ao selar o lote: {e}"}), 500
+    concern = await_write_concern(receipt, write_concern, timeout_s)
+
+    entries = block.data
+    registered = [
+        {"position": position + i, "leaf": entries[position + i]["leaf"]}
+        for i in range(len(documents))
+    ]
+    response = {
+        "message": "Lote registado e replicação iniciada.",
+        "block_index": block.index,
+        "block_hash": block.hash,
+        "documents": registered,
+        "write_concern": concern,
+        "commit_token": commit_token(block, partition.id if partition is not None else None)
+    }
+    if partition is not None:
+        response["partition"] = partition.id
+    return jsonify(response), 201 if concern["satisfied"] else 202
+
+def parse_write_concern(body):
+    """Lê do pedido de registo a write concern pretendida e o prazo de espera."""
+    write_concern = body.get("write_concern", DEFAULT_WRITE_CONCERN)
+    if write_concern not in WRITE_CONCERNS:
+        raise ValueError(f"write_concern deve ser um de: {', '.join(WRITE_CONCERNS)}")
+    timeout_ms = body.get("timeout_ms", WRITE_CONCERN_TIMEOUT_MS)
+    if not isinstance(timeout_ms, int) or timeout_ms < 0:
+        raise ValueError("timeout_ms deve ser um inteiro não negativo")
+    return write_concern, timeout_ms / 1000.0
+
+def await_write_concern(receipt, write_concern, timeout_s):
+    """Espera (até ao prazo) pelas confirmações dos seguidores exigidas pela write concern."""
+    required = receipt.required_replicas(write_concern)
+    replicas = receipt.wait(required, timeout_s) if required > 1 else receipt.replicas
+    if replicas < required:
+        logging.warning(f"⚠️ Bloco {receipt.block_index}: write concern '{write_concern}' não alcançada ({replicas}/{required} réplicas).")
+    return {
+        "level": write_concern,
+        "required_replicas": required,
+        "replicas": replicas,
+        "satisfied": replicas >= required
+    }
+
+def seal_batch(documents):
+    with leader_append_lock:
+        block = blockchain.add_batch_block(documents, epoch=zk_coordinator.epoch)
+        receipt = replication_manager.replicate(block)
+    return block, receipt
+
+group_committer = GroupCommitter(seal_batch, window_ms=BATCH_WINDOW_MS, max_size=BATCH_MAX_SIZE, timeout=BATCH_COMMIT_TIMEOUT_S)
 
 @app.route('/sync', methods=['POST'])
 def sync_block():
-    block_data = request.json.get("block")
-    if not block_data: return jsonify({"error": "Dados do bloco não fornecidos"}), 400
-    
+    return receive_sync(sync_receiver, zk_coordinator, blockchain)
+
+@app.route('/partitions/<int:partition_id>/sync', methods=['POST'])
+def sync_partition_block(partition_id):
+    if partition_set is None or partition_id >= len(partition_set):
+        return jsonify({"error": "Partição inexistente"}), 404
+    partition = partition_set[partition_id]
+    return receive_sync(partition.sync_receiver, partition.coordinator, partition.blockchain)
+
+def receive_sync(receiver, coordinator, chain):
+    """Aplica o /sync recebido com o SyncReceiver da cadeia principal ou de uma partição."""
+    # O líder envia os blocos no formato binário ou em JSON: um bloco ("block") ou vários consecutivos ("blocks")
+    if request.mimetype == BLOCKS_CONTENT_TYPE:
+        try:
+            blocks_data = decode_sync_body(request.get_data(), request.headers.get("Content-Encoding"), WIRE_MAX_BODY_BYTES)
+        except BodyTooLarge as e:
+            metrics.SYNC_REJECTIONS.labels("too_large").inc()
+            return jsonify({"error": str(e)}), 413
+        except Exception as e:
+            metrics.SYNC_REJECTIONS.labels("bad_encoding").inc()
+            return jsonify({"error": f"Corpo binário inválido: {e}"}), 415
+    else:
+        blocks_data = request.json.get("blocks") or ([request.json["block"]] if request.json.get("block") else None)
+    if not blocks_data:
+        metrics.SYNC_REJECTIONS.labels("missing_data").inc()
+        return jsonify({"error": "Dados do bloco não fornecidos"}), 400
+
     try:
-        new_block = Block.from_dict(block_data)
-        success, reason = blockchain.add_replicated_block(new_block)
-        if success:
-            logging.info(f"✅ Bloco {new_block.index} recebido do líder e adicionado à blockchain.")
-            return jsonify({"message": "Bloco sincronizado com sucesso."}), 200
-        else:
-            logging.warning(f"⚠️ Bloco {new_block.index} recebido do líder foi rejeitado ({reason}).")
-            return jsonify({"error": "Bloco inválido ou fora de ordem"}), 409
+        leader_epoch = parse_leader_epoch(request.headers.get(LEADER_EPOCH_HEADER))
+    except ValueError:
+        metrics.SYNC_REJECTIONS.labels("bad_epoch").inc()
+        return jsonify({"error": f"Cabeçalho {LEADER_EPOCH_HEADER} inválido"}), 400
+
+    # Vedação: um /sync de um líder com época inferior à maior época conhecida vem de um líder destituído
+    try:
+        result = receiver.receive(blocks_data, coordinator.leader_epoch, leader_epoch)
     except Exception as e:
         logging.error(f"❌ Erro grave no endpoint /sync: {e}")
-        return jsonify({"error": str(e)}), 500
+        metrics.SYNC_REJECTIONS.labels("error").inc()
+        return jsonify({"error": str(e), "applied": 0, "tip_index": chain.length() - 1}), 500
+    if "error" in result:
+        return jsonify({**result, "epoch": coordinator.leader_epoch}), 409
+    logging.info(f"✅ {result['applied']} bloco(s) recebido(s) do líder e adicionado(s) à blockchain (topo: {result['tip_index']}).")
+    return jsonify({"message": "Bloco sincronizado com sucesso.", **result}), 200
+
+def partition_chain(partition_id):
+    """Cadeia da partição indicada, ou None se não existir (ou o nó não estiver no modo particionado)."""
+    if partition_set is None or partition_id is None or not 0 <= partition_id < len(partition_set):
+        return None
+    return partition_set[partition_id].blockchain
 
 @app.route('/blockchain', methods=['GET'])
 def get_blockchain():
-    return jsonify({"chain": [block.to_dict() for block in blockchain.chain]})
+    return serve_blocks(blockchain)
 
-@app.route('/status', methods=['GET'])
-def status():
-    return jsonify({
+@app.route('/partitions/<int:partition_id>/blockchain', methods=['GET'])
+def get_partition_blockchain(partition_id):
+    chain = partition_chain(partition_id)
+    if chain is None:
+        return jsonify({"error": "Partição inexistente"}), 404
+    return serve_blocks(chain)
+
+def serve_blocks(chain):
+    """Intervalo de blocos de uma cadeia em JSON, NDJSON ou no formato binário (conforme o pedido)."""
+    try:
+        # Por omissão, a partir do primeiro bloco guardado (o do checkpoint, num nó que arrancou de um)
+        from_index = int(request.args.get("from_index", chain.base_index))
+        limit = request.args.get("limit")
+        limit = int(limit) if limit is not None else None
+    except ValueError:
+        return jsonify({"error": "from_index e limit devem ser inteiros"}), 400
+    if from_index < 0 or (limit is not None and limit < 0):
+        return jsonify({"error": "from_index e limit não podem ser negativos"}), 400
+    if from_index < chain.base_index:
+        return jsonify({"error": "Os blocos anteriores ao checkpoint de arranque não existem neste nó", "base_index": chain.base_index}), 410
+
+    snapshot = chain.snapshot()
+    end = len(snapshot) if limit is None else min(len(snapshot), from_index + limit)
+    cache = segment_caches[chain]
+    # O formato binário só é usado se o cliente o preferir explicitamente (Accept) ou o pedir com format=binary
+    wants_binary = request.args.get("format") == "binary" or \
+        request.accept_mimetypes.best_match(["application/json", "application/x-ndjson", BLOCKS_CONTENT_TYPE]) == BLOCKS_CONTENT_TYPE
+    if wants_binary:
+        encoding = choose_encoding(request.headers.get("Accept-Encoding"))
+
+        def build_binary():
+            body = (b"".join(items) for items in cache.iter_range(snapshot, from_index, end, "binary"))
+            response = Response(compress_stream(body, encoding) if encoding else body, mimetype=BLOCKS_CONTENT_TYPE)
+            response.headers["Vary"] = "Accept, Accept-Encoding"
+            if encoding:
+                response.headers["Content-Encoding"] = encoding
+            return response
+        return conditional_response(blocks_etag(snapshot, from_index, end, "binary", encoding), build_binary)
+
+    # As respostas são produzidas segmento a segmento, a partir dos blocos já serializados na cache
+    wants_ndjson = request.args.get("format") == "ndjson" or \
+        request.accept_mimetypes.best == "application/x-ndjson"
+    if wants_ndjson:
+        def build_ndjson():
+            lines = (b"\n".join(items) + b"\n" for items in cache.iter_range(snapshot, from_index, end, "json"))
+            return Response(lines, mimetype="application/x-ndjson")
+        return conditional_response(blocks_etag(snapshot, from_index, end, "ndjson"), build_ndjson)
+
+    def generate_json():
+        yield b'{"chain": ['
+        for i, items in enumerate(cache.iter_range(snapshot, from_index, end, "json")):
+            yield (b"," if i else b"") + b",".join(items)
+        yield b"]}"
+    return conditional_response(
+        blocks_etag(snapshot, from_index, end, "json"),
+        lambda: Response(generate_json(), mimetype="application/json")
+    )
+
+def conditional_response(etag, build):
+    """
+    Resposta a um GET versionado por etag: 304, sem produzir o corpo, se o cliente
+    já tem esta versão (If-None-Match), ou a resposta de build() com o ETag.
+    """
+    response = Response(status=304) if request.if_none_match.contains(etag) else build()
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+@app.route('/blockchain/head', methods=['GET'])
+def get_blockchain_head():
+    return head_response(blockchain)
+
+@app.route('/partitions/<int:partition_id>/blockchain/head', methods=['GET'])
+def get_partition_blockchain_head(partition_id):
+    chain = partition_chain(partition_id)
+    if chain is None:
+        return jsonify({"error": "Partição inexistente"}), 404
+    return head_response(chain)
+
+def head_response(chain):
+    head = chain.get_head()
+    head["length"] = chain.length()
+    return conditional_response(head["hash"], lambda: jsonify(head))
+
+@app.route('/partitions', methods=['GET'])
+def get_partitions():
+    if partition_set is None:
+        return jsonify({"partitions": 1, "status": []})
+    return jsonify({"partitions": len(partition_set), "status": partition_set.status()})
+
+@app.route('/snapshot', methods=['GET'])
+def get_snapshot():
+    serialized = checkpoint_manager.latest_bytes()
+    if serialized is None:
+        return jsonify({"error": "Ainda não existe nenhum checkpoint"}), 404
+
+    response = Response(serialized, mimetype="application/json")
+    response.headers["X-Checkpoint-Index"] = str(checkpoint_manager.latest["index"])
+    return response
+
+@app.route('/snapshot/document_index', methods=['GET'])
+def get_snapshot_document_index():
+    """Snapshot do índice de documentos do último checkpoint (?index= confirma de que checkpoint)."""
+    checkpoint, serialized = checkpoint_manager.latest_document_index()
+    if checkpoint is None:
+        return jsonify({"error": "Ainda não existe nenhum checkpoint"}), 404
+    if request.args.get("index") not in (None, str(checkpoint["index"])):
+        return jsonify({"error": "Checkpoint substituído por um mais recente", "index": checkpoint["index"]}), 409
+
+    def generate(chunk_size=64 * 1024):
+        for start in range(0, len(serialized), chunk_size):
+            yield serialized[start:start + chunk_size]
+    response = Response(generate(), mimetype="application/json")
+    response.headers["X-Checkpoint-Index"] = str(checkpoint["index"])
+    return response
+
+@app.route('/blobs', methods=['PUT'])
+@app.route('/blobs/<digest>', methods=['PUT'])
+def put_blob(digest=None):
+    """Recebe um documento grande em streaming e guarda-o no armazenamento de blobs."""
+    if digest is not None and not re.fullmatch(r"[0-9a-f]{64}", digest):
+        return jsonify({"error": "O digest deve ser um SHA-256 em hexadecimal"}), 400
+    try:
+        digest, size = blob_store.put_stream(request.stream, expected_digest=digest)
+    except BlobMismatch as e:
+        return jsonify({"error": str(e)}), 422
+    logging.info(f"📄 Blob {digest[:16]}... guardado ({size} bytes).")
+    return jsonify({"blob": digest, "size": size}), 201
+
+@app.route('/blobs/<digest>', methods=['GET'])
+def get_blob(digest):
+    if not re.fullmatch(r"[0-9a-f]{64}", digest):
+        return jsonify({"error": "O digest deve ser um SHA-256 em hexadecimal"}), 400
+    # Um seguidor vai buscar o blob aos outros nós na primeira leitura (exceto se o pedido vier de outro nó)
+    if not blob_store.has(digest) and (request.args.get("local") or not blob_fetcher.fetch(digest)):
+        return jsonify({"error": "Blob inexistente"}), 404
+    response = Response(blob_store.iter_chunks(digest), mimetype="application/octet-stream")
+    response.headers["Content-Length"] = str(blob_store.size(digest))
+    return response
+
+@app.route('/verify/<doc_hash>', methods=['GET'])
+def verify_document(doc_hash):
+    doc_hash = doc_hash.lower()
+    if not re.fullmatch(r"[0-9a-f]{64}", doc_hash):
+        return jsonify({"error": "O hash do documento deve ser um SHA-256 em hexadecimal"}), 400
+
+    if partition_set is None:
+        location = blockchain.find_document(doc_hash)
+        partition = {}
+    else:
+        # Documentos registados com namespace só são encontrados com o mesmo namespace
+        owner = partition_set.route(doc_hash, request.args.get("namespace"))
+        location = owner.blockchain.find_document(doc_hash)
+        partition = {"partition": owner.id}
+    if location is None:
+        return jsonify({"doc_hash": doc_hash, "registered": False, **partition}), 404
+    return jsonify({"doc_hash": doc_hash, "registered": True, **partition, **location})
+
+@app.route('/proof/<int:block_index>/<int:position>', methods=['GET'])
+def get_proof(block_index, position):
+    try:
+        to_index = request.args.get("to_index")
+        to_index = int(to_index) if to_index is not None else None
+        partition_id = request.args.get("partition")
+        partition_id = int(partition_id) if partition_id is not None else None
+    except ValueError:
+        return jsonify({"error": "to_index e partition devem ser inteiros"}), 400
+
+    chain = blockchain
+    if partition_id is not None:
+        chain = partition_chain(partition_id)
+        if chain is None:
+            return jsonify({"error": "Partição inexistente"}), 404
+    try:
+        return jsonify(chain.get_proof(block_index, position, to_index))
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 409
+
+def node_status():
+    return {
         "node_address": NODE_ADDRESS,
         "is_leader": zk_coordinator.is_leader,
-        "chain_length": len(blockchain.chain),
-        "zookeeper_connected": zk_coordinator.is_connected()
-    })
+        "chain_length": blockchain.length(),
+        "zookeeper_connected": zk_coordinator.is_connected(),
+        "membership_version": zk_coordinator.membership_version,
+        "leader_epoch": zk_coordinator.leader_epoch,
+        "base_index": blockchain.base_index,
+        "checkpoint_index": checkpoint_manager.latest["index"] if checkpoint_manager.latest else None,
+        "replication": replication_manager.lag_report() if zk_coordinator.is_leader else None,
+        "partitions": len(partition_set) if partition_set is not None else 1,
+        "partitions_led": [p.id for p in partition_set.partitions if p.is_leader] if partition_set is not None else None
+    }
+
+def status_etag(status):
+    """
+    ETag do /status: o do seu conteúdo, que não depende só da cadeia (líder, membros,
+    atraso dos seguidores), sem os temporizadores (last_ack_s), que mudam a cada pedido.
+    """
+    stable = dict(status)
+    if stable.get("replication"):
+        stable["replication"] = {
+            address: {key: value for key, value in report.items() if key != "last_ack_s"}
+            for address, report in stable["replication"].items()
+        }
+    return hashlib.sha256(json.dumps(stable, sort_keys=True).encode()).hexdigest()[:32]
+
+@app.route('/status', methods=['GET'])
+def status():
+    current = node_status()
+    body = json.dumps(current, sort_keys=True).encode()
+    return conditional_response(status_etag(current), lambda: Response(body, mimetype="application/json"))
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+def run_async_server(port):
+    """Serve a app com o AsyncNodeServer (aiohttp) em vez do servidor de desenvolvimento do Flask."""
+    from async_server import AsyncNodeServer
+    server = AsyncNodeServer(app, workers=ASYNC_WORKERS, max_body_bytes=WIRE_MAX_BODY_BYTES)
+    server.run(host="0.0.0.0", port=port)
 
 if __name__ == '__main__':
     threading.Thread(target=zk_coordinator.run_leader_election, daemon=True).start()
     
-    # Espera que a ligação com o ZK esteja estabelecida antes de tentar sincronizar
-    while not zk_coordinator.is_connected():
-        time.sleep(1)
+    # Espera que a ligação com o ZK esteja estabelecida (e a cache de nós preenchida) antes de sincronizar
+    zk_coordinator.wait_until_ready()
 
     # **NOVO PASSO CRUCIAL: Sincroniza a blockchain com a rede antes de arrancar o servidor web**
     synchronize_blockchain_on_startup()
 
+    if partition_set is not None:
+        # As partições só entram na eleição depois de postas em dia
+        synchronize_partitions_on_startup()
+        partition_set.start()
+        partition_anchorer.start()
+
     port = 5000
-    logging.info(f"🚀 Nó {NODE_ADDRESS} pronto e a iniciar o servidor na porta {port}...")
-    app.run(host="0.0.0.0", port=port)
+    logging.info(f"🚀 Nó {NODE_ADDRESS} pronto e a iniciar o servidor ({SERVER_MODE}) na porta {port}...")
+    if SERVER_MODE == "async":
+        run_async_server(port)
+    else:
+        app.run(host="0.0.0.0", port=port)
 
@@ -0,0 +1,172 @@
+import math
+import time
+import threading
+import logging
+from blockchain import document_leaf
+from zk_utils import ZooKeeperCoordinator
+from replication import ReplicationManager, SyncReceiver
+from forwarding import LeaderProxy
+from batching import GroupCommitter
+from metrics import PARTITION_CHAIN_LENGTH, PARTITION_IS_LEADER
+
+def partition_for(doc_hash, partitions, namespace=None):
+    """
+    Partição dona de um documento: a do namespace, se indicado (todos os documentos
+    do namespace ficam na mesma cadeia), ou a do SHA-256 do documento.
+    """
+    key = document_leaf(namespace) if namespace else doc_hash
+    return int(key[:16], 16) % partitions
+
+class Partition:
+    """
+    Uma cadeia independente do modo particionado, com a sua eleição de líder (em
+    /cartorio/partitions/<id>), a sua replicação para os outros nós e o seu /sync.
+    """
+    def __init__(self, partition_id, node_address, zk, get_node_addresses, blockchain,
+                 replication_options=None, reorder_buffer=256, forward_options=None, batch_options=None):
+        self.id = partition_id
+        self.blockchain = blockchain
+        self.coordinator = ZooKeeperCoordinator(node_address, zk=zk, base_path=f"/cartorio/partitions/{partition_id}")
+        self.replication_manager = ReplicationManager(
+            node_address, get_node_addresses, blockchain=blockchain,
+            sync_path=f"/partitions/{partition_id}/sync", track_lag=False,
+            get_epoch=lambda: self.coordinator.epoch, **(replication_options or {})
+        )
+        self.coordinator.add_membership_listener(self.replication_manager.on_membership_change)
+        self.sync_receiver = SyncReceiver(blockchain, buffer_size=reorder_buffer)
+        self.leader_proxy = LeaderProxy(node_address, self.coordinator.get_leader_address, **(forward_options or {}))
+        # Garante que os blocos da partição entram nas filas de replicação pela ordem da cadeia
+        self.append_lock = threading.Lock()
+        self.group_committer = GroupCommitter(self._seal_batch, **(batch_options or {}))
+        PARTITION_CHAIN_LENGTH.labels(partition_id).set_function(blockchain.length)
+        PARTITION_IS_LEADER.labels(partition_id).set_function(lambda: int(self.coordinator.is_leader))
+
+    @property
+    def is_leader(self):
+        return self.coordinator.is_leader
+
+    def add_block(self, data):
+        """Cria um bloco na cadeia da partição (só no seu líder) e devolve (bloco, recibo de replicação)."""
+        with self.append_lock:
+            block = self.blockchain.add_block(data, epoch=self.coordinator.epoch)
+            receipt = self.replication_manager.replicate(block)
+        return block, receipt
+
+    def _seal_batch(self, documents):
+        with self.append_lock:
+            block = self.blockchain.add_batch_block(documents, epoch=self.coordinator.epoch)
+            receipt = self.replication_manager.replicate(block)
+        return block, receipt
+
+    def status(self):
+        return {
+            "partition": self.id,
+            "leader": self.coordinator.get_leader_address(),
+            "is_leader": self.coordinator.is_leader,
+            "leader_epoch": self.coordinator.leader_epoch,
+            "chain_length": self.blockchain.length(),
+            "head": self.blockchain.get_head(),
+            "replication": self.replication_manager.lag_report() if self.coordinator.is_leader else None
+        }
+
+class PartitionSet:
+    """
+    As N cadeias do modo particionado. Todos os nós replicam todas as partições,
+    mas cada partição tem o seu líder: um nó que lidere mais do que a sua parte
+    (ceil(N / nós ativos)) cede as partições a mais, e a capacidade de escrita
+    cresce com o número de nós.
+    """
+    def __init__(self, count, node_address, zk_coordinator, make_blockchain, rebalance_interval=5.0, **partition_options):
+        self.zk_coordinator = zk_coordinator
+        self.rebalance_interval = rebalance_interval
+        self.partitions = [
+            Partition(
+                partition_id, node_address, zk_coordinator.zk, zk_coordinator.get_active_node_addresses,
+                make_blockchain(partition_id), **partition_options
+            )
+            for partition_id in range(count)
+        ]
+
+    def __len__(self):
+        return len(self.partitions)
+
+    def __getitem__(self, partition_id):
+        return self.partitions[partition_id]
+
+    def route(self, doc_hash, namespace=None):
+        return self.partitions[partition_for(doc_hash, len(self.partitions), namespace)]
+
+    def start(self):
+        """Entra na eleição de todas as partições e inicia o reequilíbrio periódico dos líderes."""
+        for partition in self.partitions:
+            threading.Thread(target=partition.coordinator.run_leader_election, daemon=True).start()
+        threading.Thread(target=self._rebalance_loop, daemon=True).start()
+
+    def _rebalance_loop(self):
+        while True:
+            time.sleep(self.rebalance_interval)
+            try:
+                self.rebalance()
+            except Exception as e:
+                logging.error(f"Erro no reequilíbrio dos líderes das partições: {e}")
+
+    def rebalance(self):
+        """Cede a liderança das partições que este nó lidera acima da sua parte justa; devolve as cedidas."""
+        members = len(self.zk_coordinator.get_active_node_addresses())
+        if members < 2:
+            return []
+        fair_share = math.ceil(len(self.partitions) / members)
+        resigned = []
+        for partition in [partition for partition in self.partitions if partition.is_leader][fair_share:]:
+            # Só cede se outro nó já estiver na eleição da partição (senão voltaria a ganhá-la)
+            if partition.coordinator.resign():
+                logging.info(f"⚖️ A ceder a liderança da partição {partition.id} (parte justa: {fair_share} de {len(self.partitions)}).")
+                resigned.append(partition)
+        return resigned
+
+    def heads(self):
+        """Topo (índice e hash) da cadeia local de cada partição, para os blocos âncora."""
+        return {str(partition.id): partition.blockchain.get_head() for partition in self.partitions}
+
+    def status(self):
+        return [partition.status() for partition in self.partitions]
+
+class PartitionAnchorer:
+    """
+    Liga as partições entre si: o líder da cadeia principal regista periodicamente
+    um bloco âncora com o topo de cada partição. Como cada bloco fixa todos os
+    anteriores, a âncora prova a ordem entre registos de partições diferentes.
+    """
+    def __init__(self, partition_set, is_leader, write_block, interval=10.0):
+        # write_block(data) acrescenta o bloco âncora à cadeia principal e replica-o
+        self.partition_set = partition_set
+        self.is_leader = is_leader
+        self.write_block = write_block
+        self.interval = interval
+        self._last_heads = None
+        self._thread = None
+
+    def start(self):
+        if self._thread is None and self.interval > 0:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.anchor()
+            except Exception as e:
+                logging.error(f"Erro ao registar o bloco âncora das partições: {e}")
+
+    def anchor(self):
+        """Regista um bloco âncora se este nó for o líder e alguma partição tiver avançado."""
+        if not self.is_leader():
+            return None
+        heads = self.partition_set.heads()
+        if heads == self._last_heads:
+            return None
+        block = self.write_block({"anchor": heads})
+        self._last_heads = heads
+        logging.info(f"⚓ Bloco âncora {block.index} com o topo de {len(heads)} partições.")
+        return block
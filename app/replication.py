@@ -0,0 +1,473 @@
+import threading
+import queue
+import time
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+from blockchain import Block
+from wire import encode_sync_body
+from metrics import (
+    REPLICATION_RTT_SECONDS, REPLICATION_FAILURES, REPLICATION_BACKFILL_BLOCKS, REPLICATION_LAG_BLOCKS, SYNC_REJECTIONS
+)
+
+WRITE_CONCERNS = ("leader", "majority", "all")
+# Época de quem envia um /sync: é por ela (e não pela de cada bloco) que o seguidor recusa um líder destituído
+LEADER_EPOCH_HEADER = "X-Cartorio-Leader-Epoch"
+
+class ReplicationReceipt:
+    """
+    Acompanha as confirmações dos seguidores para um bloco replicado. O quórum é
+    calculado sobre replication_factor (o tamanho configurado do cluster), para que
+    não encolha quando os seguidores caem; sem ele, conta apenas quem está ativo.
+    """
+    def __init__(self, block_index, followers, replication_factor=None):
+        self.block_index = block_index
+        self.followers = followers
+        self.replication_factor = replication_factor
+        self._acked = set()
+        self._failed = set()
+        self._cond = threading.Condition()
+
+    @property
+    def cluster_size(self):
+        return max(self.replication_factor or 0, self.followers + 1)
+
+    @property
+    def replicas(self):
+        """Número de nós que têm o bloco, contando com o líder."""
+        return 1 + len(self._acked)
+
+    def ack(self, address):
+        with self._cond:
+            self._acked.add(address)
+            self._cond.notify_all()
+
+    def fail(self, address):
+        with self._cond:
+            self._failed.add(address)
+            self._cond.notify_all()
+
+    def required_replicas(self, write_concern):
+        if write_concern == "all":
+            return self.cluster_size
+        if write_concern == "majority":
+            return self.cluster_size // 2 + 1
+        return 1
+
+    def wait(self, replicas, timeout):
+        """
+        Espera até o bloco estar em `replicas` nós, até todos os seguidores terem
+        respondido ou até o prazo expirar. Devolve o número de réplicas alcançado.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self.replicas < replicas and len(self._acked) + len(self._failed) < self.followers:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return self.replicas
+
+class FollowerProgress:
+    """Topo da cadeia confirmado por um seguidor e instante da última confirmação."""
+    def __init__(self, address):
+        self.address = address
+        self.acked_index = None
+        self.acked_at = None
+
+    def update(self, tip_index):
+        self.acked_index = tip_index
+        self.acked_at = time.monotonic()
+
+    def lag(self, leader_tip_index):
+        if self.acked_index is None or leader_tip_index is None:
+            return None
+        return max(0, leader_tip_index - self.acked_index)
+
+    def report(self, leader_tip_index):
+        return {
+            "acked_index": self.acked_index,
+            "lag_blocks": self.lag(leader_tip_index),
+            "last_ack_s": None if self.acked_at is None else round(time.monotonic() - self.acked_at, 3)
+        }
+
+def sync_response_tip(body, blocks, ok):
+    """Topo do seguidor indicado na resposta ao /sync (ou deduzido de "applied", nos nós antigos)."""
+    tip_index = body.get("tip_index")
+    if tip_index is None:
+        tip_index = blocks[0].index - 1 + (len(blocks) if ok else body.get("applied", 0))
+    return tip_index, bool(body.get("buffered"))
+
+def parse_leader_epoch(value):
+    """Época indicada no cabeçalho LEADER_EPOCH_HEADER de um /sync (None se não vier); ValueError se for inválida."""
+    if value is None:
+        return None
+    epoch = int(value)
+    if epoch < 0:
+        raise ValueError(f"Época negativa: {epoch}")
+    return epoch
+
+def backfill_payload(blockchain, blocks, tip_index, buffered, max_backfill):
+    """
+    Próximo envio para um seguidor cujo topo é tip_index: os blocos em falta antes
+    do lote (lidos da cadeia local, no máximo max_backfill) seguidos dos blocos do
+    lote que ele ainda não tem. Se o seguidor guardou o lote à espera da lacuna, só
+    segue a lacuna. Devolve [] se não houver nada (ou não for possível) enviar.
+    """
+    pending = [block for block in blocks if block.index > tip_index]
+    if not pending:
+        return []
+    gap = pending[0].index - 1 - tip_index
+    if gap <= 0:
+        return pending
+    if blockchain is None:
+        return []
+    missing = list(blockchain.iter_blocks(tip_index + 1, min(gap, max_backfill)))
+    if not missing or missing[0].index != tip_index + 1:
+        return []  # A lacuna começa antes do primeiro bloco local (checkpoint de arranque)
+    if buffered or gap > max_backfill:
+        return missing
+    return missing + pending
+
+class FollowerReplicator:
+    """
+    Replica blocos para um único seguidor numa thread de longa duração, por ordem,
+    reutilizando uma ligação HTTP keep-alive (requests.Session). Os blocos que se
+    acumulam na fila seguem juntos num único /sync, o que permite ter muitos blocos
+    em voo sem perder a ordem. Cada resposta traz o topo do seguidor: se lhe faltarem
+    blocos anteriores ao lote, são reenviados da cadeia local no /sync seguinte, e um
+    seguidor atrasado continua a ser posto em dia mesmo sem blocos novos.
+    """
+    MAX_ATTEMPTS = 3
+
+    def __init__(self, address, queue_size=1024, timeout=5, max_batch=64, blockchain=None,
+                 max_backfill=1024, catch_up_interval=1.0, binary=True, compress_min_bytes=16 * 1024, sync_path="/sync",
+                 get_epoch=None):
+        self.address = address
+        self.sync_path = sync_path
+        self.get_epoch = get_epoch
+        # Formato binário no /sync, até o seguidor responder 415 (nó que só aceita JSON)
+        self.binary = binary
+        self.compress_min_bytes = compress_min_bytes
+        self.timeout = timeout
+        self.max_batch = max_batch
+        self.blockchain = blockchain
+        self.max_backfill = max_backfill
+        self.catch_up_interval = catch_up_interval
+        self.progress = FollowerProgress(address)
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        self.queue = queue.Queue(maxsize=queue_size)
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def enqueue(self, block, receipt):
+        """Coloca um bloco na fila do seguidor sem bloquear quem o produziu."""
+        try:
+            self.queue.put_nowait((block, receipt))
+            return True
+        except queue.Full:
+            logging.error(f"   ❌ Fila de replicação para {self.address} cheia: bloco {block.index} descartado.")
+            REPLICATION_FAILURES.labels(self.address, "queue_full").inc()
+            receipt.fail(self.address)
+            return False
+
+    def stop(self):
+        self._stopped.set()
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+    def _behind(self):
+        if self.blockchain is None or self.progress.acked_index is None:
+            return False
+        return self.progress.acked_index < self.blockchain.length() - 1
+
+    def _next_batch(self):
+        # Um seguidor atrasado é posto em dia sempre que a fila fica parada
+        delay = self.catch_up_interval
+        while self._behind():
+            try:
+                batch = [self.queue.get(timeout=delay)]
+                break
+            except queue.Empty:
+                acked_index = self.progress.acked_index
+                self._catch_up()
+                delay = self.catch_up_interval if self.progress.acked_index > acked_index else min(delay * 2, 30.0)
+        else:
+            batch = [self.queue.get()]
+        while batch[-1] is not None and len(batch) < self.max_batch:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stopped.is_set():
+            batch = self._next_batch()
+            stop = batch[-1] is None
+            if stop:
+                batch.pop()
+            if batch:
+                self._send(batch)
+            if stop:
+                break
+        for block, receipt in self._drain():
+            receipt.fail(self.address)
+        self.session.close()
+
+    def _drain(self):
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not None:
+                yield item
+
+    def _catch_up(self):
+        blocks = list(self.blockchain.iter_blocks(self.progress.acked_index + 1, self.max_backfill))
+        if blocks:
+            logging.info(f"🩹 Seguidor {self.address} atrasado no bloco {self.progress.acked_index}. A reenviar os blocos {blocks[0].index}-{blocks[-1].index}...")
+            REPLICATION_BACKFILL_BLOCKS.labels(self.address).inc(len(blocks))
+            self._deliver(blocks)
+
+    def _post(self, blocks):
+        """Envia um /sync (com novas tentativas em erros de ligação); devolve (topo do seguidor, lote guardado) ou (None, False)."""
+        first, last = blocks[0].index, blocks[-1].index
+        rtt = REPLICATION_RTT_SECONDS.labels(self.address)
+        for attempt in range(self.MAX_ATTEMPTS):
+            try:
+                started = time.perf_counter()
+                response = self.session.post(f"http://{self.address}{self.sync_path}", timeout=self.timeout, **self._request_body(blocks))
+                rtt.observe(time.perf_counter() - started)
+                if response.status_code == 415 and self.binary:
+                    logging.info(f"   ↩️ {self.address} não aceita o formato binário: a replicar em JSON.")
+                    self.binary = False
+                    continue
+                try:
+                    body = response.json()
+                except ValueError:
+                    body = {}
+                tip_index, buffered = sync_response_tip(body, blocks, response.status_code == 200)
+                self.progress.update(tip_index)
+                if response.status_code == 200:
+                    logging.info(f"   ✅ Blocos {first}-{last} replicados com sucesso para {self.address}")
+                elif tip_index < first - 1:
+                    logging.warning(f"   ⚠️ {self.address} está no bloco {tip_index}: faltam-lhe blocos anteriores ao {first}.")
+                    REPLICATION_FAILURES.labels(self.address, "gap").inc()
+                else:
+                    logging.error(f"   ❌ Falha ao replicar os blocos {first}-{last} para {self.address}: Status {response.status_code}, Resposta: {response.text}")
+                    REPLICATION_FAILURES.labels(self.address, f"http_{response.status_code}").inc()
+                return tip_index, buffered
+            except requests.exceptions.RequestException as e:
+                logging.error(f"   ❌ Erro de conexão ao replicar para {self.address} (tentativa {attempt + 1}): {e}")
+                REPLICATION_FAILURES.labels(self.address, "connection").inc()
+                if self._stopped.wait(0.5 * 2 ** attempt):
+                    break
+        return None, False
+
+    def _request_body(self, blocks):
+        epoch_headers = {LEADER_EPOCH_HEADER: str(self.get_epoch())} if self.get_epoch is not None else {}
+        if not self.binary:
+            return {"json": {"blocks": [block.to_dict() for block in blocks]}, "headers": epoch_headers}
+        body, headers = encode_sync_body(blocks, self.compress_min_bytes)
+        return {"data": body, "headers": {**headers, **epoch_headers}}
+
+    def _deliver(self, blocks):
+        """Envia os blocos e preenche as lacunas que o seguidor indicar; devolve o topo confirmado (ou None)."""
+        tip_index, buffered = self._post(blocks)
+        while tip_index is not None:
+            payload = backfill_payload(self.blockchain, blocks, tip_index, buffered, self.max_backfill)
+            if not payload:
+                break
+            if payload[0].index < blocks[0].index:
+                logging.info(f"🩹 A reenviar os blocos {payload[0].index}-{payload[-1].index} para {self.address}...")
+                REPLICATION_BACKFILL_BLOCKS.labels(self.address).inc(len(payload))
+            new_tip, buffered = self._post(payload)
+            if new_tip is None or new_tip <= tip_index:
+                break  # Sem progresso: o seguidor recusou os blocos (por exemplo, divergiu)
+            tip_index = new_tip
+        return tip_index
+
+    def _send(self, batch):
+        tip_index = self._deliver([block for block, _ in batch])
+        for block, receipt in batch:
+            if tip_index is not None and block.index <= tip_index:
+                receipt.ack(self.address)
+            else:
+                receipt.fail(self.address)
+
+class ReplicationManager:
+    """
+    Subsistema de replicação do líder: mantém um FollowerReplicator por seguidor
+    ativo, pelo que o envio para os vários seguidores decorre em paralelo e cada
+    seguidor recebe os blocos pela ordem em que foram criados. Com sync_path, o
+    mesmo subsistema replica a cadeia de uma partição para o seu endpoint de /sync.
+    """
+    def __init__(self, node_address, get_node_addresses, queue_size=1024, timeout=5, max_batch=64,
+                 blockchain=None, max_backfill=1024, catch_up_interval=1.0, binary=True, compress_min_bytes=16 * 1024,
+                 sync_path="/sync", track_lag=True, get_epoch=None, replication_factor=None):
+        self.node_address = node_address
+        self.sync_path = sync_path
+        # Época deste nó enquanto líder, enviada em cada /sync
+        self.get_epoch = get_epoch
+        # Tamanho configurado do cluster, sobre o qual se calcula o quórum das write concerns
+        self.replication_factor = replication_factor
+        # O gauge de atraso é por seguidor: só a cadeia principal o publica
+        self.track_lag = track_lag
+        self.get_node_addresses = get_node_addresses
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.max_batch = max_batch
+        self.blockchain = blockchain
+        self.max_backfill = max_backfill
+        self.catch_up_interval = catch_up_interval
+        self.binary = binary
+        self.compress_min_bytes = compress_min_bytes
+        self._replicators = {}
+        self._lock = threading.Lock()
+
+    def _refresh_followers(self):
+        followers = {addr for addr in self.get_node_addresses() if addr != self.node_address}
+        for address in set(self._replicators) - followers:
+            logging.info(f"➖ Seguidor {address} saiu do cluster. A parar a sua replicação.")
+            self._replicators.pop(address).stop()
+            if self.track_lag:
+                REPLICATION_LAG_BLOCKS.remove(address)
+        for address in followers - set(self._replicators):
+            logging.info(f"➕ Novo seguidor {address}. A iniciar a sua replicação.")
+            replicator = FollowerReplicator(
+                address, self.queue_size, self.timeout, self.max_batch, blockchain=self.blockchain,
+                max_backfill=self.max_backfill, catch_up_interval=self.catch_up_interval,
+                binary=self.binary, compress_min_bytes=self.compress_min_bytes, sync_path=self.sync_path,
+                get_epoch=self.get_epoch
+            )
+            self._replicators[address] = replicator
+            if self.blockchain is not None and self.track_lag:
+                REPLICATION_LAG_BLOCKS.labels(address).set_function(
+                    lambda progress=replicator.progress: progress.lag(self.blockchain.length() - 1)
+                )
+
+    def on_membership_change(self, members, version):
+        """Chamado pelo coordenador quando um nó entra ou sai do cluster."""
+        with self._lock:
+            # Só um nó que já está a replicar (o líder) mantém replicadores
+            if self._replicators:
+                self._refresh_followers()
+
+    def replicate(self, block):
+        """
+        Entrega o bloco às filas de todos os seguidores (deve ser chamado pela ordem
+        dos blocos) e devolve um recibo para esperar pelas confirmações.
+        """
+        with self._lock:
+            self._refresh_followers()
+            receipt = ReplicationReceipt(block.index, len(self._replicators), self.replication_factor)
+            if self._replicators:
+                logging.info(f"🔄 A replicar o bloco {block.index} para {len(self._replicators)} seguidores...")
+            for replicator in self._replicators.values():
+                replicator.enqueue(block, receipt)
+            return receipt
+
+    def lag_report(self):
+        """Topo confirmado e atraso (em blocos) de cada seguidor, para o /status do líder."""
+        with self._lock:
+            replicators = list(self._replicators.values())
+        tip_index = self.blockchain.length() - 1 if self.blockchain is not None else None
+        return {replicator.address: replicator.progress.report(tip_index) for replicator in replicators}
+
+class SyncReceiver:
+    """
+    Lado do seguidor do /sync: acrescenta os blocos recebidos do líder, aceita sem
+    erro os que já tem (reenvios) e guarda os que chegam ligeiramente fora de ordem
+    até a lacuna ser preenchida. A resposta indica sempre o topo local, para que o
+    líder saiba que blocos reenviar.
+    """
+    def __init__(self, blockchain, buffer_size=256):
+        self.blockchain = blockchain
+        self.buffer_size = buffer_size
+        self._buffer = {}
+        self._lock = threading.Lock()
+
+    def receive(self, blocks_data, known_epoch, leader_epoch=None):
+        """
+        Aplica os blocos de um /sync (objetos Block ou dicionários). leader_epoch é a
+        época de quem envia (cabeçalho LEADER_EPOCH_HEADER); sem ela, conta a maior
+        época do lote. Um pedido de um líder anterior a known_epoch é recusado por
+        inteiro, mas os blocos em si podem ser de épocas antigas (reenvio de blocos
+        anteriores a uma mudança de líder): a cadeia só exige que a época não desça.
+        Devolve um dicionário com "applied" (blocos do pedido já presentes na cadeia,
+        por ordem), "tip_index", "buffered" e, se algum bloco foi recusado ou ficou à
+        espera, "error".
+        """
+        blocks = [block if isinstance(block, Block) else Block.from_dict(block) for block in blocks_data]
+        sender_epoch = leader_epoch if leader_epoch is not None else max((block.epoch for block in blocks), default=known_epoch)
+        with self._lock:
+            accepted, error = 0, None
+            if sender_epoch < known_epoch:
+                logging.warning(f"⛔ /sync recusado: época {sender_epoch} de um líder antigo (atual: {known_epoch}).")
+                SYNC_REJECTIONS.labels("stale_epoch").inc()
+                error = "Época do líder obsoleta"
+                blocks = []
+            for block in blocks:
+                tip_index = self.blockchain.length() - 1
+                if block.index <= tip_index:
+                    # Reenvio de um bloco que já temos: só é aceite se for o mesmo bloco
+                    local_block = self.blockchain.get_block(block.index)
+                    if local_block is None or local_block.hash_bytes != block.hash_bytes:
+                        logging.warning(f"⚠️ Bloco {block.index} recebido do líder diverge do bloco local.")
+                        SYNC_REJECTIONS.labels("invalid_block").inc()
+                        error = "Bloco inválido ou fora de ordem"
+                        break
+                elif block.index > tip_index + 1:
+                    if not self._hold(block, tip_index):
+                        SYNC_REJECTIONS.labels("gap").inc()
+                        error = f"Lacuna: falta o bloco {tip_index + 1}"
+                        break
+                else:
+                    success, reason = self.blockchain.add_replicated_block(block)
+                    if not success:
+                        logging.warning(f"⚠️ Bloco {block.index} recebido do líder foi rejeitado ({reason}).")
+                        SYNC_REJECTIONS.labels("invalid_block").inc()
+                        error = "Bloco inválido ou fora de ordem"
+                        break
+                    self._drain()
+                accepted += 1
+
+            tip_index = self.blockchain.length() - 1
+            if error is None and blocks and blocks[-1].index > tip_index:
+                logging.info(f"📥 Blocos fora de ordem guardados à espera do bloco {tip_index + 1}.")
+                error = f"Lacuna: falta o bloco {tip_index + 1}"
+            result = {
+                "applied": sum(1 for block in blocks[:accepted] if block.index <= tip_index),
+                "tip_index": tip_index,
+                "buffered": len(self._buffer)
+            }
+            if error:
+                result["error"] = error
+            return result
+
+    def _hold(self, block, tip_index):
+        """Guarda um bloco que chegou antes dos anteriores, se couber na janela do buffer."""
+        for index in [index for index in self._buffer if index <= tip_index]:
+            del self._buffer[index]
+        if block.index - tip_index > self.buffer_size or \
+                (len(self._buffer) >= self.buffer_size and block.index not in self._buffer):
+            return False
+        self._buffer[block.index] = block
+        return True
+
+    def _drain(self):
+        """Aplica os blocos guardados que passaram a seguir-se ao topo local."""
+        while self._buffer:
+            block = self._buffer.pop(self.blockchain.length(), None)
+            if block is None:
+                return
+            if not self.blockchain.add_replicated_block(block)[0]:
+                logging.warning(f"⚠️ Bloco {block.index} guardado fora de ordem foi descartado.")
+                self._buffer.clear()
+                return
@@ -0,0 +1,85 @@
+import json
+import threading
+from collections import OrderedDict
+from wire import encode_block
+from metrics import SEGMENT_CACHE_LOOKUPS
+
+# Codificações guardadas: "json" serve as respostas JSON e NDJSON, "binary" o formato binário
+ENCODERS = {
+    "json": lambda block: json.dumps(block.to_dict()).encode(),
+    "binary": encode_block
+}
+
+def blocks_etag(snapshot, from_index, end, kind, encoding=None):
+    """ETag forte de um intervalo de blocos: muda com o topo da cadeia, o intervalo e a representação."""
+    return f"{snapshot.tip.hash}-{from_index}-{end}-{kind}" + (f"-{encoding}" if encoding else "")
+
+class SegmentCache:
+    """
+    Cache em processo dos blocos de uma cadeia já serializados, em segmentos
+    alinhados de segment_size blocos, para que leituras repetidas de /blockchain
+    não voltem a codificar a cadeia. Cada segmento guarda o hash do seu último
+    bloco e só é usado se a vista lida ainda o tiver; um bloco novo invalida o
+    segmento (incompleto) do topo e um fork os segmentos a partir do ponto de
+    divergência. Os segmentos menos usados saem quando se excede max_bytes.
+    """
+    def __init__(self, segment_size=256, max_bytes=64 * 1024 * 1024):
+        self.segment_size = segment_size
+        self.max_bytes = max_bytes
+        self._segments = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def on_block(self, block):
+        """Listener da cadeia: o segmento que recebeu o bloco deixou de estar completo na cache."""
+        self._discard(lambda start: start == block.index - block.index % self.segment_size)
+
+    def on_fork(self, index):
+        """Listener de forks: descarta os segmentos com blocos a partir de index."""
+        self._discard(lambda start: start + self.segment_size > index)
+
+    def _discard(self, predicate):
+        with self._lock:
+            for key in [key for key in self._segments if predicate(key[1])]:
+                self._bytes -= self._segments.pop(key)[2]
+
+    def segment(self, snapshot, start, encoding):
+        """
+        Blocos serializados do segmento alinhado que começa em start, até ao topo da
+        vista indicada (numa cadeia arrancada de um checkpoint, a partir da sua base).
+        """
+        first = max(start, snapshot.base_index)
+        end = min(start + self.segment_size, len(snapshot))
+        last_hash = snapshot.chain[end - 1].hash_bytes
+        key = (encoding, start)
+        with self._lock:
+            cached = self._segments.get(key)
+            if cached is not None and cached[0] == end and cached[1] == last_hash:
+                self._segments.move_to_end(key)
+                SEGMENT_CACHE_LOOKUPS.labels("hit").inc()
+                return cached[3]
+        SEGMENT_CACHE_LOOKUPS.labels("miss").inc()
+
+        encode = ENCODERS[encoding]
+        items = [encode(snapshot.chain[i]) for i in range(first, end)]
+        size = sum(len(item) for item in items)
+        with self._lock:
+            previous = self._segments.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[2]
+            self._segments[key] = (end, last_hash, size, items)
+            self._bytes += size
+            while self._bytes > self.max_bytes and len(self._segments) > 1:
+                self._bytes -= self._segments.popitem(last=False)[1][2]
+        return items
+
+    def iter_range(self, snapshot, from_index, end, encoding):
+        """Percorre os blocos serializados de [from_index, end), em listas de um segmento de cada vez."""
+        index = max(from_index, snapshot.base_index)
+        while index < end:
+            start = index - index % self.segment_size
+            items = self.segment(snapshot, start, encoding)
+            offset = index - max(start, snapshot.base_index)
+            count = min(end, start + self.segment_size) - index
+            yield items[offset:offset + count]
+            index += count
@@ -0,0 +1,324 @@
+import os
+import mmap
+import struct
+import zlib
+import threading
+import logging
+from collections import OrderedDict
+
+FSYNC_POLICIES = ("block", "batch", "interval")
+
+class BlockStore:
+    """
+    Motor de armazenamento persistente dos blocos: um log append-only dividido em
+    segmentos e um índice de offsets de largura fixa, mapeado em memória e
+    indexado pelo índice do bloco.
+
+    Políticas de fsync:
+      - "block": fsync após cada bloco escrito;
+      - "batch": fsync no fim de cada operação de escrita (um bloco ou um lote);
+      - "interval": fsync periódico numa thread de fundo.
+    """
+    RECORD_HEADER = struct.Struct(">II")  # tamanho do payload, CRC32 do payload
+    INDEX_ENTRY = struct.Struct(">IQI")   # segmento, offset do registo, tamanho do payload
+    INDEX_GROWTH = 65536                  # entradas acrescentadas ao índice de cada vez
+
+    def __init__(self, directory, fsync_policy="batch", fsync_interval=1.0, segment_size=64 * 1024 * 1024):
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"Política de fsync desconhecida: {fsync_policy}")
+        self.directory = directory
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self.segment_size = segment_size
+        self._lock = threading.RLock()
+        self._readers = {}
+        self._dirty = False
+        self._closed = threading.Event()
+
+        os.makedirs(directory, exist_ok=True)
+        self._open_index()
+        self._count = self._count_entries()
+        self._recover()
+        self._open_writer()
+
+        if fsync_policy == "interval":
+            threading.Thread(target=self._sync_periodically, daemon=True).start()
+
+    @property
+    def count(self):
+        """Número de blocos guardados."""
+        return self._count
+
+    # --- Índice -----------------------------------------------------------
+
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, f"segment-{segment:08d}.log")
+
+    def _open_index(self):
+        self._index_file = open(os.path.join(self.directory, "index.bin"), "a+b")
+        size = os.fstat(self._index_file.fileno()).st_size
+        capacity = max(self.INDEX_GROWTH, -(-size // self.INDEX_ENTRY.size))
+        self._map_index(capacity)
+
+    def _map_index(self, capacity):
+        self._index_file.truncate(capacity * self.INDEX_ENTRY.size)
+        self._index = mmap.mmap(self._index_file.fileno(), capacity * self.INDEX_ENTRY.size)
+        self._capacity = capacity
+
+    def _grow_index(self):
+        self._index.flush()
+        self._index.close()
+        self._map_index(self._capacity + self.INDEX_GROWTH)
+
+    def _entry(self, position):
+        return self.INDEX_ENTRY.unpack_from(self._index, position * self.INDEX_ENTRY.size)
+
+    def _set_entry(self, position, segment, offset, length):
+        if position >= self._capacity:
+            self._grow_index()
+        self.INDEX_ENTRY.pack_into(self._index, position * self.INDEX_ENTRY.size, segment, offset, length)
+
+    def _clear_entries(self, start, end):
+        self._index[start * self.INDEX_ENTRY.size:end * self.INDEX_ENTRY.size] = bytes((end - start) * self.INDEX_ENTRY.size)
+
+    def _count_entries(self):
+        """As entradas ocupadas formam um prefixo do índice (um payload nunca tem tamanho 0)."""
+        low, high = 0, self._capacity
+        while low < high:
+            mid = (low + high) // 2
+            if self._entry(mid)[2] > 0:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    # --- Recuperação ------------------------------------------------------
+
+    def _read_record(self, segment, offset):
+        """Lê um registo completo e íntegro do log, ou devolve None se estiver rasgado."""
+        path = self._segment_path(segment)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            f.seek(offset)
+            header = f.read(self.RECORD_HEADER.size)
+            if len(header) < self.RECORD_HEADER.size:
+                return None
+            length, crc = self.RECORD_HEADER.unpack(header)
+            payload = f.read(length)
+        if length == 0 or len(payload) < length or zlib.crc32(payload) != crc:
+            return None
+        return payload
+
+    def _recover(self):
+        """Descarta a cauda rasgada do índice e do log deixada por uma falha."""
+        count = self._count
+        while count > 0:
+            segment, offset, _ = self._entry(count - 1)
+            if self._read_record(segment, offset) is not None:
+                break
+            count -= 1
+        if count < self._count:
+            logging.warning(f"Índice com {self._count - count} entradas inválidas no fim. A descartá-las...")
+            self._clear_entries(count, self._count)
+            self._count = count
+
+        # Registos escritos no log mas ainda não no índice são reindexados
+        if self._count:
+            segment, offset, length = self._entry(self._count - 1)
+            position = offset + self.RECORD_HEADER.size + length
+        else:
+            segment, position = 0, 0
+
+        while True:
+            payload = self._read_record(segment, position)
+            if payload is None:
+                # Um segmento terminado sem cauda rasgada continua no seguinte
+                path = self._segment_path(segment)
+                next_exists = os.path.exists(self._segment_path(segment + 1))
+                if next_exists and os.path.exists(path) and os.path.getsize(path) == position:
+                    segment, position = segment + 1, 0
+                    continue
+                break
+            self._set_entry(self._count, segment, position, len(payload))
+            self._count += 1
+            position += self.RECORD_HEADER.size + len(payload)
+
+        path = self._segment_path(segment)
+        if os.path.exists(path) and os.path.getsize(path) > position:
+            logging.warning(f"Cauda rasgada no segmento {segment}: a truncar para {position} bytes.")
+            os.truncate(path, position)
+        self._remove_segments_after(segment)
+        self._index.flush()
+
+    def _remove_segments_after(self, segment):
+        for name in os.listdir(self.directory):
+            if name.startswith("segment-") and int(name[8:16]) > segment:
+                reader = self._readers.pop(int(name[8:16]), None)
+                if reader is not None:
+                    os.close(reader)
+                os.remove(os.path.join(self.directory, name))
+
+    # --- Escrita e leitura ------------------------------------------------
+
+    def _open_writer(self):
+        if self._count:
+            segment, offset, length = self._entry(self._count - 1)
+            position = offset + self.RECORD_HEADER.size + length
+        else:
+            segment, position = 0, 0
+        self._segment = segment
+        self._writer = open(self._segment_path(segment), "ab")
+        self._writer_position = position
+
+    def _roll_segment(self):
+        self._sync()
+        self._writer.close()
+        self._segment += 1
+        self._writer = open(self._segment_path(self._segment), "ab")
+        self._writer_position = 0
+
+    def append(self, payload):
+        """Acrescenta um bloco serializado ao log e devolve a sua posição."""
+        with self._lock:
+            if self._writer_position >= self.segment_size:
+                self._roll_segment()
+            self._writer.write(self.RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+            self._writer.flush()
+            self._set_entry(self._count, self._segment, self._writer_position, len(payload))
+            self._writer_position += self.RECORD_HEADER.size + len(payload)
+            self._count += 1
+            self._dirty = True
+            if self.fsync_policy == "block":
+                self._sync()
+            return self._count - 1
+
+    def commit(self):
+        """Marca o fim de uma operação de escrita (aplica a política "batch")."""
+        if self.fsync_policy == "batch":
+            with self._lock:
+                self._sync()
+
+    def read(self, position):
+        """Lê o bloco serializado guardado na posição dada."""
+        # Tudo sob o lock: o escritor pode remapear o índice (ao crescer) ou truncá-lo
+        # e voltar a escrever o log a partir desse ponto entre a leitura da entrada e o pread
+        with self._lock:
+            if not 0 <= position < self._count:
+                raise IndexError("Posição fora do armazenamento")
+            segment, offset, length = self._entry(position)
+            fd = self._readers.get(segment)
+            if fd is None:
+                fd = self._readers[segment] = os.open(self._segment_path(segment), os.O_RDONLY)
+            return os.pread(fd, length, offset + self.RECORD_HEADER.size)
+
+    def truncate(self, count):
+        """Mantém apenas os primeiros `count` blocos (usado ao resolver forks)."""
+        with self._lock:
+            if count >= self._count:
+                return
+            segment, offset, _ = self._entry(count)
+            self._clear_entries(count, self._count)
+            self._count = count
+
+            self._writer.close()
+            self._remove_segments_after(segment)
+            os.truncate(self._segment_path(segment), offset)
+            self._segment = segment
+            self._writer = open(self._segment_path(segment), "ab")
+            self._writer_position = offset
+            self._dirty = True
+            self._sync()
+
+    def _sync(self):
+        if not self._dirty:
+            return
+        self._writer.flush()
+        os.fsync(self._writer.fileno())
+        self._index.flush()
+        self._dirty = False
+
+    def _sync_periodically(self):
+        while not self._closed.wait(self.fsync_interval):
+            with self._lock:
+                self._sync()
+
+    def close(self):
+        with self._lock:
+            self._closed.set()
+            self._sync()
+            self._writer.close()
+            self._index.close()
+            self._index_file.close()
+            for fd in self._readers.values():
+                os.close(fd)
+            self._readers.clear()
+
+class StoredChain:
+    """
+    Sequência com a interface de uma lista de blocos, apoiada num BlockStore.
+    Os blocos mais recentes ficam em cache para evitar desserializações repetidas.
+    """
+    def __init__(self, store, encode, decode, cache_size=1024):
+        self.store = store
+        self.encode = encode
+        self.decode = decode
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        # Muda a cada truncagem, para que uma leitura anterior não volte a pôr na cache um bloco descartado
+        self._truncations = 0
+
+    def __len__(self):
+        return self.store.count
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self[i] for i in range(*key.indices(len(self)))]
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError("Índice de bloco fora da cadeia")
+
+        with self._lock:
+            block = self._cache.get(key)
+            if block is not None:
+                self._cache.move_to_end(key)
+                return block
+            truncations = self._truncations
+        block = self.decode(self.store.read(key))
+        self._remember(key, block, truncations)
+        return block
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __delitem__(self, key):
+        if not isinstance(key, slice) or key.stop is not None or key.step is not None:
+            raise TypeError("Apenas é possível truncar a cadeia (del chain[n:])")
+        start = key.indices(len(self))[0]
+        with self._lock:
+            self._truncations += 1
+        self.store.truncate(start)
+        with self._lock:
+            for index in [i for i in self._cache if i >= start]:
+                del self._cache[index]
+
+    def _remember(self, key, block, truncations=None):
+        with self._lock:
+            if truncations is not None and truncations != self._truncations:
+                return
+            self._cache[key] = block
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def append(self, block):
+        self._remember(self.store.append(self.encode(block)), block)
+        self.store.commit()
+
+    def extend(self, blocks):
+        for block in blocks:
+            self._remember(self.store.append(self.encode(block)), block)
+        self.store.commit()
@@ -0,0 +1,122 @@
+import os
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+def _first_invalid_in_chunk(payloads):
+    """Executado nos processos do pool: posição do primeiro bloco cujo hash não confere."""
+    # Importado aqui porque o módulo blockchain importa este módulo
+    from blockchain import Block
+    for position, payload in enumerate(payloads):
+        if not Block.from_bytes(payload).has_valid_hash():
+            return position
+    return None
+
+def _ready():
+    """Tarefa vazia usada para arrancar os processos do pool."""
+    return True
+
+class ChainValidator:
+    """
+    Valida sequências de blocos. O recálculo dos hashes é independente de bloco
+    para bloco e é repartido em pedaços por um pool de processos; a verificação
+    da ligação entre blocos (índice, hash anterior e época) é uma passagem sequencial
+    barata. Cadeias pequenas são validadas em série, sem custo de IPC.
+
+    O pool só existe depois de start(), que tem de ser chamado antes de o processo
+    criar threads; sem pool (ou se este falhar) a validação é feita em série.
+    """
+    def __init__(self, workers=None, chunk_size=4096, parallel_threshold=16384):
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.parallel_threshold = parallel_threshold
+        self._pool = None
+
+    def start(self):
+        """
+        Cria o pool e arranca já todos os seus processos, com "fork" (os processos não
+        reimportam o node.py). Um fork com outras threads ativas pode deixar um processo
+        do pool bloqueado para sempre num lock que estava tomado nesse instante (por
+        exemplo, o das métricas dos hashes), pelo que nesse caso o pool não é criado.
+        """
+        if self.workers <= 1 or self._pool is not None:
+            return False
+        if "fork" not in multiprocessing.get_all_start_methods():
+            logging.warning("⚠️ Sem fork nesta plataforma: a validação de cadeias é feita em série.")
+            return False
+        if threading.active_count() > 1:
+            logging.warning("⚠️ O processo já tem outras threads: a validação de cadeias é feita em série.")
+            return False
+        pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("fork"))
+        # Com "fork" o executor cria todos os processos na primeira tarefa, antes das suas threads
+        pool.submit(_ready).result()
+        self._pool = pool
+        logging.info(f"Pool de validação com {self.workers} processos.")
+        return True
+
+    def find_invalid(self, anchor_block, blocks):
+        """
+        Devolve o índice (na cadeia) do primeiro bloco inválido da sequência que
+        deve continuar anchor_block, ou None se a sequência for válida.
+        """
+        linked = len(blocks)
+        previous_block = anchor_block
+        for position, block in enumerate(blocks):
+            # As épocas dos líderes nunca diminuem ao longo da cadeia
+            if block.index != previous_block.index + 1 or block.previous_hash_bytes != previous_block.hash_bytes \
+                    or block.epoch < previous_block.epoch:
+                linked = position
+                break
+            previous_block = block
+
+        # Só interessa verificar os hashes até à primeira falha de ligação
+        bad_hash = self._first_invalid_hash(blocks[:linked])
+        if bad_hash is not None:
+            return anchor_block.index + 1 + bad_hash
+        if linked < len(blocks):
+            return anchor_block.index + 1 + linked
+        return None
+
+    def _first_invalid_hash(self, blocks):
+        pool = self._pool
+        if pool is None or len(blocks) < self.parallel_threshold:
+            return self._first_invalid_serial(blocks)
+        try:
+            return self._first_invalid_parallel(pool, blocks)
+        except RuntimeError as e:
+            # BrokenProcessPool (um processo do pool morreu) ou pool já encerrado: um pool
+            # novo exigiria um fork com as threads do nó ativas, por isso passa a ser em série
+            logging.error(f"❌ Falha no pool de validação ({e!r}): a validação passa a ser feita em série.")
+            self.shutdown()
+            return self._first_invalid_serial(blocks)
+
+    @staticmethod
+    def _first_invalid_serial(blocks):
+        for position, block in enumerate(blocks):
+            if not block.has_valid_hash():
+                return position
+        return None
+
+    def _first_invalid_parallel(self, pool, blocks):
+        futures = []
+        for start in range(0, len(blocks), self.chunk_size):
+            payloads = [block.to_bytes() for block in blocks[start:start + self.chunk_size]]
+            futures.append((start, pool.submit(_first_invalid_in_chunk, payloads)))
+
+        # Os pedaços são consultados por ordem para reportar a primeira falha
+        for i, (start, future) in enumerate(futures):
+            position = future.result()
+            if position is not None:
+                for _, pending in futures[i + 1:]:
+                    pending.cancel()
+                return start + position
+        return None
+
+    def shutdown(self):
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+# Validador em série usado quando nenhum é indicado
+SERIAL_VALIDATOR = ChainValidator(workers=1)
@@ -0,0 +1,158 @@
+import struct
+import zlib
+from blockchain import Block
+
+try:
+    import zstandard
+except ImportError:  # zstd é opcional: sem o pacote usa-se apenas zlib
+    zstandard = None
+
+# Formato binário dos blocos na rede: cada bloco é a sua serialização Block.to_bytes
+# (cabeçalho de tamanho fixo com os digests de 32 bytes e o timestamp em
+# microssegundos, seguido dos dados) precedida do seu comprimento em 4 bytes.
+BLOCKS_CONTENT_TYPE = "application/x-cartorio-blocks"
+_FRAME_LENGTH = struct.Struct(">I")
+
+# Codificações de compressão por ordem de preferência ("deflate" é o formato zlib)
+ENCODINGS = ("zstd", "deflate") if zstandard else ("deflate",)
+ACCEPT_ENCODING = ", ".join(ENCODINGS)
+
+class BodyTooLarge(ValueError):
+    """O corpo descomprimido excede o limite configurado."""
+
+def encode_block(block):
+    payload = block.to_bytes()
+    return _FRAME_LENGTH.pack(len(payload)) + payload
+
+def encode_blocks(blocks):
+    return b"".join(encode_block(block) for block in blocks)
+
+def encode_stream(blocks, chunk_size=64 * 1024):
+    """Codifica os blocos em pedaços de cerca de chunk_size bytes, para enviar em streaming."""
+    frames, size = [], 0
+    for block in blocks:
+        frame = encode_block(block)
+        frames.append(frame)
+        size += len(frame)
+        if size >= chunk_size:
+            yield b"".join(frames)
+            frames, size = [], 0
+    if frames:
+        yield b"".join(frames)
+
+def encode_sync_body(blocks, compress_min_bytes=16 * 1024):
+    """
+    Corpo binário de um /sync e respetivos cabeçalhos. Só os lotes grandes são
+    comprimidos, e sempre com zlib, que todos os nós suportam.
+    """
+    body = encode_blocks(blocks)
+    headers = {"Content-Type": BLOCKS_CONTENT_TYPE}
+    if len(body) >= compress_min_bytes:
+        body = compress(body, "deflate")
+        headers["Content-Encoding"] = "deflate"
+    return body, headers
+
+def decode_sync_body(body, content_encoding=None, max_length=None):
+    """
+    Blocos de um corpo binário de /sync (ValueError se a compressão não for suportada
+    ou BodyTooLarge se o corpo descomprimido exceder max_length bytes).
+    """
+    if content_encoding and content_encoding not in ENCODINGS:
+        raise ValueError(f"Compressão não suportada: {content_encoding}")
+    return decode_blocks(decompress(body, content_encoding, max_length))
+
+def decode_blocks(payload):
+    """Lê todos os blocos de um corpo binário completo."""
+    decoder = BlockDecoder()
+    blocks = decoder.feed(payload)
+    decoder.close()
+    return blocks
+
+class BlockDecoder:
+    """Descodifica blocos de um stream binário que chega em pedaços de tamanho arbitrário."""
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        """Acrescenta bytes recebidos e devolve os blocos que ficaram completos."""
+        self._buffer += data
+        blocks, offset = [], 0
+        while len(self._buffer) - offset >= _FRAME_LENGTH.size:
+            (length,) = _FRAME_LENGTH.unpack_from(self._buffer, offset)
+            end = offset + _FRAME_LENGTH.size + length
+            if len(self._buffer) < end:
+                break
+            blocks.append(Block.from_bytes(bytes(self._buffer[offset + _FRAME_LENGTH.size:end])))
+            offset = end
+        del self._buffer[:offset]
+        return blocks
+
+    def close(self):
+        if self._buffer:
+            raise ValueError("Stream binário de blocos truncado")
+
+def choose_encoding(accept_encoding):
+    """Escolhe, entre as aceites pelo cliente (cabeçalho Accept-Encoding), a compressão preferida."""
+    accepted = {part.split(";")[0].strip().lower() for part in (accept_encoding or "").split(",")}
+    return next((encoding for encoding in ENCODINGS if encoding in accepted), None)
+
+def compressor(encoding):
+    if encoding == "zstd" and zstandard:
+        return zstandard.ZstdCompressor().compressobj()
+    if encoding == "deflate":
+        return zlib.compressobj()
+    raise ValueError(f"Compressão não suportada: {encoding}")
+
+def decompressor(encoding):
+    if encoding == "zstd" and zstandard:
+        return zstandard.ZstdDecompressor().decompressobj()
+    if encoding == "deflate":
+        return zlib.decompressobj()
+    raise ValueError(f"Compressão não suportada: {encoding}")
+
+def compress(data, encoding):
+    engine = compressor(encoding)
+    return engine.compress(data) + engine.flush()
+
+def decompress(data, encoding, max_length=None):
+    """
+    Descomprime um corpo completo. Com max_length o descompressor nunca produz mais
+    do que max_length + 1 bytes (um corpo pequeno pode expandir para gigabytes) e um
+    resultado acima do limite dá BodyTooLarge.
+    """
+    if not encoding:
+        output = data
+    elif max_length is None:
+        output = decompressor(encoding).decompress(data)
+    elif encoding == "zstd" and zstandard:
+        reader = zstandard.ZstdDecompressor().stream_reader(data)
+        output, chunk = b"", b"."
+        while chunk and len(output) <= max_length:
+            chunk = reader.read(max_length + 1 - len(output))
+            output += chunk
+    elif encoding == "deflate":
+        output = zlib.decompressobj().decompress(data, max_length + 1)
+    else:
+        raise ValueError(f"Compressão não suportada: {encoding}")
+    if max_length is not None and len(output) > max_length:
+        raise BodyTooLarge(f"Corpo descomprimido excede o limite de {max_length} bytes")
+    return output
+
+def compress_stream(chunks, encoding):
+    """Comprime um stream de pedaços de bytes à medida que é produzido."""
+    engine = compressor(encoding)
+    for chunk in chunks:
+        compressed = engine.compress(chunk)
+        if compressed:
+            yield compressed
+    yield engine.flush()
+
+def decompress_stream(chunks, encoding):
+    if not encoding:
+        yield from chunks
+        return
+    engine = decompressor(encoding)
+    for chunk in chunks:
+        data = engine.decompress(chunk)
+        if data:
+            yield data
@@ -1,17 +1,55 @@
 from kazoo.client import KazooClient, KazooState
 from kazoo.exceptions import NodeExistsError, NoNodeError
+import json
 import time
+import threading
 import logging
+from metrics import ZK_CALL_SECONDS
+
+def _sequence_number(znode_name):
+    """Número de sequência atribuído pelo ZooKeeper a um znode sequencial ("n_0000000042")."""
+    return int(znode_name.rsplit("_", 1)[1])
 
 class ZooKeeperCoordinator:
-    """Gere a ligação com o ZooKeeper, a eleição de líder e o registo de nós."""
+    """
+    Gere a ligação com o ZooKeeper, a eleição de líder e o registo de nós. Cada
+    partição tem o seu próprio coordenador, com a eleição e o znode do líder em
+    base_path, que partilha o cliente Kazoo e o registo de nós do coordenador principal.
+    """
     
-    def __init__(self, node_address, hosts="zoo1:2181,zoo2:2181,zoo3:2181"):
+    def __init__(self, node_address, hosts="zoo1:2181,zoo2:2181,zoo3:2181", zk=None, base_path="/cartorio"):
         self.node_address = node_address
-        self.zk = KazooClient(hosts=hosts)
+        self.zk = zk or KazooClient(hosts=hosts)
         self.is_leader = False
-        self.leader_path = "/cartorio/leader"
+        self.leader_path = f"{base_path}/leader"
         self.nodes_path = "/cartorio/nodes"
+        self.election_path = f"{base_path}/election"
+
+        # Época do líder: cresce a cada eleição (vem do contador de sequência do
+        # ZooKeeper) e vai nos blocos, para que os seguidores recusem um líder antigo.
+        self.epoch = 0          # época deste nó enquanto for líder (0 se não for)
+        self.leader_epoch = 0   # maior época de líder conhecida
+        self._election_node = None
+        self._election_wakeup = threading.Event()
+        self._resign_requested = False
+        self._listening = False
+
+        # Cache local da composição do cluster e do líder, mantida pelos watches do
+        # ZooKeeper, para que o caminho dos pedidos nunca espere por uma ida ao ZK.
+        self._members = []
+        self._leader_address = None
+        self.membership_version = 0
+        self.leader_version = 0
+        self.membership_ready = threading.Event()
+        self._membership_listeners = []
+        self._leader_listeners = []
+        self._cache_lock = threading.Lock()
+        self._watches_started = False
+
+    def _call(self, operation, *args, **kwargs):
+        """Chama uma operação do cliente Kazoo e regista a sua latência."""
+        with ZK_CALL_SECONDS.labels(operation).time():
+            return getattr(self.zk, operation)(*args, **kwargs)
 
     def connect(self):
         """Tenta conectar-se ao ZooKeeper de forma robusta."""
@@ -19,91 +57,219 @@ class ZooKeeperCoordinator:
             try:
                 logging.info(f"({self.node_address}) A tentar conectar-se ao ZooKeeper...")
                 self.zk.start(timeout=10)
-                self.zk.add_listener(self._zk_listener)
                 logging.info(f"({self.node_address}) Conectado ao ZooKeeper com sucesso.")
             except Exception as e:
                 logging.error(f"({self.node_address}) Não foi possível conectar-se ao ZooKeeper: {e}. A tentar novamente em 5s...")
                 time.sleep(5)
+        # Com um cliente partilhado a ligação pode já existir, mas cada coordenador ouve o seu estado
+        if not self._listening:
+            self.zk.add_listener(self._zk_listener)
+            self._listening = True
         
         # Garantir que os caminhos base existem
-        self.zk.ensure_path(self.nodes_path)
+        self._call("ensure_path", self.nodes_path)
+        self._start_watches()
+
+    def _start_watches(self):
+        """Regista (uma única vez) os watches que mantêm a cache de nós e do líder."""
+        if self._watches_started:
+            return
+        self._watches_started = True
+        # O Kazoo volta a armar estes watches sozinho após reconexões e novas sessões
+        self.zk.ChildrenWatch(self.nodes_path, self._on_members_changed)
+        self.zk.DataWatch(self.leader_path, self._on_leader_changed)
+
+    def _on_members_changed(self, children):
+        with self._cache_lock:
+            self._members = sorted(children)
+            self.membership_version += 1
+            members, version = list(self._members), self.membership_version
+        self.membership_ready.set()
+        logging.info(f"({self.node_address}) Nós ativos (v{version}): {members}")
+        for listener in list(self._membership_listeners):
+            try:
+                listener(members, version)
+            except Exception as e:
+                logging.error(f"({self.node_address}) Erro num listener de membros: {e}")
+
+    def _on_leader_changed(self, data, stat):
+        address, epoch = _parse_leader_data(data)
+        with self._cache_lock:
+            self._leader_address = address
+            # Quando o líder cai a maior época conhecida mantém-se, para continuar a vedar o antigo líder
+            self.leader_epoch = max(self.leader_epoch, epoch)
+            self.leader_version += 1
+            leader, version = self._leader_address, self.leader_version
+        for listener in list(self._leader_listeners):
+            try:
+                listener(leader, version)
+            except Exception as e:
+                logging.error(f"({self.node_address}) Erro num listener do líder: {e}")
+
+    def add_membership_listener(self, callback):
+        """Regista callback(membros, versão), chamado sempre que um nó entra ou sai."""
+        self._membership_listeners.append(callback)
+
+    def add_leader_listener(self, callback):
+        """Regista callback(endereço_do_líder, versão), chamado sempre que o líder muda."""
+        self._leader_listeners.append(callback)
 
     def _zk_listener(self, state):
         """Ouve mudanças no estado da ligação com o ZooKeeper."""
         if state == KazooState.LOST:
             logging.warning(f"({self.node_address}) Ligação com o ZooKeeper perdida! A tentar reconectar...")
-            # A reconexão é gerida automaticamente pelo Kazoo
+            # A reconexão é gerida automaticamente pelo Kazoo; os znodes efémeros da sessão perderam-se
+            self._election_node = None
         elif state == KazooState.SUSPENDED:
             logging.warning(f"({self.node_address}) Ligação com o ZooKeeper suspensa.")
         else:
             logging.info(f"({self.node_address}) Estado do ZooKeeper mudou para: {state}")
+        # Este callback corre numa thread do Kazoo e não pode chamar o ZooKeeper: apenas acorda a eleição
+        if state == KazooState.SUSPENDED:
+            self.is_leader = False
+        self._election_wakeup.set()
 
     def run_leader_election(self):
-        """Inicia e mantém o processo de eleição de líder."""
+        """
+        Inicia e mantém o processo de eleição de líder. Cada nó cria um znode
+        efémero e sequencial em election_path; o de menor sequência é o líder e
+        cada um dos restantes observa apenas o seu antecessor, pelo que a queda de
+        um nó só acorda quem estava imediatamente atrás dele. O ciclo não faz
+        polling: só avança quando um watch ou uma mudança de estado da ligação o acorda.
+        """
         self.connect()
-        self.register_node()
-
+        delay = 0.1
         while True:
+            self._election_wakeup.clear()
             try:
-                # Tenta criar o nó de líder efémero. Se conseguir, torna-se líder.
-                self.zk.create(self.leader_path, self.node_address.encode(), ephemeral=True)
-                self.is_leader = True
-                logging.info(f"👑👑👑 Eu ({self.node_address}) fui eleito o novo LÍDER! 👑👑👑")
-                # Como líder, apenas espera até que a ligação caia.
-                while self.zk.connected:
-                    time.sleep(1)
-
-            except NodeExistsError:
-                # O nó de líder já existe, por isso este nó é um seguidor.
-                self.is_leader = False
-                leader_address = self.get_leader_address()
-                logging.info(f"👨‍💼 Um líder já existe em {leader_address}. Eu sou um seguidor.")
-                
-                # Espera aqui até que o nó do líder seja apagado.
-                # A anotação @self.zk.DataWatch cria um "observador" que re-executa esta função
-                # quando os dados no leader_path mudam (ou o nó é apagado).
-                leader_deleted_event = self.zk.handler.event_object()
-                
-                @self.zk.DataWatch(self.leader_path)
-                def watch_leader_node(data, stat):
-                    if data is None: # O nó foi apagado
-                        logging.warning("🚨 Líder caiu! Iniciando nova eleição...")
-                        leader_deleted_event.set() # Sinaliza que a eleição deve recomeçar
-                
-                # Pausa a execução aqui até que o líder caia
-                leader_deleted_event.wait()
-
+                if self.zk.state != KazooState.CONNECTED:
+                    self._step_down("ligação ao ZooKeeper suspensa ou perdida")
+                    self._election_wakeup.wait()
+                    continue
+                self.register_node()
+                self._run_election_round()
+                delay = 0.1
             except Exception as e:
-                logging.error(f"({self.node_address}) Erro no ciclo de eleição: {e}. A reiniciar o processo...")
-                time.sleep(5)
+                self._step_down("erro no ciclo de eleição")
+                logging.error(f"({self.node_address}) Erro no ciclo de eleição: {e}. A tentar novamente em {delay:.1f}s...")
+                self._election_wakeup.wait(delay)
+                delay = min(delay * 2, 5.0)
+
+    def _run_election_round(self):
+        """Uma volta da eleição: torna-se líder ou fica a observar o antecessor."""
+        if self._election_node is None or not self._call("exists", self._election_node):
+            self._election_node = self._call(
+                "create", f"{self.election_path}/n_", self.node_address.encode(),
+                ephemeral=True, sequence=True, makepath=True
+            )
+        my_name = self._election_node.rsplit("/", 1)[1]
+        candidates = sorted(self._call("get_children", self.election_path), key=_sequence_number)
+        position = candidates.index(my_name)
+
+        if position == 0:
+            self._become_leader(_sequence_number(my_name) + 1)
+            # Só uma mudança no estado da ligação (ou a cedência da liderança) tira a liderança a este nó
+            self._election_wakeup.wait()
+            if self._resign_requested:
+                self._resign()
+            return
 
+        self._step_down(None)
+        predecessor = f"{self.election_path}/{candidates[position - 1]}"
+        # exists() com watch: um único disparo, sem acumular observadores entre voltas
+        if self._call("exists", predecessor, watch=lambda event: self._election_wakeup.set()):
+            logging.info(f"👨‍💼 ({self.node_address}) Seguidor na posição {position}. A observar {candidates[position - 1]}.")
+            self._election_wakeup.wait()
+
+    def _become_leader(self, epoch):
+        """Publica este nó como líder com a sua época (a sequência do znode, mais um)."""
+        if self.is_leader and self.epoch == epoch:
+            return
+        payload = json.dumps({"address": self.node_address, "epoch": epoch}).encode()
+        try:
+            # Resto de um líder cuja sessão ainda não expirou: o seu znode de eleição já
+            # desapareceu, por isso a publicação já não lhe pertence
+            self._call("delete", self.leader_path)
+        except NoNodeError:
+            pass
+        self._call("create", self.leader_path, payload, ephemeral=True, makepath=True)
+        with self._cache_lock:
+            self.leader_epoch = max(self.leader_epoch, epoch)
+        self.epoch = epoch
+        self.is_leader = True
+        logging.info(f"👑👑👑 Eu ({self.node_address}) fui eleito o novo LÍDER (época {epoch})! 👑👑👑")
+
+    def resign(self):
+        """
+        Pede para ceder a liderança: o candidato seguinte passa a líder e este nó volta
+        ao fim da fila. Sem outro candidato vivo na eleição este nó voltaria a ganhar logo
+        a seguir (e a época subiria a cada tentativa), por isso aí não cede. Devolve True se pediu.
+        """
+        if not self.is_leader or not self._other_candidates():
+            return False
+        self._resign_requested = True
+        self._election_wakeup.set()
+        return True
+
+    def _other_candidates(self):
+        """Znodes de eleição de outros nós (os znodes guardam o endereço de quem os criou)."""
+        others = []
+        for child in self._call("get_children", self.election_path):
+            try:
+                data, _ = self._call("get", f"{self.election_path}/{child}")
+            except NoNodeError:
+                continue
+            if data.decode() != self.node_address:
+                others.append(child)
+        return others
+
+    def _resign(self):
+        self._resign_requested = False
+        self._step_down("liderança cedida a outro nó")
+        for path in (self.leader_path, self._election_node):
+            try:
+                self._call("delete", path)
+            except NoNodeError:
+                pass
+        self._election_node = None
+
+    def _step_down(self, reason):
+        if self.is_leader:
+            logging.warning(f"🚨 ({self.node_address}) Deixei de ser o líder da época {self.epoch}: {reason or 'nova eleição'}.")
+        self.is_leader = False
+        self.epoch = 0
 
     def register_node(self):
         """Regista este nó no caminho dos nós ativos."""
         path = f"{self.nodes_path}/{self.node_address}"
         try:
-            self.zk.create(path, ephemeral=True)
+            self._call("create", path, ephemeral=True)
             logging.info(f"({self.node_address}) Nó registado com sucesso no ZooKeeper.")
         except NodeExistsError:
             # Se já existir, pode ser de uma sessão anterior. Ignora.
             pass
 
     def get_leader_address(self):
-        """Obtém o endereço do nó líder atual."""
-        try:
-            leader_data, _ = self.zk.get(self.leader_path)
-            return leader_data.decode()
-        except NoNodeError:
-            return None
-        except Exception:
-            return None
+        """Obtém o endereço do nó líder atual (da cache local, sem ir ao ZooKeeper)."""
+        return self._leader_address
             
     def get_active_node_addresses(self):
-        """Retorna uma lista dos endereços de todos os nós ativos."""
-        try:
-            return self.zk.get_children(self.nodes_path)
-        except NoNodeError:
-            return []
+        """Retorna uma lista dos endereços de todos os nós ativos (da cache local)."""
+        return list(self._members)
+
+    def wait_until_ready(self, timeout=None):
+        """Espera pela primeira leitura dos nós ativos (a ligação ao ZK está feita e a cache preenchida)."""
+        return self.membership_ready.wait(timeout)
 
     def is_connected(self):
         return self.zk.connected
+
+def _parse_leader_data(data):
+    """Lê o conteúdo do znode do líder: JSON com endereço e época, ou só o endereço (formato antigo)."""
+    if not data:
+        return None, 0
+    try:
+        leader = json.loads(data)
+        return leader["address"], int(leader["epoch"])
+    except (ValueError, KeyError, TypeError):
+        return data.decode(), 0
@@ -0,0 +1,184 @@
+"""
+Micro-benchmarks das operações centrais de app/blockchain.py.
+
+Para cada comprimento de cadeia e tamanho de documento mede (mínimo, média e
+desvio-padrão de várias rondas, como o pytest-benchmark):
+  - Block.calculate_hash;
+  - ida e volta to_dict/from_dict;
+  - add_block e add_replicated_block (por bloco);
+  - is_chain_valid e replace_chain (cadeia inteira e por bloco);
+  - memória por bloco (tracemalloc).
+
+O tempo por bloco de cada operação é comparado entre comprimentos de cadeia:
+se crescer mais do que --max-growth vezes, a operação é assinalada como
+suspeita de comportamento quadrático.
+
+É um script autónomo, e não uma suite do pytest-benchmark, para não acrescentar
+dependências: as medições seguem o mesmo modelo (rondas com mínimo, média e
+desvio-padrão) e os resultados ficam num JSON para comparar versões.
+
+Uso:
+    python benchmarks/blockchain_bench.py --lengths 1000,10000,100000 --payloads 64,1024 --output resultados.json
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from blockchain import Blockchain, Block  # noqa: E402
+
+def measure(function, rounds, setup=None):
+    """
+    Executa function() `rounds` vezes (com setup() fora do tempo) e resume as
+    durações. As cadeias criadas pelo setup ou devolvidas são fechadas no fim de cada ronda.
+    """
+    durations = []
+    for _ in range(rounds):
+        argument = setup() if setup else None
+        gc.collect()
+        started = time.perf_counter()
+        result = function(argument) if setup else function()
+        durations.append(time.perf_counter() - started)
+        for created in (argument, result):
+            if isinstance(created, Blockchain):
+                created.close()
+    return {
+        "rounds": rounds,
+        "min_s": min(durations),
+        "mean_s": statistics.mean(durations),
+        "stddev_s": statistics.stdev(durations) if len(durations) > 1 else 0.0
+    }
+
+def per_item(stats, items):
+    stats["per_item_us"] = round(stats["min_s"] / items * 1e6, 3)
+    return stats
+
+def document(i, payload_size):
+    prefix = f"doc-{i:09d}-"
+    return prefix + "x" * max(0, payload_size - len(prefix))
+
+def build_chain(length, payload_size):
+    blockchain = Blockchain()
+    for i in range(1, length):
+        blockchain.add_block(document(i, payload_size))
+    return blockchain
+
+def memory_per_block(length, payload_size):
+    """Memória alocada pela cadeia, por bloco, medida com tracemalloc."""
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    blockchain = build_chain(length, payload_size)
+    allocated = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    return {"bytes_per_block": round(allocated / length, 1), "total_bytes": allocated}, blockchain
+
+def bench_size(length, payload_size, rounds):
+    print(f"📏 {length} blocos, documentos de {payload_size} bytes")
+    results = {"chain_length": length, "payload_bytes": payload_size}
+
+    results["memory"], blockchain = memory_per_block(length, payload_size)
+    blocks = list(blockchain.iter_blocks())
+    sample = blocks[len(blocks) // 2]
+    repeat = 1000
+
+    results["calculate_hash"] = per_item(
+        measure(lambda: [sample.calculate_hash() for _ in range(repeat)], rounds), repeat)
+    results["dict_round_trip"] = per_item(
+        measure(lambda: [Block.from_dict(sample.to_dict()) for _ in range(repeat)], rounds), repeat)
+    results["add_block"] = per_item(
+        measure(lambda: build_chain(length, payload_size), max(1, rounds // 2)), length - 1)
+
+    replicated = [Block.from_dict(block.to_dict()) for block in blocks[1:]]
+    def add_replicated(target):
+        for block in replicated:
+            target.add_replicated_block(block)
+    results["add_replicated_block"] = per_item(
+        measure(add_replicated, max(1, rounds // 2), setup=Blockchain), len(replicated))
+
+    results["is_chain_valid"] = per_item(
+        measure(lambda: Blockchain.is_chain_valid(blocks), rounds), length)
+
+    # replace_chain: a cadeia local é um prefixo de 90% da recebida
+    prefix_length = max(1, int(length * 0.9))
+    received = [block.to_dict() for block in blocks]
+    def prefix_chain():
+        target = Blockchain()
+        for block in replicated[:prefix_length - 1]:
+            target.add_replicated_block(block)
+        return target
+    results["replace_chain"] = per_item(
+        measure(lambda target: target.replace_chain(received), max(1, rounds // 2), setup=prefix_chain),
+        length - prefix_length)
+
+    blockchain.close()
+
+    for name in ("calculate_hash", "dict_round_trip", "add_block", "add_replicated_block", "is_chain_valid", "replace_chain"):
+        print(f"   {name:<22} {results[name]['per_item_us']:>10.2f} µs/item")
+    print(f"   {'memória':<22} {results['memory']['bytes_per_block']:>10.1f} bytes/bloco")
+    return results
+
+def scaling_report(runs, max_growth):
+    """Compara o tempo por bloco entre o menor e o maior comprimento de cada tamanho de documento."""
+    report = []
+    operations = ("add_block", "add_replicated_block", "is_chain_valid", "replace_chain")
+    for payload_size in sorted({run["payload_bytes"] for run in runs}):
+        same_payload = sorted((run for run in runs if run["payload_bytes"] == payload_size), key=lambda run: run["chain_length"])
+        if len(same_payload) < 2:
+            continue
+        smallest, largest = same_payload[0], same_payload[-1]
+        for operation in operations:
+            growth = largest[operation]["per_item_us"] / max(smallest[operation]["per_item_us"], 1e-9)
+            report.append({
+                "operation": operation,
+                "payload_bytes": payload_size,
+                "from_length": smallest["chain_length"],
+                "to_length": largest["chain_length"],
+                "per_item_growth": round(growth, 2),
+                "suspect_superlinear": growth > max_growth
+            })
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks da blockchain do Cartório Digital.")
+    parser.add_argument("--lengths", default="1000,10000,100000", help="comprimentos de cadeia (até 1000000)")
+    parser.add_argument("--payloads", default="64,1024", help="tamanhos de documento em bytes")
+    parser.add_argument("--rounds", type=int, default=3, help="rondas por medição")
+    parser.add_argument("--max-growth", type=float, default=3.0, help="crescimento máximo aceitável do tempo por bloco")
+    parser.add_argument("--output", default="blockchain_bench.json", help="ficheiro JSON de resultados")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    lengths = [int(length) for length in args.lengths.split(",") if length]
+    payloads = [int(size) for size in args.payloads.split(",") if size]
+    runs = [bench_size(length, payload_size, args.rounds) for payload_size in payloads for length in lengths]
+    scaling = scaling_report(runs, args.max_growth)
+    for entry in scaling:
+        if entry["suspect_superlinear"]:
+            print(f"⚠️  {entry['operation']} ({entry['payload_bytes']} bytes): tempo por bloco cresceu "
+                  f"{entry['per_item_growth']}x de {entry['from_length']} para {entry['to_length']} blocos")
+
+    results = {
+        "benchmark": "blockchain",
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": vars(args),
+        "runs": runs,
+        "scaling": scaling
+    }
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"💾 Resultados gravados em {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""
+Benchmark do cluster do Cartório Digital, sem Docker nem ZooKeeper.
+
+Arranca vários nós (cópias de app/node.py) no mesmo processo, cada um com o seu
+servidor HTTP, e substitui o ZooKeeperCoordinator por um coordenador falso em
+memória. Mede:
+  - débito e latências (p50/p95/p99) de /register sob carga concorrente;
+  - atraso de replicação por seguidor (do commit no líder até o bloco chegar ao seguidor);
+  - tempo de sincronização de um nó novo em função do comprimento da cadeia.
+
+Os resultados são gravados em JSON para comparar versões.
+
+Uso:
+    python benchmarks/cluster_bench.py --nodes 3 --clients 32 --requests 2000 --output resultados.json
+"""
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import platform
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+from werkzeug.serving import make_server
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")
+sys.path.insert(0, APP_DIR)
+
+import zk_utils  # noqa: E402  (precisa de APP_DIR no sys.path)
+
+class FakeCluster:
+    """Estado partilhado pelos coordenadores falsos: nós ativos e líder."""
+    def __init__(self):
+        self.members = []
+        self.leader = None
+        self.lock = threading.Lock()
+
+class FakeCoordinator:
+    """
+    Substituto em memória do ZooKeeperCoordinator, com a mesma interface usada
+    pelo node.py. O primeiro nó a registar-se é o líder (época 1).
+    """
+    cluster = FakeCluster()
+
+    def __init__(self, node_address, hosts=None):
+        self.node_address = node_address
+        self.membership_version = 1
+        self.leader_version = 1
+        self.membership_ready = threading.Event()
+        self.membership_ready.set()
+        with self.cluster.lock:
+            self.cluster.members.append(node_address)
+            if self.cluster.leader is None:
+                self.cluster.leader = node_address
+        self.leader_epoch = 1
+
+    @property
+    def is_leader(self):
+        return self.cluster.leader == self.node_address
+
+    @property
+    def epoch(self):
+        return 1 if self.is_leader else 0
+
+    def run_leader_election(self):
+        pass
+
+    def add_membership_listener(self, callback):
+        pass
+
+    def add_leader_listener(self, callback):
+        pass
+
+    def get_leader_address(self):
+        return self.cluster.leader
+
+    def get_active_node_addresses(self):
+        return list(self.cluster.members)
+
+    def wait_until_ready(self, timeout=None):
+        return True
+
+    def is_connected(self):
+        return True
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_node(env=None):
+    """Carrega uma cópia independente de node.py e serve a sua app Flask numa porta livre."""
+    port = free_port()
+    os.environ["NODE_ADDRESS"] = f"127.0.0.1:{port}"
+    for key, value in (env or {}).items():
+        os.environ[key] = value
+    spec = importlib.util.spec_from_file_location(f"node_{port}", os.path.join(APP_DIR, "node.py"))
+    node = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(node)
+    logging.getLogger().setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", port, node.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return node, f"127.0.0.1:{port}"
+
+def percentiles(samples):
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    def at(fraction):
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50_ms": round(at(0.50) * 1000, 3),
+        "p95_ms": round(at(0.95) * 1000, 3),
+        "p99_ms": round(at(0.99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3)
+    }
+
+class HeadSampler:
+    """Regista, para cada seguidor, o instante em que cada índice de bloco lá chegou."""
+    def __init__(self, followers, interval=0.002):
+        self.followers = followers
+        self.interval = interval
+        self.arrivals = {address: {} for address in followers}
+        self._stopped = threading.Event()
+        self._threads = [threading.Thread(target=self._run, args=(address,), daemon=True) for address in followers]
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        for thread in self._threads:
+            thread.join()
+
+    def _run(self, address):
+        session = requests.Session()
+        seen = 0
+        arrivals = self.arrivals[address]
+        while not self._stopped.is_set():
+            try:
+                head = session.get(f"http://{address}/blockchain/head", timeout=5).json()["index"]
+            except requests.exceptions.RequestException:
+                continue
+            now = time.perf_counter()
+            for index in range(seen + 1, head + 1):
+                arrivals[index] = now
+            seen = max(seen, head)
+            self._stopped.wait(self.interval)
+
+def run_register_load(leader_address, clients, total_requests, write_concern, payload_size):
+    """Envia total_requests pedidos /register a partir de `clients` threads."""
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=clients))
+    padding = "x" * max(0, payload_size - 16)
+    latencies, commits, errors = [], {}, []
+    lock = threading.Lock()
+
+    def register(i):
+        start = time.perf_counter()
+        try:
+            response = session.post(
+                f"http://{leader_address}/register",
+                json={"document": f"bench-{i:08d}-{padding}", "write_concern": write_concern}, timeout=30
+            )
+            elapsed = time.perf_counter()
+            with lock:
+                if response.status_code in (201, 202):
+                    latencies.append(elapsed - start)
+                    commits[response.json()["block"]["index"]] = elapsed
+                else:
+                    errors.append(response.status_code)
+        except requests.exceptions.RequestException as e:
+            with lock:
+                errors.append(repr(e))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        list(executor.map(register, range(total_requests)))
+    duration = time.perf_counter() - started
+    return {
+        "clients": clients,
+        "requests": total_requests,
+        "write_concern": write_concern,
+        "payload_bytes": payload_size,
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(len(latencies) / duration, 1) if duration else None,
+        "errors": len(errors),
+        "commit_latency": percentiles(latencies)
+    }, commits
+
+def replication_lag(commits, sampler, drain_timeout):
+    """Espera que os seguidores apanhem o líder e calcula o atraso de cada bloco por seguidor."""
+    deadline = time.perf_counter() + drain_timeout
+    last_index = max(commits) if commits else 0
+    while time.perf_counter() < deadline and any(last_index not in arrivals for arrivals in sampler.arrivals.values()):
+        time.sleep(0.01)
+    sampler.stop()
+
+    lag = {}
+    for address, arrivals in sampler.arrivals.items():
+        samples = [max(0.0, arrivals[index] - committed) for index, committed in commits.items() if index in arrivals]
+        lag[address] = percentiles(samples)
+        lag[address]["missing_blocks"] = len(commits) - len(samples)
+    return lag
+
+def sync_time_vs_length(leader, lengths, payload_size):
+    """Acrescenta blocos diretamente à cadeia do líder e mede quanto demora um nó novo a sincronizar."""
+    results = []
+    padding = "y" * max(0, payload_size - 16)
+    for length in sorted(lengths):
+        missing = length - leader.blockchain.length()
+        # Os blocos levam a época do líder: um bloco com época inferior à dos anteriores seria recusado
+        for i in range(max(0, missing)):
+            leader.blockchain.add_block(f"sync-{i:08d}-{padding}", epoch=leader.zk_coordinator.epoch)
+
+        node, address = start_node()
+        # O nó novo procura os pares mas não entra no cluster (o líder não lhe replica blocos)
+        with FakeCoordinator.cluster.lock:
+            FakeCoordinator.cluster.members.remove(address)
+        started = time.perf_counter()
+        node.synchronize_blockchain_on_startup()
+        duration = time.perf_counter() - started
+        assert node.blockchain.length() == leader.blockchain.length(), \
+            f"O nó novo só sincronizou {node.blockchain.length()} de {leader.blockchain.length()} blocos"
+        results.append({
+            "chain_length": leader.blockchain.length(),
+            "synced_length": node.blockchain.length(),
+            "sync_time_s": round(duration, 3),
+            "blocks_per_s": round(node.blockchain.length() / duration, 1) if duration else None
+        })
+        print(f"   🔄 {node.blockchain.length()} blocos sincronizados em {duration:.2f}s")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do cluster do Cartório Digital (em processo, sem ZooKeeper).")
+    parser.add_argument("--nodes", type=int, default=3, help="número de nós do cluster (o primeiro é o líder)")
+    parser.add_argument("--clients", type=int, default=32, help="clientes concorrentes de /register")
+    parser.add_argument("--requests", type=int, default=2000, help="total de pedidos /register")
+    parser.add_argument("--write-concern", default="leader", choices=("leader", "majority", "all"))
+    parser.add_argument("--payload-size", type=int, default=256, help="tamanho aproximado de cada documento (bytes)")
+    parser.add_argument("--sync-lengths", default="1000,5000,20000", help="comprimentos de cadeia para o teste de sincronização")
+    parser.add_argument("--drain-timeout", type=float, default=30.0, help="prazo para os seguidores apanharem o líder (s)")
+    parser.add_argument("--output", default="cluster_bench.json", help="ficheiro JSON de resultados")
+    args = parser.parse_args()
+
+    # O node.py importa o coordenador do zk_utils: tem de ser substituído antes de carregar os nós
+    zk_utils.ZooKeeperCoordinator = FakeCoordinator
+    logging.getLogger().setLevel(logging.WARNING)
+
+    print(f"🚀 A arrancar {args.nodes} nós em processo...")
+    nodes = [start_node() for _ in range(args.nodes)]
+    leader, leader_address = nodes[0]
+    followers = [address for _, address in nodes[1:]]
+
+    print(f"📝 {args.requests} pedidos /register com {args.clients} clientes (write concern: {args.write_concern})...")
+    sampler = HeadSampler(followers)
+    sampler.start()
+    load, commits = run_register_load(leader_address, args.clients, args.requests, args.write_concern, args.payload_size)
+    print(f"   ✅ {load['throughput_rps']} pedidos/s | p50 {load['commit_latency'].get('p50_ms')} ms | "
+          f"p99 {load['commit_latency'].get('p99_ms')} ms | erros: {load['errors']}")
+
+    print("📡 A medir o atraso de replicação...")
+    lag = replication_lag(commits, sampler, args.drain_timeout)
+    for address, stats in lag.items():
+        print(f"   {address}: p50 {stats.get('p50_ms')} ms | p99 {stats.get('p99_ms')} ms | em falta: {stats['missing_blocks']}")
+
+    print("⏱️  A medir o tempo de sincronização em função do comprimento da cadeia...")
+    lengths = [int(length) for length in args.sync_lengths.split(",") if length]
+    sync = sync_time_vs_length(leader, lengths, args.payload_size)
+
+    results = {
+        "benchmark": "cluster",
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": vars(args),
+        "register": load,
+        "replication_lag": lag,
+        "sync": sync
+    }
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"💾 Resultados gravados em {args.output}")
+
+if __name__ == "__main__":
+    main()
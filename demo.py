@@ -5,8 +5,10 @@ import sys
 import os
 from datetime import datetime
 import random
+import hashlib
 from colorama import init, Fore, Style
 import docker
+from app.merkle import verify_path, blob_leaf
 
 # Inicializar colorama para cores no terminal
 init(autoreset=True)
@@ -117,29 +119,27 @@ class CartorioDigitalDemo:
             self.print_status(f"❌ Erro ao processar blockchain: {e}", "erro")
 
     def registrar_documento(self, documento):
-        """Registra um novo documento no sistema, enviando-o para o líder."""
+        """Registra um novo documento no sistema. Qualquer nó aceita o pedido e reencaminha-o para o líder."""
         self.print_status(f"📝 Registrando: {documento[:50]}...", "info")
-        _, leader_url = self.get_node_status()
 
-        if not leader_url:
-            self.print_status("❌ Nenhum líder encontrado para registar o documento!", "erro")
-            return False
+        for node_url in self.nodes_urls:
+            try:
+                response = requests.post(f"{node_url}/register", json={"document": documento}, timeout=10)
+            except requests.exceptions.RequestException:
+                continue  # Nó offline: tenta o seguinte
 
-        try:
-            response = requests.post(f"{leader_url}/register", json={"document": documento}, timeout=10)
-            if response.status_code == 201:
+            if response.status_code in (201, 202):
                 block_data = response.json().get('block', {})
                 self.print_status("✅ Documento registrado com sucesso!", "sucesso")
                 print(f"   📦 Bloco: {block_data.get('index')} | Hash: {block_data.get('hash', '')[:16]}...")
-                print(f"   🏛️  Processado por: Nó {leader_url}")
+                print(f"   🏛️  Recebido por: Nó {node_url}")
                 return True
-            else:
-                self.print_status(f"❌ Erro ao registrar: {response.status_code} - {response.text}", "erro")
-                return False
-        except requests.exceptions.RequestException as e:
-            self.print_status(f"❌ Erro de conexão ao registrar: {str(e)}", "erro")
+            self.print_status(f"❌ Erro ao registrar: {response.status_code} - {response.text}", "erro")
             return False
 
+        self.print_status("❌ Nenhum nó disponível para registar o documento!", "erro")
+        return False
+
     def simular_falha_lider(self):
         """Simula uma falha real parando o contentor Docker do líder."""
         self.print_header("SIMULAÇÃO DE FALHA DO LÍDER", "🚨")
@@ -200,14 +200,15 @@ class CartorioDigitalDemo:
         blockchains = {}
         for i, node_url in enumerate(self.nodes_urls, 1):
             try:
-                response = requests.get(f"{node_url}/blockchain", timeout=5)
+                # Basta comparar o topo de cada nó, sem descarregar a cadeia completa
+                response = requests.get(f"{node_url}/blockchain/head", timeout=5)
                 if response.status_code == 200:
-                    chain = response.json().get('chain', [])
+                    head = response.json()
                     blockchains[f'Nó {i}'] = {
-                        'length': len(chain),
-                        'last_hash': chain[-1]['hash'] if chain else None,
+                        'length': head.get('length'),
+                        'last_hash': head.get('hash'),
                     }
-                    self.print_status(f"   ✅ Nó {i}: {len(chain)} blocos", "sucesso")
+                    self.print_status(f"   ✅ Nó {i}: {head.get('length')} blocos", "sucesso")
                 else:
                     self.print_status(f"   ❌ Nó {i}: Erro HTTP {response.status_code}", "erro")
             except requests.exceptions.RequestException:
@@ -231,6 +232,88 @@ class CartorioDigitalDemo:
         else:
             self.print_status("   ℹ️ Menos de dois nós online para comparar.", "info")
 
+    @staticmethod
+    def hash_cabecalho(cabecalho):
+        """Recalcula o hash de um bloco a partir do seu cabeçalho (formato canónico da blockchain)."""
+        campos = {k: cabecalho[k] for k in ('index', 'timestamp', 'previous_hash')}
+        if 'merkle_root' in cabecalho:
+            campos['merkle_root'] = cabecalho['merkle_root']
+            campos['data_hash'] = cabecalho['data_hash']
+        else:
+            campos['data'] = cabecalho['data']
+        # A época do líder só entra no hash quando não é zero (blocos anteriores às épocas)
+        if cabecalho.get('epoch'):
+            campos['epoch'] = cabecalho['epoch']
+        return hashlib.sha256(json.dumps(campos, sort_keys=True).encode()).hexdigest()
+
+    def verificar_prova_documento(self, documento):
+        """Verifica um registo como um cliente leve: prova de Merkle e cabeçalhos, sem descarregar a cadeia."""
+        self.print_header("VERIFICAÇÃO DE DOCUMENTO COM PROVA DE MERKLE", "🧾")
+        doc_hash = hashlib.sha256(documento.encode()).hexdigest()
+        self.print_status(f"📄 Documento: {documento[:50]} (SHA-256 {doc_hash[:16]}...)", "info")
+
+        try:
+            node_url = self.nodes_urls[0]
+            response = requests.get(f"{node_url}/verify/{doc_hash}", timeout=5)
+            if response.status_code != 200:
+                self.print_status("❌ Documento não registado.", "erro")
+                return False
+            local = response.json()
+            response = requests.get(f"{node_url}/proof/{local['block_index']}/{local['position']}", timeout=5)
+            if response.status_code != 200:
+                self.print_status(f"❌ Não foi possível obter a prova: {response.status_code} - {response.text}", "erro")
+                return False
+            prova = response.json()
+            tamanho_prova = len(response.content)
+
+            cabecalho = prova['header']
+            # A folha de um documento guardado como blob cobre também o seu tamanho
+            folha = blob_leaf(doc_hash, prova['blob_size']) if 'blob_size' in prova else doc_hash
+            if not verify_path(bytes.fromhex(folha), prova['merkle_path'], bytes.fromhex(cabecalho['merkle_root'])):
+                self.print_status("❌ O caminho de Merkle não leva à raiz do bloco!", "erro")
+                return False
+            if self.hash_cabecalho(cabecalho) != cabecalho['hash']:
+                self.print_status("❌ O hash do cabeçalho não confere!", "erro")
+                return False
+
+            anterior = cabecalho
+            cabecalhos, completa, total_cabecalhos = prova['headers'], prova['complete'], 0
+            while True:
+                for seguinte in cabecalhos:
+                    if seguinte['previous_hash'] != anterior['hash'] or self.hash_cabecalho(seguinte) != seguinte['hash']:
+                        self.print_status(f"❌ Ligação quebrada no bloco {seguinte['index']}!", "erro")
+                        return False
+                    anterior = seguinte
+                total_cabecalhos += len(cabecalhos)
+                if completa:
+                    break
+                # O nó envia no máximo max_headers cabeçalhos por prova: os seguintes vêm da prova do último bloco ligado
+                response = requests.get(f"{node_url}/proof/{anterior['index']}/0", timeout=5)
+                continuacao = response.json() if response.status_code == 200 else None
+                if continuacao is None or continuacao['header']['hash'] != anterior['hash'] or not continuacao['headers']:
+                    self.print_status(f"⚠️ Prova incompleta: os cabeçalhos só chegam ao bloco {anterior['index']}. Documento NÃO verificado.", "aviso")
+                    return False
+                cabecalhos, completa = continuacao['headers'], continuacao['complete']
+                tamanho_prova += len(response.content)
+
+            # O topo é confirmado noutro nó para não confiar apenas no que forneceu a prova
+            for outro_url in self.nodes_urls[1:]:
+                try:
+                    topo = requests.get(f"{outro_url}/blockchain/head", timeout=2).json()
+                    if topo['index'] == anterior['index']:
+                        estado = "✅" if topo['hash'] == anterior['hash'] else "❌"
+                        print(f"   {estado} Topo confirmado em {outro_url}: bloco {topo['index']}")
+                    break
+                except requests.exceptions.RequestException:
+                    continue
+
+            self.print_status(f"✅ Documento provado no bloco {prova['block_index']}, posição {prova['position']}.", "sucesso")
+            print(f"   🧾 Tamanho da prova: {tamanho_prova} bytes ({len(prova['merkle_path'])} irmãos, {total_cabecalhos} cabeçalhos)")
+            return True
+        except requests.exceptions.RequestException as e:
+            self.print_status(f"❌ Erro de conexão ao verificar o documento: {e}", "erro")
+            return False
+
     def executar_demo_interativa(self):
         """Executa a demonstração completa passo a passo."""
         self.print_banner()
@@ -250,6 +333,9 @@ class CartorioDigitalDemo:
         input("\nPressione ENTER para verificar a consistência dos dados...")
         self.verificar_consistencia()
         
+        input("\nPressione ENTER para verificar um documento com uma prova de Merkle...")
+        self.verificar_prova_documento(self.documentos_exemplo[0])
+
         input("\nPressione ENTER para ver a blockchain final após registros...")
         self.mostrar_blockchain()
         
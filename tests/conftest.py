@@ -0,0 +1,27 @@
+import os
+import sys
+import logging
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Os módulos da aplicação importam-se uns aos outros pelo nome, como dentro do contentor;
+# o demo.py e os benchmarks importam-se a partir da raiz do repositório
+sys.path.insert(0, os.path.join(ROOT, "app"))
+sys.path.insert(1, ROOT)
+logging.getLogger().setLevel(logging.WARNING)
+
+@pytest.fixture(scope="session")
+def node():
+    """
+    O módulo node.py (a app Flask e os componentes do nó), sem ZooKeeper nem pool de
+    validação; o nó faz de líder. As rotas partilham a mesma cadeia em memória.
+    """
+    os.environ.setdefault("VALIDATION_WORKERS", "1")
+    import node as node_module
+    logging.getLogger().setLevel(logging.WARNING)
+    node_module.zk_coordinator.is_leader = True
+    return node_module
+
+@pytest.fixture
+def client(node):
+    return node.app.test_client()
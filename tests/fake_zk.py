@@ -0,0 +1,118 @@
+import threading
+from kazoo.client import KazooState
+from kazoo.exceptions import NodeExistsError, NoNodeError
+
+class FakeZooKeeper:
+    """Servidor ZooKeeper em memória partilhado pelos clientes falsos de um teste."""
+    def __init__(self):
+        self.nodes = {}
+        self.owners = {}
+        self.sequences = {}
+        self.data_watches = {}
+        self.children_watches = {}
+        self.exists_watches = {}
+        self.lock = threading.RLock()
+
+    def client(self):
+        return FakeKazooClient(self)
+
+    def children(self, path):
+        return [node.rsplit("/", 1)[1] for node in self.nodes if node.rsplit("/", 1)[0] == path]
+
+    def changed(self, path):
+        """Dispara os watches afetados pela criação ou remoção de path (fora do lock)."""
+        for callback in list(self.data_watches.get(path, [])):
+            callback()
+        for callback in list(self.children_watches.get(path.rsplit("/", 1)[0], [])):
+            callback()
+        with self.lock:
+            once = self.exists_watches.pop(path, [])
+        for callback in once:
+            callback(None)
+
+class FakeKazooClient:
+    """O subconjunto do KazooClient usado pelo ZooKeeperCoordinator."""
+    def __init__(self, server):
+        self.server = server
+        self.state = KazooState.LOST
+        self.listeners = []
+
+    @property
+    def connected(self):
+        return self.state == KazooState.CONNECTED
+
+    def start(self, timeout=None):
+        self.state = KazooState.CONNECTED
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def ensure_path(self, path):
+        with self.server.lock:
+            self.server.nodes.setdefault(path, b"")
+
+    def create(self, path, value=b"", ephemeral=False, sequence=False, makepath=False):
+        with self.server.lock:
+            if sequence:
+                parent = path.rsplit("/", 1)[0]
+                number = self.server.sequences.get(parent, 0)
+                self.server.sequences[parent] = number + 1
+                path = f"{path}{number:010d}"
+            if path in self.server.nodes:
+                raise NodeExistsError()
+            self.server.nodes[path] = value
+            if ephemeral:
+                self.server.owners[path] = self
+        self.server.changed(path)
+        return path
+
+    def delete(self, path):
+        with self.server.lock:
+            if path not in self.server.nodes:
+                raise NoNodeError()
+            del self.server.nodes[path]
+            self.server.owners.pop(path, None)
+        self.server.changed(path)
+
+    def exists(self, path, watch=None):
+        with self.server.lock:
+            if path not in self.server.nodes:
+                return None
+            if watch:
+                self.server.exists_watches.setdefault(path, []).append(watch)
+            return True
+
+    def get(self, path):
+        with self.server.lock:
+            if path not in self.server.nodes:
+                raise NoNodeError()
+            return self.server.nodes[path], None
+
+    def get_children(self, path):
+        with self.server.lock:
+            return self.server.children(path)
+
+    def ChildrenWatch(self, path, callback):
+        def notify():
+            callback(self.get_children(path))
+        self.server.children_watches.setdefault(path, []).append(notify)
+        notify()
+
+    def DataWatch(self, path, callback):
+        def notify():
+            callback(self.server.nodes.get(path), None)
+        self.server.data_watches.setdefault(path, []).append(notify)
+        notify()
+
+    def expire(self):
+        """Simula a expiração da sessão: os znodes efémeros deste cliente desaparecem."""
+        with self.server.lock:
+            gone = [path for path, owner in self.server.owners.items() if owner is self]
+            for path in gone:
+                del self.server.nodes[path]
+                del self.server.owners[path]
+        self.state = KazooState.LOST
+        for listener in self.listeners:
+            listener(KazooState.LOST)
+        for path in gone:
+            self.server.changed(path)
@@ -0,0 +1,35 @@
+import threading
+from flask import Flask, request, jsonify
+from werkzeug.serving import make_server
+from replication import SyncReceiver, LEADER_EPOCH_HEADER, parse_leader_epoch
+from wire import BLOCKS_CONTENT_TYPE, decode_sync_body
+
+class FollowerServer:
+    """Seguidor mínimo em HTTP: um /sync como o do node.py, à frente de uma cadeia em memória."""
+    def __init__(self, blockchain, binary=True, known_epoch=0):
+        self.blockchain = blockchain
+        self.binary = binary
+        self.known_epoch = known_epoch
+        self.receiver = SyncReceiver(blockchain)
+        self.requests = []
+        self.epochs = []
+        app = Flask(__name__)
+        app.add_url_rule("/sync", view_func=self._sync, methods=["POST"])
+        self._server = make_server("127.0.0.1", 0, app, threaded=True)
+        self.address = f"127.0.0.1:{self._server.server_port}"
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def _sync(self):
+        if request.mimetype == BLOCKS_CONTENT_TYPE:
+            if not self.binary:
+                return jsonify({"error": "Formato não suportado"}), 415
+            blocks = decode_sync_body(request.get_data(), request.headers.get("Content-Encoding"))
+        else:
+            blocks = request.json["blocks"]
+        self.requests.append((request.mimetype, [block.index if hasattr(block, "index") else block["index"] for block in blocks]))
+        self.epochs.append(request.headers.get(LEADER_EPOCH_HEADER))
+        result = self.receiver.receive(blocks, self.known_epoch, parse_leader_epoch(self.epochs[-1]))
+        return jsonify(result), 409 if "error" in result else 200
+
+    def close(self):
+        self._server.shutdown()
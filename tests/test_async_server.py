@@ -0,0 +1,85 @@
+import asyncio
+import hashlib
+import threading
+import zlib
+from aiohttp.test_utils import TestServer, TestClient
+from async_server import AsyncNodeServer
+from blockchain import Block, document_leaf
+from forwarding import FORWARDED_HEADER
+from wire import BLOCKS_CONTENT_TYPE, encode_blocks
+
+def run(node, scenario, **options):
+    """Corre scenario(client) contra o AsyncNodeServer à frente da app Flask do nó de teste."""
+    async def main():
+        async with TestClient(TestServer(AsyncNodeServer(node.app, **options).build_app())) as client:
+            await scenario(client)
+    asyncio.run(main())
+
+def test_register_then_read_the_chain(node):
+    async def scenario(client):
+        response = await client.post("/register", json={"document": "escritura assíncrona"})
+        assert response.status == 201
+        token = (await response.json())["commit_token"]
+        assert node.blockchain.get_block(token["index"]).hash == token["hash"]
+
+        chain = (await (await client.get("/blockchain")).json())["chain"]
+        assert chain == [node.blockchain.get_block(i).to_dict() for i in range(node.blockchain.length())]
+        head = await client.get("/blockchain/head")
+        assert (await head.json())["length"] == node.blockchain.length()
+        cached = await client.get("/blockchain/head", headers={"If-None-Match": head.headers["ETag"]})
+        assert cached.status == 304
+    run(node, scenario)
+
+def test_every_route_of_the_node_is_served(node):
+    content = b"documento grande " * 1000
+    digest = hashlib.sha256(content).hexdigest()
+
+    async def scenario(client):
+        response = await client.post("/register/batch", json={"documents": ["ata", "procuração"]})
+        assert response.status == 201
+        batch = await response.json()
+        response = await client.get(f"/verify/{document_leaf('procuração')}")
+        assert (await response.json())["block_index"] == batch["block_index"]
+        response = await client.get(f"/proof/{batch['block_index']}/1")
+        assert response.status == 200
+
+        # O blob segue em streaming para o armazenamento e o registo só leva o digest
+        assert (await client.put(f"/blobs/{digest}", data=content)).status == 201
+        response = await client.post("/register", json={"blob": digest})
+        assert (await response.json())["block"]["data"] == {"blob": digest, "size": len(content)}
+        assert await (await client.get(f"/blobs/{digest}")).read() == content
+        assert (await client.get("/partitions")).status == 200
+    run(node, scenario)
+
+def test_min_index_read_waits_for_the_replicated_block(node):
+    async def scenario(client):
+        ahead = node.blockchain.length()
+        threading.Timer(0.05, node.blockchain.add_block, ["replicado entretanto"]).start()
+        response = await client.get(f"/blockchain/head?min_index={ahead}")
+        assert response.status == 200 and (await response.json())["index"] == ahead
+    run(node, scenario)
+
+def test_compressed_sync_is_applied_and_oversized_bodies_refused(node):
+    head = node.blockchain.get_block(node.blockchain.length() - 1)
+    block = Block(head.index + 1, head.timestamp, "documento " * 50, head.hash_bytes, epoch=head.epoch)
+    body = encode_blocks([block])
+
+    async def scenario(client):
+        headers = {"Content-Type": BLOCKS_CONTENT_TYPE, "Content-Encoding": "deflate"}
+        response = await client.post("/sync", data=zlib.compress(body), headers=headers)
+        assert response.status == 200 and (await response.json())["tip_index"] == block.index
+
+        response = await client.post("/sync", data=zlib.compress(body + b"\0" * len(body)), headers=headers)
+        assert response.status == 413
+        assert node.blockchain.length() == block.index + 1
+    run(node, scenario, max_body_bytes=len(body))
+
+def test_forwarded_write_on_a_follower_is_refused(node, monkeypatch):
+    monkeypatch.setattr(node.zk_coordinator, "is_leader", False)
+    monkeypatch.setattr(node.leader_proxy, "get_leader_address", lambda: "leader:5000")
+
+    async def scenario(client):
+        response = await client.post("/register", json={"document": "x"}, headers={FORWARDED_HEADER: "n3:5000"})
+        assert response.status == 403
+        assert (await response.json())["leader_hint"] == "leader:5000"
+    run(node, scenario)
@@ -0,0 +1,90 @@
+import threading
+import time
+import pytest
+from batching import GroupCommitter
+from blockchain import Blockchain
+
+def committer_for(chain, **options):
+    return GroupCommitter(lambda documents: (chain.add_batch_block(documents), None), **options)
+
+def test_concurrent_submissions_share_a_block():
+    chain = Blockchain()
+    committer = committer_for(chain, window_ms=200, max_size=64)
+    results = [None] * 8
+
+    def submit(i):
+        results[i] = committer.submit([f"doc {i}a", f"doc {i}b"], timeout=5)
+
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    blocks = {block.index for block, _, _ in results}
+    assert len(blocks) < 8
+    for i, (block, position, _) in enumerate(results):
+        assert [entry["document"] for entry in block.data[position:position + 2]] == [f"doc {i}a", f"doc {i}b"]
+
+def test_batches_respect_max_size():
+    chain = Blockchain()
+    committer = committer_for(chain, window_ms=100, max_size=3)
+    results = []
+    threads = [threading.Thread(target=lambda i=i: results.append(committer.submit([f"doc {i}"] * 2, timeout=5)))
+               for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(len(block.data) <= 3 for block, _, _ in results)
+    with pytest.raises(ValueError):
+        committer.submit(["x"] * 4)
+
+def test_seal_failure_reaches_every_waiter():
+    def seal(documents):
+        raise RuntimeError("disco cheio")
+    committer = GroupCommitter(seal, window_ms=1)
+    with pytest.raises(RuntimeError, match="disco cheio"):
+        committer.submit(["doc"], timeout=5)
+
+def test_submit_times_out_by_default_and_leaves_the_queue():
+    release = threading.Event()
+    sealed = []
+
+    def seal(documents):
+        release.wait(5)
+        sealed.append(documents)
+        return None, None
+
+    committer = GroupCommitter(seal, window_ms=1, timeout=0.2)
+    first = threading.Thread(target=lambda: pytest.raises(TimeoutError, committer.submit, ["a"]))
+    first.start()
+    time.sleep(0.05)
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        committer.submit(["b"])
+    assert time.monotonic() - started < 2
+    release.set()
+    first.join()
+    time.sleep(0.05)
+    # "a" já estava a ser selado; "b" expirou ainda na fila e nunca é selado
+    assert sealed == [["a"]]
+
+def test_dead_committer_thread_fails_waiters_and_restarts():
+    chain = Blockchain()
+    committer = committer_for(chain, window_ms=1)
+    original = committer._next_batch
+    calls = []
+
+    def broken_next_batch():
+        batch = original()
+        if not calls:
+            calls.append(batch)
+            raise MemoryError("sem memória")
+        return batch
+
+    committer._next_batch = broken_next_batch
+    with pytest.raises(RuntimeError, match="sem memória"):
+        committer.submit(["doc"], timeout=5)
+    block, position, _ = committer.submit(["doc 2"], timeout=5)
+    assert block.data[position]["document"] == "doc 2"
@@ -0,0 +1,53 @@
+import io
+import hashlib
+import pytest
+from blob_store import BlobStore, BlobMismatch
+from blockchain import Blockchain, Block
+from merkle import blob_leaf, verify_path
+
+def test_blob_round_trip_in_chunks(tmp_path):
+    store = BlobStore(str(tmp_path), chunk_size=4)
+    content = b"escritura de 22 bytes!"
+    digest, size = store.put_bytes(content)
+    assert digest == hashlib.sha256(content).hexdigest() and size == len(content)
+    assert store.size(digest) == size
+    assert b"".join(store.iter_chunks(digest)) == content
+    assert len(store.manifest(digest)["chunks"]) == 6
+
+def test_digest_mismatch_is_rejected(tmp_path):
+    store = BlobStore(str(tmp_path))
+    with pytest.raises(BlobMismatch):
+        store.put_stream(io.BytesIO(b"x"), expected_digest="0" * 64)
+    assert not store.has("0" * 64)
+
+def _blob_block():
+    content = b"documento grande"
+    chain = Blockchain()
+    block = chain.add_block({"blob": hashlib.sha256(content).hexdigest(), "size": len(content)}, epoch=1)
+    return chain, block
+
+def test_blob_proof_covers_size():
+    chain, block = _blob_block()
+    proof = chain.get_proof(block.index, 0)
+    leaf = blob_leaf(proof["doc_hash"], proof["blob_size"])
+    root = bytes.fromhex(proof["header"]["merkle_root"])
+    assert verify_path(bytes.fromhex(leaf), proof["merkle_path"], root)
+    assert not verify_path(bytes.fromhex(blob_leaf(proof["doc_hash"], proof["blob_size"] + 1)), proof["merkle_path"], root)
+
+@pytest.mark.parametrize("change", [
+    lambda data: data.update(size=data["size"] * 1000),
+    lambda data: data.update(size=True),
+    lambda data: data.update(owner="mallory"),
+])
+def test_blob_reference_cannot_be_rewritten(change):
+    _, block = _blob_block()
+    block_dict = block.to_dict()
+    change(block_dict["data"])
+    assert not Block.from_dict(block_dict).has_valid_hash()
+
+@pytest.mark.parametrize("document", [{"blob": "0" * 64, "size": 1}, ["escritura"], 42, ""])
+def test_register_accepts_only_text_documents_outside_the_blob_path(client, node, document):
+    length = node.blockchain.length()
+    response = client.post("/register", json={"document": document})
+    assert response.status_code == 400
+    assert node.blockchain.length() == length
@@ -0,0 +1,44 @@
+import hashlib
+import json
+from datetime import datetime
+import pytest
+from blockchain import Block, Blockchain
+
+def legacy_hash(index, timestamp, data, previous_hash):
+    """Hash do formato original do bloco (todos os campos em JSON, sem raiz de Merkle)."""
+    return hashlib.sha256(json.dumps({
+        "index": index, "timestamp": timestamp.isoformat(), "data": data, "previous_hash": previous_hash
+    }, sort_keys=True).encode()).hexdigest()
+
+def test_legacy_blocks_keep_their_hash():
+    genesis = Blockchain().get_block(0)
+    assert genesis.hash == legacy_hash(0, datetime(2022, 12, 31, 21, 0, 0), "Genesis Block", "0")
+    timestamp = datetime(2023, 5, 1, 12, 30, 15, 123456)
+    block = Block(1, timestamp, {"nome": "contrato", "páginas": 3}, genesis.hash)
+    assert block.hash == legacy_hash(1, timestamp, {"nome": "contrato", "páginas": 3}, genesis.hash)
+    assert block.timestamp == timestamp
+
+@pytest.mark.parametrize("epoch", [0, 7])
+def test_binary_and_dict_round_trips(epoch):
+    chain = Blockchain()
+    blocks = [chain.get_block(0), chain.add_block("escritura", epoch=epoch), chain.add_batch_block(["a", "b"], epoch=epoch)]
+    for block in blocks:
+        for copy in (Block.from_bytes(block.to_bytes()), Block.from_dict(block.to_dict())):
+            assert copy.to_dict() == block.to_dict()
+            assert copy.to_bytes() == block.to_bytes()
+            assert copy.has_valid_hash()
+
+def test_truncated_or_garbled_binary_blocks_raise_value_error():
+    payload = Blockchain().add_block("escritura", epoch=3).to_bytes()
+    garbled = bytearray(payload)
+    garbled[16] = 0xff  # Byte das flags
+    for bad in (payload[:10], payload[:Block.BINARY_HEADER.size + 2], bytes(garbled)):
+        with pytest.raises(ValueError):
+            Block.from_bytes(bad)
+
+def test_blocks_are_slotted():
+    block = Blockchain().add_block("escritura")
+    assert not hasattr(block, "__dict__")
+    assert len(block.hash_bytes) == len(block.previous_hash_bytes) == 32
+    with pytest.raises(AttributeError):
+        block.extra = 1
@@ -0,0 +1,22 @@
+import threading
+from blockchain import Blockchain
+from benchmarks import blockchain_bench
+
+def writer_threads():
+    return sum(1 for thread in threading.enumerate() if thread.name == "chain-writer")
+
+def test_close_stops_the_writer():
+    before = writer_threads()
+    chain = Blockchain()
+    chain.add_block("contrato")
+    assert writer_threads() == before + 1
+    chain.close()
+    assert writer_threads() == before
+
+def test_benchmark_closes_the_chains_it_creates():
+    before = writer_threads()
+    results = blockchain_bench.bench_size(200, 64, rounds=2)
+    assert writer_threads() == before
+    assert results["add_block"]["rounds"] == 1 and results["is_chain_valid"]["per_item_us"] > 0
+    report = blockchain_bench.scaling_report([results, blockchain_bench.bench_size(400, 64, rounds=2)], max_growth=1000)
+    assert {entry["operation"] for entry in report} == {"add_block", "add_replicated_block", "is_chain_valid", "replace_chain"}
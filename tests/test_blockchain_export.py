@@ -0,0 +1,32 @@
+import json
+
+def register(client, count):
+    for i in range(count):
+        assert client.post("/register", json={"document": f"página {i}"}).status_code == 201
+
+def test_paginated_export(client, node):
+    register(client, 5)
+    length = node.blockchain.length()
+    response = client.get(f"/blockchain?from_index={length - 3}&limit=2")
+    assert response.status_code == 200
+    chain = response.get_json()["chain"]
+    assert [block["index"] for block in chain] == [length - 3, length - 2]
+    assert chain == [node.blockchain.get_block(i).to_dict() for i in (length - 3, length - 2)]
+    assert client.get(f"/blockchain?from_index={length}").get_json() == {"chain": []}
+
+def test_ndjson_export_streams_one_block_per_line(client, node):
+    register(client, 2)
+    response = client.get("/blockchain?format=ndjson&from_index=1")
+    assert response.mimetype == "application/x-ndjson"
+    lines = response.data.decode().splitlines()
+    assert [json.loads(line)["index"] for line in lines] == list(range(1, node.blockchain.length()))
+
+def test_head(client, node):
+    register(client, 1)
+    head = client.get("/blockchain/head").get_json()
+    tip = node.blockchain.get_block(node.blockchain.length() - 1)
+    assert head == {"index": tip.index, "hash": tip.hash, "length": node.blockchain.length()}
+
+def test_invalid_pagination(client):
+    assert client.get("/blockchain?from_index=-1").status_code == 400
+    assert client.get("/blockchain?limit=abc").status_code == 400
@@ -0,0 +1,93 @@
+import json
+import threading
+from flask import Flask, Response, jsonify, request
+from werkzeug.serving import make_server
+from blockchain import Blockchain, Block, document_leaf
+from wire import BLOCKS_CONTENT_TYPE
+
+def build(documents):
+    chain = Blockchain()
+    for document in documents:
+        chain.add_block(document)
+    return chain
+
+def blocks_of(chain, start=1):
+    return [chain.get_block(i).to_dict() for i in range(start, chain.length())]
+
+def test_suffix_is_appended_after_the_local_tip():
+    leader = build(["a", "b", "c", "d"])
+    follower = build([])
+    follower.add_replicated_block(leader.get_block(1))
+    assert follower.append_suffix(1, blocks_of(leader, 2)) == (True, "Cadeia atualizada com sucesso")
+    assert [follower.get_block(i).hash for i in range(5)] == [leader.get_block(i).hash for i in range(5)]
+
+def test_longer_fork_replaces_the_local_suffix_and_reindexes():
+    leader = build(["a", "b", "c"])
+    follower = build([])
+    follower.add_replicated_block(leader.get_block(1))
+    follower.add_block("local")
+    assert follower.find_document(document_leaf("local")) is not None
+    forks = []
+    follower.add_fork_listener(forks.append)
+
+    assert follower.append_suffix(1, blocks_of(leader, 2))[0]
+    assert forks == [2]
+    assert follower.get_block(2).hash == leader.get_block(2).hash
+    assert follower.find_document(document_leaf("local")) is None
+    assert follower.find_document(document_leaf("c"))["block_index"] == 3
+
+def test_rejected_suffixes_leave_the_chain_untouched():
+    leader = build(["a", "b", "c", "d", "e"])
+    follower = build(["x", "y", "z"])
+    tip = follower.get_head()
+    assert follower.append_suffix(10, blocks_of(leader, 11)) == (False, "Ancestral comum desconhecido")
+    assert follower.append_suffix(0, blocks_of(leader, 1)[:2]) == (False, "Cadeia não é mais longa")
+    # O bloco 1 do seguidor não é o pai do bloco 2 do líder
+    assert follower.append_suffix(1, blocks_of(leader, 2)) == (False, "Cadeia inválida")
+
+    tampered = blocks_of(leader, 1) + [Block(4, leader.get_block(3).timestamp, "forjado", leader.get_block(3).hash).to_dict()]
+    tampered[1]["data"] = "alterado"
+    assert follower.append_suffix(0, tampered) == (False, "Cadeia inválida")
+    assert follower.get_head() == tip
+
+class PeerServer:
+    """Outro nó mínimo, que serve /blockchain/head e /blockchain (em NDJSON ou, se corrompido, num binário ilegível)."""
+    def __init__(self, chain, corrupt=False):
+        self.chain = chain
+        self.corrupt = corrupt
+        app = Flask(__name__)
+        app.add_url_rule("/blockchain/head", view_func=lambda: jsonify(self.chain.get_head()))
+        app.add_url_rule("/blockchain", view_func=self._blocks)
+        self._server = make_server("127.0.0.1", 0, app, threaded=True)
+        self.address = f"127.0.0.1:{self._server.server_port}"
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def _blocks(self):
+        if self.corrupt:
+            return Response(b"\0\0\0\x05xxxxx", mimetype=BLOCKS_CONTENT_TYPE)
+        start = int(request.args.get("from_index", 0))
+        end = min(self.chain.length(), start + int(request.args.get("limit", self.chain.length())))
+        lines = "".join(json.dumps(self.chain.get_block(i).to_dict()) + "\n" for i in range(start, end))
+        return Response(lines, mimetype="application/x-ndjson")
+
+    def close(self):
+        self._server.shutdown()
+
+def test_startup_sync_skips_a_peer_that_sends_corrupted_blocks(node, monkeypatch):
+    good = Blockchain()
+    assert good.append_suffix(0, [node.blockchain.get_block(i) for i in range(1, node.blockchain.length())])[0]
+    for i in range(3):
+        good.add_block(f"em falta {i}")
+    # O nó corrompido anuncia a cadeia mais longa, pelo que é o primeiro a ser tentado
+    bad = Blockchain()
+    for i in range(good.length() + 5):
+        bad.add_block(f"corrompido {i}")
+    peers = [PeerServer(bad, corrupt=True), PeerServer(good)]
+    try:
+        monkeypatch.setattr(node.zk_coordinator, "wait_until_ready", lambda *args, **kwargs: True)
+        monkeypatch.setattr(node.zk_coordinator, "get_active_node_addresses", lambda: [peer.address for peer in peers])
+        node.synchronize_blockchain_on_startup()
+        assert node.blockchain.get_head()["hash"] == good.get_head()["hash"]
+    finally:
+        for peer in peers:
+            peer.close()
@@ -0,0 +1,40 @@
+import threading
+from blockchain import Blockchain
+
+def test_concurrent_writers_build_one_valid_chain():
+    chain = Blockchain()
+    blocks = []
+
+    def write(worker):
+        for i in range(50):
+            blocks.append(chain.add_block(f"{worker}-{i}"))
+
+    threads = [threading.Thread(target=write, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert chain.length() == 401
+    assert sorted(block.index for block in blocks) == list(range(1, 401))
+    assert Blockchain.is_chain_valid([chain.get_block(i) for i in range(chain.length())])
+
+def test_snapshot_survives_a_fork():
+    leader = Blockchain()
+    for document in ("a", "b", "c"):
+        leader.add_block(document)
+    follower = Blockchain()
+    follower.add_replicated_block(leader.get_block(1))
+    local = follower.add_block("local")
+
+    before = follower.snapshot()
+    assert follower.append_suffix(1, [leader.get_block(i).to_dict() for i in (2, 3)])[0]
+    assert len(before) == 3 and before.tip.hash == local.hash
+    assert before.chain[2].hash == local.hash
+    after = follower.snapshot()
+    assert len(after) == 4 and after.chain[2].hash == leader.get_block(2).hash
+
+def test_wait_for_index():
+    chain = Blockchain()
+    assert not chain.wait_for_index(1, 0.05)
+    threading.Timer(0.05, chain.add_block, ["atrasado"]).start()
+    assert chain.wait_for_index(1, 5)
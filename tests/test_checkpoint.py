@@ -0,0 +1,104 @@
+import json
+import threading
+import pytest
+from flask import Flask, Response
+from werkzeug.serving import make_server
+from blockchain import Blockchain, document_leaf
+from checkpoint import CheckpointManager, InvalidCheckpoint
+from test_membership import wait_until
+
+def make_chain(documents):
+    chain = Blockchain()
+    for i in range(0, documents, 10):
+        chain.add_batch_block([f"doc {j}" for j in range(i, i + 10)], epoch=1)
+    return chain
+
+def test_checkpoint_stays_compact_as_the_chain_grows():
+    sizes = []
+    for documents in (10, 1000):
+        manager = CheckpointManager(make_chain(documents), "segredo", "no1:5000")
+        manager.create()
+        sizes.append(len(manager.latest_bytes()))
+        assert len(manager.latest_document_index()[1]) > documents * 64
+    # Só o bloco do topo (com os seus documentos) e o digest do índice: não cresce com a cadeia
+    assert sizes[1] - sizes[0] < 100
+
+def test_bootstrap_from_a_verified_checkpoint(tmp_path):
+    leader = make_chain(50)
+    source = CheckpointManager(leader, "segredo", "no1:5000")
+    checkpoint = source.create()
+    _, document_index_bytes = source.latest_document_index()
+
+    follower = Blockchain()
+    manager = CheckpointManager(follower, "segredo", "no2:5000", path=str(tmp_path / "checkpoint.json"))
+    block = manager.verify(json.loads(source.latest_bytes()))
+    document_index = manager.verify_document_index(checkpoint, document_index_bytes)
+    assert follower.bootstrap(block, document_index)[0]
+    manager.adopt(checkpoint, document_index_bytes)
+
+    assert follower.base_index == follower.length() - 1 == leader.length() - 1
+    assert follower.find_document(document_leaf("doc 7"))["block_index"] == 1
+    reloaded = CheckpointManager(Blockchain(), "segredo", "no2:5000", path=str(tmp_path / "checkpoint.json"))
+    assert reloaded.load()["index"] == checkpoint["index"]
+
+def test_forged_checkpoints_are_rejected():
+    source = CheckpointManager(make_chain(20), "segredo", "no1:5000")
+    checkpoint = source.create()
+    _, document_index_bytes = source.latest_document_index()
+    with pytest.raises(InvalidCheckpoint):
+        CheckpointManager(Blockchain(), "outro segredo", "no2:5000").verify(checkpoint)
+    with pytest.raises(InvalidCheckpoint):
+        source.verify(dict(checkpoint, hash="00" * 32))
+    forged_index = json.loads(document_index_bytes)
+    forged_index["entries"][document_leaf("falso")] = [1, 0]
+    with pytest.raises(InvalidCheckpoint):
+        source.verify_document_index(checkpoint, json.dumps(forged_index).encode())
+
+def test_checkpoints_are_disabled_without_a_secret():
+    for secret in (None, ""):
+        assert not CheckpointManager(Blockchain(), secret, "no1:5000").enabled
+
+@pytest.fixture
+def leader_snapshots():
+    """Serve em HTTP o /snapshot e o /snapshot/document_index de um CheckpointManager (o do líder)."""
+    servers = []
+
+    def serve(manager):
+        app = Flask(__name__)
+        app.add_url_rule("/snapshot", "snapshot", lambda: Response(manager.latest_bytes(), mimetype="application/json")
+                         if manager.latest else Response(status=404))
+        app.add_url_rule("/snapshot/document_index", "document_index", lambda: Response(manager.latest_document_index()[1]))
+        servers.append(make_server("127.0.0.1", 0, app, threaded=True))
+        threading.Thread(target=servers[-1].serve_forever, daemon=True).start()
+        return f"127.0.0.1:{servers[-1].server_port}"
+    yield serve
+    for server in servers:
+        server.shutdown()
+
+def test_followers_adopt_the_leader_checkpoint_instead_of_creating_one(leader_snapshots):
+    leader = make_chain(50)
+    source = CheckpointManager(leader, "segredo", "no1:5000", every=5)
+    address = leader_snapshots(source)
+    follower = Blockchain()
+    manager = CheckpointManager(follower, "segredo", "no2:5000", every=5, is_leader=lambda: False,
+                                get_leader_address=lambda: address, fetch_attempts=10, retry_interval=0.05)
+    follower.add_block_listener(manager.on_block)
+    for i in range(1, leader.length()):
+        assert follower.add_replicated_block(leader.get_block(i))[0]
+    # O seguidor chegou ao bloco 5 mas não cria o checkpoint: espera pelo do líder
+    assert manager.latest is None
+    source.create()
+    wait_until(lambda: manager.latest is not None)
+    assert manager.latest["created_by"] == "no1:5000" and manager.latest["index"] == 5
+    assert manager.latest_document_index()[1] == source.latest_document_index()[1]
+
+def test_follower_refuses_a_leader_checkpoint_from_another_chain(leader_snapshots):
+    source = CheckpointManager(make_chain(50), "segredo", "no1:5000", every=5)
+    source.create()
+    address = leader_snapshots(source)
+    manager = CheckpointManager(make_chain(60), "segredo", "no2:5000", every=5, is_leader=lambda: False,
+                                get_leader_address=lambda: address, fetch_attempts=1)
+    assert manager.follow_leader(5) is None and manager.latest is None
+    # Sem líder conhecido, um seguidor nunca cria checkpoints
+    manager.get_leader_address = lambda: None
+    assert manager.follow_leader(5) is None and manager.latest is None
@@ -0,0 +1,16 @@
+import os
+import sys
+import json
+import subprocess
+from conftest import ROOT
+
+def test_new_node_syncs_the_whole_chain(tmp_path):
+    output = tmp_path / "cluster.json"
+    subprocess.run(
+        [sys.executable, os.path.join(ROOT, "benchmarks", "cluster_bench.py"), "--nodes", "2", "--clients", "4",
+         "--requests", "40", "--sync-lengths", "60,120", "--output", str(output)],
+        cwd=tmp_path, check=True, capture_output=True, timeout=120
+    )
+    results = json.loads(output.read_text())
+    assert results["register"]["errors"] == 0
+    assert [(run["chain_length"], run["synced_length"]) for run in results["sync"]] == [(60, 60), (120, 120)]
@@ -0,0 +1,47 @@
+import threading
+import pytest
+from blockchain import Blockchain
+from consistency import commit_token, parse_min_index, commit_state, wait_for_commit, COMMITTED, BEHIND, DIVERGED
+
+def test_parse_min_index():
+    assert parse_min_index({"min_index": "3"}) == (3, None)
+    assert parse_min_index({"min_index": "3", "min_hash": "a" * 64}) == (3, "a" * 64)
+    for args in ({"min_index": "x"}, {"min_index": "-1"}, {"min_index": "1", "min_hash": "xyz"}):
+        with pytest.raises(ValueError):
+            parse_min_index(args)
+
+def test_commit_state():
+    chain = Blockchain()
+    block = chain.add_block("escritura")
+    token = commit_token(block)
+    assert token == {"index": 1, "hash": block.hash}
+    assert commit_state(chain, 1, block.hash) == COMMITTED
+    assert commit_state(chain, 1) == COMMITTED
+    assert commit_state(chain, 2) == BEHIND
+    assert commit_state(chain, 1, "0" * 64) == DIVERGED
+
+def test_wait_for_commit():
+    chain = Blockchain()
+    assert wait_for_commit(chain, 1, timeout=0.05) == (BEHIND, True)
+    assert wait_for_commit(chain, 0, timeout=1) == (COMMITTED, False)
+    threading.Timer(0.05, chain.add_block, ["replicado"]).start()
+    assert wait_for_commit(chain, 1, timeout=5) == (COMMITTED, True)
+
+def test_min_index_reads(client, node, monkeypatch):
+    token = client.post("/register", json={"document": "ler o que escrevi"}).get_json()["commit_token"]
+    assert client.get(f"/blockchain/head?min_index={token['index']}&min_hash={token['hash']}").status_code == 200
+    assert client.get("/blockchain/head?min_index=abc").status_code == 400
+    # No líder, um token de outra cadeia não pode ser servido
+    assert client.get(f"/blockchain/head?min_index={token['index']}&min_hash={'0' * 64}").status_code == 409
+
+    monkeypatch.setattr(node, "READ_WAIT_MS", 10)
+    monkeypatch.setattr(node.zk_coordinator, "is_leader", False)
+    ahead = node.blockchain.length() + 5
+    monkeypatch.setattr(node.zk_coordinator, "get_leader_address", lambda: "lider:5000")
+    response = client.get(f"/blockchain/head?min_index={ahead}")
+    assert response.status_code == 307
+    assert response.headers["Location"] == f"http://lider:5000/blockchain/head?min_index={ahead}"
+
+    monkeypatch.setattr(node, "READ_REDIRECT_TO_LEADER", False)
+    response = client.get(f"/blockchain/head?min_index={ahead}")
+    assert response.status_code == 503 and response.headers["Retry-After"] == "1"
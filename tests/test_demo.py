@@ -0,0 +1,56 @@
+import functools
+from urllib.parse import urlsplit
+import pytest
+import demo
+from demo import CartorioDigitalDemo
+
+class ClientResponse:
+    """Resposta do cliente de teste do Flask com a interface de requests usada pelo demo."""
+    def __init__(self, response):
+        self.status_code = response.status_code
+        self.content = response.data
+        self.text = response.get_data(as_text=True)
+        self._json = response.get_json()
+
+    def json(self):
+        return self._json
+
+@pytest.fixture
+def light_client(client, node, monkeypatch):
+    """O demo a falar com o nó de teste, que envia no máximo 2 cabeçalhos por prova."""
+    calls = []
+
+    def get(url, params=None, timeout=None):
+        parts = urlsplit(url)
+        calls.append(parts.path)
+        return ClientResponse(client.get(parts.path, query_string=params))
+    monkeypatch.setattr(demo.requests, "get", get)
+    monkeypatch.setattr(node.blockchain, "get_proof", functools.partial(type(node.blockchain).get_proof, node.blockchain, max_headers=2))
+    cliente = CartorioDigitalDemo.__new__(CartorioDigitalDemo)
+    cliente.nodes_urls = ["http://no1:5000"]
+    cliente.cores = dict.fromkeys(("titulo", "sucesso", "erro", "aviso", "info", "destaque"), "")
+    return cliente, calls
+
+def test_proof_headers_are_fetched_until_the_tip(client, light_client):
+    cliente, calls = light_client
+    client.post("/register", json={"document": "escritura com prova"})
+    for i in range(5):
+        client.post("/register", json={"document": f"posterior {i}"})
+    assert cliente.verificar_prova_documento("escritura com prova")
+    # A prova inicial e duas continuações (2 + 2 + 1 cabeçalhos)
+    assert len([path for path in calls if path.startswith("/proof/")]) == 3
+
+def test_incomplete_proof_is_reported_as_unverified(client, light_client, monkeypatch):
+    cliente, calls = light_client
+    client.post("/register", json={"document": "escritura sem continuação"})
+    for i in range(3):
+        client.post("/register", json={"document": f"seguinte {i}"})
+    get = demo.requests.get
+
+    def without_continuations(url, **kwargs):
+        # Só a primeira prova é servida: o nó deixa de responder às continuações
+        if "/proof/" in url and any(path.startswith("/proof/") for path in calls):
+            return ClientResponse(client.get("/proof/999999/0"))
+        return get(url, **kwargs)
+    monkeypatch.setattr(demo.requests, "get", without_continuations)
+    assert not cliente.verificar_prova_documento("escritura sem continuação")
@@ -0,0 +1,32 @@
+from blockchain import Blockchain, document_leaf
+from document_index import DocumentIndex
+
+def test_documents_are_found_at_their_first_registration():
+    chain = Blockchain()
+    first = chain.add_block("escritura")
+    batch = chain.add_batch_block(["procuração", "escritura"])
+    assert chain.find_document(document_leaf("escritura")) == {"block_index": first.index, "position": 0, "block_hash": first.hash}
+    assert chain.find_document(document_leaf("procuração"))["block_index"] == batch.index
+    assert chain.find_document(document_leaf("inexistente")) is None
+
+def test_index_resumes_from_a_compatible_snapshot(tmp_path):
+    path = str(tmp_path / "doc_index.json")
+    chain = Blockchain(document_index=DocumentIndex(snapshot_path=path, snapshot_every=2))
+    for i in range(5):
+        chain.add_block(f"documento {i}")
+    chain.find_document(document_leaf("documento 0"))
+    chain.add_block("documento 5")
+    assert DocumentIndex(snapshot_path=path).read_snapshot()["tip_index"] >= 4
+
+    index = DocumentIndex(snapshot_path=path)
+    copy = Blockchain(document_index=index)
+    copy.replace_chain([chain.get_block(i).to_dict() for i in range(chain.length())])
+    assert copy.find_document(document_leaf("documento 5"))["block_index"] == 6
+    assert len(index) == 6
+
+def test_verify_endpoint(client):
+    client.post("/register", json={"document": "certidão"})
+    response = client.get(f"/verify/{document_leaf('certidão').upper()}")
+    assert response.status_code == 200 and response.get_json()["registered"] is True
+    assert client.get(f"/verify/{document_leaf('nunca registado')}").status_code == 404
+    assert client.get("/verify/abc").status_code == 400
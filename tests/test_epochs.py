@@ -0,0 +1,108 @@
+import threading
+import pytest
+from blockchain import Blockchain, Block
+from replication import SyncReceiver, ReplicationManager
+from zk_utils import ZooKeeperCoordinator
+from demo import CartorioDigitalDemo
+from fake_zk import FakeZooKeeper
+from test_membership import wait_until
+from follower_server import FollowerServer
+
+@pytest.mark.parametrize("epoch", [0, 3])
+def test_light_client_header_hash_matches_block(epoch):
+    chain = Blockchain()
+    for block in (chain.add_block("contrato", epoch=epoch), chain.add_block({"anchor": {}}, epoch=epoch)):
+        assert CartorioDigitalDemo.hash_cabecalho(block.header_dict()) == block.hash
+
+def test_epoch_is_part_of_the_hash():
+    block = Blockchain().add_block("contrato", epoch=3)
+    block_dict = block.to_dict()
+    block_dict["epoch"] = 4
+    assert not Block.from_dict(block_dict).has_valid_hash()
+
+def test_stale_epoch_block_is_rejected():
+    leader = Blockchain()
+    leader.add_block("novo líder", epoch=2)
+    stale = Block(2, leader.get_block(1).timestamp, "líder antigo", leader.get_block(1).hash_bytes, epoch=1)
+    assert leader.add_replicated_block(stale) == (False, "Época do líder obsoleta (1 < 2)")
+
+def test_failover_elects_a_new_leader_with_a_higher_epoch():
+    server = FakeZooKeeper()
+    first = ZooKeeperCoordinator("n1:5000", zk=server.client())
+    threading.Thread(target=first.run_leader_election, daemon=True).start()
+    wait_until(lambda: first.is_leader)
+    second = ZooKeeperCoordinator("n2:5000", zk=server.client())
+    threading.Thread(target=second.run_leader_election, daemon=True).start()
+    wait_until(lambda: second.get_leader_address() == "n1:5000")
+    assert not second.is_leader and second.leader_epoch == first.epoch
+    deposed_epoch = first.epoch
+
+    first.zk.expire()
+    wait_until(lambda: second.is_leader)
+    assert second.epoch > deposed_epoch
+    assert second.leader_epoch == second.epoch
+    wait_until(lambda: not first.is_leader)
+
+def test_sync_receiver_fences_blocks_from_a_deposed_leader():
+    leader = Blockchain()
+    old = leader.add_block("líder antigo", epoch=1)
+    follower = Blockchain()
+    result = SyncReceiver(follower).receive([old], known_epoch=2)
+    assert result["error"] == "Época do líder obsoleta" and result["tip_index"] == 0
+    assert SyncReceiver(follower).receive([old], known_epoch=1)["tip_index"] == 1
+    assert SyncReceiver(follower).receive([old], known_epoch=2, leader_epoch=1)["error"] == "Época do líder obsoleta"
+
+def failover_chain():
+    """Cadeia com dois blocos do líder da época 3 e, depois da mudança de líder, um da época 5."""
+    chain = Blockchain()
+    chain.add_block("antes 1", epoch=3)
+    chain.add_block("antes 2", epoch=3)
+    chain.add_block("depois", epoch=5)
+    return chain
+
+def test_sync_receiver_accepts_pre_failover_blocks_from_the_current_leader():
+    leader = failover_chain()
+    blocks = [leader.get_block(index) for index in (1, 2, 3)]
+    # Com o cabeçalho do novo líder ou, sem ele, pela maior época do lote
+    for leader_epoch in (5, None):
+        follower = Blockchain()
+        result = SyncReceiver(follower).receive(blocks, known_epoch=5, leader_epoch=leader_epoch)
+        assert "error" not in result and result["tip_index"] == 3
+    follower = Blockchain()
+    assert SyncReceiver(follower).receive(blocks[:1], known_epoch=5, leader_epoch=5)["tip_index"] == 1
+
+def test_sync_receiver_still_rejects_decreasing_epochs_within_the_chain():
+    leader = failover_chain()
+    follower = Blockchain()
+    receiver = SyncReceiver(follower)
+    receiver.receive([leader.get_block(1), leader.get_block(2), leader.get_block(3)], known_epoch=5, leader_epoch=5)
+    stale = Block(4, leader.get_block(3).timestamp, "época a descer", leader.get_block(3).hash_bytes, epoch=3)
+    result = receiver.receive([stale], known_epoch=5, leader_epoch=5)
+    assert result["error"] == "Bloco inválido ou fora de ordem" and result["tip_index"] == 3
+
+def test_backfill_after_failover_reaches_a_follower_that_knows_the_new_epoch():
+    leader = failover_chain()
+    follower = FollowerServer(Blockchain(), known_epoch=5)
+    # O reenvio segue em lotes de um bloco: os dois primeiros só têm blocos da época 3
+    manager = ReplicationManager("leader:5000", lambda: [follower.address], blockchain=leader,
+                                 max_backfill=1, track_lag=False, get_epoch=lambda: 5)
+    try:
+        block = leader.add_block("novo", epoch=5)
+        assert manager.replicate(block).wait(2, timeout=5) == 2
+        assert [follower.blockchain.get_block(index).hash for index in range(5)] == \
+            [leader.get_block(index).hash for index in range(5)]
+        assert set(follower.epochs) == {"5"}
+    finally:
+        follower.close()
+
+def test_deposed_leader_is_fenced_by_its_own_epoch():
+    leader = failover_chain()
+    follower = FollowerServer(Blockchain(), known_epoch=6)
+    manager = ReplicationManager("leader:5000", lambda: [follower.address], blockchain=leader,
+                                 track_lag=False, get_epoch=lambda: 5)
+    try:
+        block = leader.add_block("líder destituído", epoch=5)
+        assert manager.replicate(block).wait(2, timeout=5) == 1
+        assert follower.blockchain.length() == 1
+    finally:
+        follower.close()
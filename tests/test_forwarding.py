@@ -0,0 +1,62 @@
+import threading
+import pytest
+from flask import Flask, request, jsonify
+from werkzeug.serving import make_server
+from forwarding import LeaderProxy, LeaderUnavailable, FORWARDED_HEADER
+
+class FakeLeader:
+    """Líder em HTTP que regista os pedidos reencaminhados (ou recusa-os com 403, se já não for líder)."""
+    def __init__(self, is_leader=True):
+        self.is_leader = is_leader
+        self.received = []
+        app = Flask(__name__)
+        app.add_url_rule("/register", view_func=self._register, methods=["POST"])
+        self._server = make_server("127.0.0.1", 0, app, threaded=True)
+        self.address = f"127.0.0.1:{self._server.server_port}"
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def _register(self):
+        if not self.is_leader:
+            return jsonify({"error": "Apenas o líder pode registar documentos."}), 403
+        self.received.append((request.headers.get(FORWARDED_HEADER), request.json))
+        return jsonify({"registered": request.json["document"]}), 201
+
+    def close(self):
+        self._server.shutdown()
+
+@pytest.fixture
+def leaders():
+    servers = []
+    yield lambda **options: servers.append(FakeLeader(**options)) or servers[-1]
+    for server in servers:
+        server.close()
+
+def test_proxy_forwards_with_the_forwarded_header(leaders):
+    leader = leaders()
+    proxy = LeaderProxy("n2:5000", lambda: leader.address)
+    response = proxy.forward("/register", {"document": "escritura"})
+    assert response.status_code == 201
+    assert leader.received == [("n2:5000", {"document": "escritura"})]
+
+def test_proxy_follows_the_leader_after_a_403(leaders):
+    old, new = leaders(is_leader=False), leaders()
+    addresses = iter([old.address, new.address])
+    proxy = LeaderProxy("n2:5000", lambda: next(addresses, new.address), election_wait=2)
+    assert proxy.forward("/register", {"document": "procuração"}).status_code == 201
+    assert len(new.received) == 1
+
+def test_proxy_gives_up_without_a_leader():
+    proxy = LeaderProxy("n2:5000", lambda: None, election_wait=0.2)
+    with pytest.raises(LeaderUnavailable):
+        proxy.forward("/register", {"document": "testamento"})
+
+def test_follower_node_forwards_writes(client, node, leaders, monkeypatch):
+    leader = leaders()
+    monkeypatch.setattr(node.zk_coordinator, "is_leader", False)
+    monkeypatch.setattr(node.leader_proxy, "get_leader_address", lambda: leader.address)
+    response = client.post("/register", json={"document": "escritura"})
+    assert response.status_code == 201 and response.get_json() == {"registered": "escritura"}
+    # Um pedido que já foi reencaminhado nunca volta a sê-lo
+    response = client.post("/register", json={"document": "escritura"}, headers={FORWARDED_HEADER: "n3:5000"})
+    assert response.status_code == 403
+    assert response.get_json()["leader_hint"] == leader.address
@@ -0,0 +1,43 @@
+import time
+import threading
+from zk_utils import ZooKeeperCoordinator
+from fake_zk import FakeZooKeeper
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Condição não atingida a tempo")
+        time.sleep(0.01)
+
+def start(server, address):
+    coordinator = ZooKeeperCoordinator(address, zk=server.client())
+    threading.Thread(target=coordinator.run_leader_election, daemon=True).start()
+    assert coordinator.wait_until_ready(5)
+    return coordinator
+
+def test_membership_and_leader_come_from_the_watch_cache():
+    server = FakeZooKeeper()
+    first = start(server, "n1:5000")
+    changes = []
+    first.add_membership_listener(lambda members, version: changes.append((members, version)))
+    second = start(server, "n2:5000")
+    wait_until(lambda: first.get_active_node_addresses() == ["n1:5000", "n2:5000"])
+    assert changes[-1] == (["n1:5000", "n2:5000"], first.membership_version)
+    wait_until(lambda: second.get_leader_address() == "n1:5000")
+
+    # As leituras não vão ao ZooKeeper
+    def unavailable(*args, **kwargs):
+        raise AssertionError("Leitura ao ZooKeeper no caminho do pedido")
+    second.zk.get_children = second.zk.get = second.zk.exists = unavailable
+    assert second.get_active_node_addresses() == ["n1:5000", "n2:5000"]
+    assert second.get_leader_address() == "n1:5000"
+
+def test_departures_update_the_cache():
+    server = FakeZooKeeper()
+    first, second = start(server, "n1:5000"), start(server, "n2:5000")
+    wait_until(lambda: len(first.get_active_node_addresses()) == 2)
+    version = first.membership_version
+    second.zk.expire()
+    wait_until(lambda: first.get_active_node_addresses() == ["n1:5000"])
+    assert first.membership_version > version
@@ -0,0 +1,51 @@
+import pytest
+from blockchain import Blockchain, Block, document_leaf
+from merkle import merkle_root, merkle_path, verify_path
+
+def test_every_position_has_a_valid_path():
+    doc_hashes = [bytes.fromhex(document_leaf(f"doc {i}")) for i in range(7)]
+    root = merkle_root(doc_hashes)
+    for position, doc_hash in enumerate(doc_hashes):
+        assert verify_path(doc_hash, merkle_path(doc_hashes, position), root)
+    assert not verify_path(doc_hashes[0], merkle_path(doc_hashes, 1), root)
+
+def test_proof_links_document_to_tip():
+    chain = Blockchain()
+    block = chain.add_batch_block(["a", "b", "c"], epoch=1)
+    chain.add_block("seguinte", epoch=1)
+    proof = chain.get_proof(block.index, 1)
+    assert proof["doc_hash"] == document_leaf("b")
+    assert verify_path(bytes.fromhex(proof["doc_hash"]), proof["merkle_path"], bytes.fromhex(proof["header"]["merkle_root"]))
+    assert proof["header"]["data_hash"] == block.data_hash
+    assert [header["index"] for header in proof["headers"]] == [2]
+    assert proof["complete"]
+
+def _tampered(block, change):
+    block_dict = block.to_dict()
+    change(block_dict)
+    return Block.from_dict(block_dict)
+
+@pytest.mark.parametrize("change", [
+    lambda d: d["data"][0].update(owner="mallory"),
+    lambda d: d["data"][0].update(leaf=document_leaf("outro")),
+    lambda d: d["data"].append({"document": "d", "leaf": document_leaf("d")}),
+    lambda d: d["data"].reverse(),
+])
+def test_batch_data_cannot_be_changed(change):
+    block = Blockchain().add_batch_block(["a", "b"], epoch=1)
+    tampered = _tampered(block, change)
+    assert tampered.hash == block.hash
+    assert not tampered.has_valid_hash()
+
+def test_single_document_cannot_become_a_batch():
+    block = Blockchain().add_block("contrato", epoch=1)
+    for data in ([{"document": "contrato", "leaf": document_leaf("contrato")}], [{"document": "contrato", "forged": True}]):
+        assert not _tampered(block, lambda d: d.update(data=data)).has_valid_hash()
+
+def test_append_suffix_rejects_tampered_block():
+    leader = Blockchain()
+    block = leader.add_batch_block(["a", "b"], epoch=1)
+    follower = Blockchain()
+    assert follower.append_suffix(0, [_tampered(block, lambda d: d["data"][1].update(owner="m"))]) == (False, "Cadeia inválida")
+    assert follower.append_suffix(0, [block.to_dict()])[0]
+    assert follower.get_head()["hash"] == block.hash
@@ -0,0 +1,54 @@
+import pytest
+from metrics import Registry, Counter, Gauge, Histogram, Summary, CONTENT_TYPE
+
+def test_text_exposition_format():
+    registry = Registry()
+    failures = Counter("falhas_total", "Falhas.", ["peer"], registry=registry)
+    failures.labels('n"1').inc()
+    failures.labels('n"1').inc(2)
+    length = Gauge("comprimento", "Blocos.", registry=registry)
+    length.set_function(lambda: 42)
+    latency = Histogram("latencia_seconds", "Latência.", buckets=(0.1, 1.0), registry=registry)
+    for value in (0.05, 0.5, 5.0):
+        latency.observe(value)
+    hashes = Summary("hash_seconds", "Hashes.", registry=registry)
+    with hashes.time():
+        pass
+
+    lines = registry.render().splitlines()
+    assert '# TYPE falhas_total counter' in lines
+    assert 'falhas_total{peer="n\\"1"} 3' in lines
+    assert 'comprimento 42' in lines
+    assert [line for line in lines if line.startswith("latencia_seconds")] == [
+        'latencia_seconds_bucket{le="0.1"} 1', 'latencia_seconds_bucket{le="1.0"} 2',
+        'latencia_seconds_bucket{le="+Inf"} 3', 'latencia_seconds_count 3', 'latencia_seconds_sum 5.55'
+    ]
+    assert 'hash_seconds_count 1' in lines
+
+def test_registry_rejects_duplicates_and_bad_labels():
+    registry = Registry()
+    counter = Counter("pedidos_total", "Pedidos.", ["rota"], registry=registry)
+    with pytest.raises(ValueError):
+        Counter("pedidos_total", "Outra vez.", registry=registry)
+    with pytest.raises(ValueError):
+        counter.labels("a", "b")
+
+def test_metrics_endpoint(client, node):
+    client.post("/register", json={"document": "para as métricas"})
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == CONTENT_TYPE
+    text = response.data.decode()
+    assert f"cartorio_chain_length {node.blockchain.length()}" in text.splitlines()
+    assert "cartorio_is_leader 1" in text.splitlines()
+    assert "cartorio_block_hash_seconds_count" in text
+
+def test_status_etag_ignores_replication_timers(client, node, monkeypatch):
+    report = {"seguidor:5000": {"acked_index": 3, "lag_blocks": 0, "last_ack_s": 0.1}}
+    monkeypatch.setattr(node.replication_manager, "lag_report", lambda: {a: dict(r) for a, r in report.items()})
+    etag = client.get("/status").headers["ETag"]
+    report["seguidor:5000"]["last_ack_s"] = 2.5
+    assert client.get("/status", headers={"If-None-Match": etag}).status_code == 304
+    # Um seguidor que confirma mais blocos muda o estado
+    report["seguidor:5000"].update(acked_index=4, lag_blocks=1)
+    assert client.get("/status", headers={"If-None-Match": etag}).status_code == 200
@@ -0,0 +1,61 @@
+import time
+import threading
+from blockchain import Blockchain, document_leaf
+from partitions import PartitionSet, partition_for
+from zk_utils import ZooKeeperCoordinator
+from fake_zk import FakeZooKeeper
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Condição não atingida a tempo")
+        time.sleep(0.01)
+
+def start_node(server, address, partitions=4):
+    coordinator = ZooKeeperCoordinator(address, zk=server.client())
+    threading.Thread(target=coordinator.run_leader_election, daemon=True).start()
+    wait_until(lambda: address in coordinator.get_active_node_addresses())
+    # Sem threads de reequilíbrio: o teste chama rebalance() diretamente
+    partition_set = PartitionSet(partitions, address, coordinator, lambda partition_id: Blockchain(), rebalance_interval=3600)
+    return coordinator, partition_set
+
+def join_elections(partition_set):
+    for partition in partition_set.partitions:
+        threading.Thread(target=partition.coordinator.run_leader_election, daemon=True).start()
+
+def led(partition_set):
+    return [partition.id for partition in partition_set.partitions if partition.is_leader]
+
+def test_partition_routing_is_stable():
+    doc_hash = document_leaf("contrato")
+    assert partition_for(doc_hash, 8) == partition_for(doc_hash, 8)
+    assert partition_for(document_leaf("a"), 8, namespace="cartorio-sul") == partition_for(document_leaf("b"), 8, namespace="cartorio-sul")
+
+def test_no_resign_without_another_candidate():
+    server = FakeZooKeeper()
+    _, first = start_node(server, "n1:5000")
+    join_elections(first)
+    wait_until(lambda: len(led(first)) == 4)
+    # O segundo nó já está registado no cluster, mas ainda não entrou nas eleições das partições
+    start_node(server, "n2:5000")
+    wait_until(lambda: len(first.zk_coordinator.get_active_node_addresses()) == 2)
+    epochs = [partition.coordinator.epoch for partition in first.partitions]
+    for _ in range(3):
+        assert first.rebalance() == []
+    time.sleep(0.1)
+    assert led(first) == [0, 1, 2, 3]
+    assert [partition.coordinator.epoch for partition in first.partitions] == epochs
+
+def test_rebalance_hands_excess_partitions_to_other_candidates():
+    server = FakeZooKeeper()
+    _, first = start_node(server, "n1:5000")
+    join_elections(first)
+    wait_until(lambda: len(led(first)) == 4)
+    _, second = start_node(server, "n2:5000")
+    join_elections(second)
+    wait_until(lambda: all(len(partition.coordinator._other_candidates()) == 1 for partition in first.partitions))
+    assert [partition.id for partition in first.rebalance()] == [2, 3]
+    wait_until(lambda: led(second) == [2, 3])
+    assert led(first) == [0, 1]
+    assert first.rebalance() == [] and second.rebalance() == []
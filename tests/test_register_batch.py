@@ -0,0 +1,27 @@
+from blockchain import document_leaf
+
+def test_batch_is_sealed_in_one_block_with_merkle_leaves(client, node):
+    response = client.post("/register/batch", json={"documents": ["escritura", "procuração", "testamento"]})
+    assert response.status_code == 201
+    body = response.get_json()
+    block = node.blockchain.get_block(body["block_index"])
+    assert block.hash == body["block_hash"]
+    assert [entry["document"] for entry in block.data] == ["escritura", "procuração", "testamento"]
+    assert [document["leaf"] for document in body["documents"]] == [document_leaf(d) for d in ("escritura", "procuração", "testamento")]
+    assert [document["position"] for document in body["documents"]] == [0, 1, 2]
+    assert block.has_valid_hash()
+
+def test_batch_validation(client, node):
+    assert client.post("/register/batch", json={"documents": []}).status_code == 400
+    assert client.post("/register/batch", json={"documents": ["ok", ""]}).status_code == 400
+    assert client.post("/register/batch", json={"documents": "escritura"}).status_code == 400
+    too_many = ["doc"] * (node.BATCH_MAX_SIZE + 1)
+    assert client.post("/register/batch", json={"documents": too_many}).status_code == 413
+
+def test_batch_seal_failure_is_reported(client, node, monkeypatch):
+    def fail(documents):
+        raise RuntimeError("disco cheio")
+    monkeypatch.setattr(node.group_committer, "seal", fail)
+    response = client.post("/register/batch", json={"documents": ["escritura"]})
+    assert response.status_code == 500
+    assert "disco cheio" in response.get_json()["error"]
@@ -0,0 +1,50 @@
+import time
+import pytest
+from blockchain import Blockchain
+from replication import ReplicationManager
+from follower_server import FollowerServer
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Condição não atingida a tempo")
+        time.sleep(0.01)
+
+@pytest.fixture
+def followers():
+    servers = []
+    yield lambda **options: servers.append(FollowerServer(Blockchain(), **options)) or servers[-1]
+    for server in servers:
+        server.close()
+
+def test_blocks_reach_every_follower_in_order(followers):
+    first, second = followers(), followers()
+    members = ["leader:5000", first.address, second.address]
+    leader = Blockchain()
+    manager = ReplicationManager("leader:5000", lambda: members, blockchain=leader, track_lag=False)
+    receipts = [manager.replicate(leader.add_block(f"documento {i}")) for i in range(20)]
+
+    for receipt in receipts:
+        assert receipt.wait(3, timeout=5) == 3
+    for follower in (first, second):
+        assert [follower.blockchain.get_block(i).hash for i in range(21)] == [leader.get_block(i).hash for i in range(21)]
+        sent = [index for _, indexes in follower.requests for index in indexes]
+        assert sent == sorted(sent)
+    assert {report["acked_index"] for report in manager.lag_report().values()} == {20}
+
+    # Um seguidor que sai do cluster deixa de ser replicado
+    members.remove(second.address)
+    manager.on_membership_change(members, 2)
+    receipt = manager.replicate(leader.add_block("depois da saída"))
+    assert receipt.followers == 1
+    assert receipt.wait(2, timeout=5) == 2
+    assert second.blockchain.length() == 21
+
+def test_follower_without_binary_support_gets_json(followers):
+    follower = followers(binary=False)
+    leader = Blockchain()
+    manager = ReplicationManager("leader:5000", lambda: [follower.address], blockchain=leader, track_lag=False)
+    assert manager.replicate(leader.add_block("escritura")).wait(2, timeout=5) == 2
+    assert follower.requests == [("application/json", [1])]
+    assert follower.blockchain.get_block(1).hash == leader.get_block(1).hash
@@ -0,0 +1,67 @@
+import json
+from blockchain import Blockchain
+from segment_cache import SegmentCache
+from metrics import SEGMENT_CACHE_LOOKUPS
+
+def lookups():
+    return SEGMENT_CACHE_LOOKUPS.labels("hit").value, SEGMENT_CACHE_LOOKUPS.labels("miss").value
+
+def cached_chain(count, **options):
+    chain = Blockchain()
+    cache = SegmentCache(**options)
+    chain.add_block_listener(cache.on_block)
+    chain.add_fork_listener(cache.on_fork)
+    for i in range(count):
+        chain.add_block(f"documento {i}")
+    return chain, cache
+
+def read(cache, chain, from_index=0, end=None):
+    snapshot = chain.snapshot()
+    end = len(snapshot) if end is None else end
+    return [json.loads(item)["index"] for items in cache.iter_range(snapshot, from_index, end, "json") for item in items]
+
+def test_ranges_are_served_from_aligned_segments():
+    chain, cache = cached_chain(10, segment_size=4)
+    assert read(cache, chain, 3, 9) == list(range(3, 9))
+    hits, misses = lookups()
+    assert read(cache, chain, 0, 11) == list(range(11))
+    # O segmento do topo também ficou em cache, completo até ao topo da vista
+    assert lookups() == (hits + 3, misses)
+
+def test_new_block_invalidates_only_the_tip_segment():
+    chain, cache = cached_chain(5, segment_size=4)
+    read(cache, chain)
+    chain.add_block("novo")
+    hits, misses = lookups()
+    assert read(cache, chain) == list(range(7))
+    assert lookups() == (hits + 1, misses + 1)
+
+def test_fork_invalidates_segments_from_the_fork_point():
+    leader = Blockchain()
+    for i in range(8):
+        leader.add_block(f"líder {i}")
+    follower, cache = cached_chain(0, segment_size=4)
+    for i in range(1, 6):
+        follower.add_replicated_block(leader.get_block(i))
+    follower.add_block("local")
+    read(cache, follower)
+    assert follower.append_suffix(5, [leader.get_block(i).to_dict() for i in range(6, 9)])[0]
+    snapshot = follower.snapshot()
+    items = [json.loads(item) for items in cache.iter_range(snapshot, 0, len(snapshot), "json") for item in items]
+    assert [item["hash"] for item in items] == [leader.get_block(i).hash for i in range(9)]
+
+def test_least_recently_used_segments_are_evicted():
+    chain, cache = cached_chain(40, segment_size=4, max_bytes=2000)
+    read(cache, chain)
+    assert cache._bytes <= 2000
+    assert read(cache, chain) == list(range(41))
+
+def test_etags_and_conditional_gets(client):
+    client.post("/register", json={"document": "versão 1"})
+    response = client.get("/blockchain?from_index=1")
+    etag = response.headers["ETag"]
+    assert client.get("/blockchain?from_index=1", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/blockchain?from_index=1&format=ndjson", headers={"If-None-Match": etag}).status_code == 200
+    client.post("/register", json={"document": "versão 2"})
+    response = client.get("/blockchain?from_index=1", headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.headers["ETag"] != etag
@@ -0,0 +1,100 @@
+import os
+import threading
+import pytest
+from storage import BlockStore, StoredChain
+from blockchain import Blockchain, document_leaf
+
+class SmallIndexStore(BlockStore):
+    # O índice cresce de 8 em 8 entradas, para exercitar o remapeamento
+    INDEX_GROWTH = 8
+
+def payload(i):
+    return f"bloco {i}".encode() * (1 + i % 3)
+
+def test_blocks_survive_reopening(tmp_path):
+    store = SmallIndexStore(str(tmp_path), segment_size=64)
+    for i in range(30):
+        assert store.append(payload(i)) == i
+    store.commit()
+    store.close()
+    reopened = SmallIndexStore(str(tmp_path), segment_size=64)
+    assert reopened.count == 30
+    assert [reopened.read(i) for i in range(30)] == [payload(i) for i in range(30)]
+    assert len([name for name in os.listdir(tmp_path) if name.startswith("segment-")]) > 1
+
+def test_torn_tail_is_discarded_on_recovery(tmp_path):
+    store = BlockStore(str(tmp_path))
+    for i in range(5):
+        store.append(payload(i))
+    store.commit()
+    store.close()
+    segment = os.path.join(tmp_path, "segment-00000000.log")
+    # Uma falha a meio da escrita do último registo deixa-o incompleto
+    os.truncate(segment, os.path.getsize(segment) - 3)
+    recovered = BlockStore(str(tmp_path))
+    assert recovered.count == 4
+    assert recovered.read(3) == payload(3)
+    assert recovered.append(b"seguinte") == 4
+    assert recovered.read(4) == b"seguinte"
+
+def test_records_missing_from_the_index_are_reindexed(tmp_path):
+    store = BlockStore(str(tmp_path))
+    for i in range(3):
+        store.append(payload(i))
+    store.commit()
+    store.close()
+    # O índice perdeu a última entrada (falha entre a escrita no log e no índice)
+    with open(os.path.join(tmp_path, "index.bin"), "r+b") as f:
+        f.seek(2 * BlockStore.INDEX_ENTRY.size)
+        f.write(bytes(BlockStore.INDEX_ENTRY.size))
+    recovered = BlockStore(str(tmp_path))
+    assert recovered.count == 3
+    assert recovered.read(2) == payload(2)
+
+def test_truncate_then_append(tmp_path):
+    store = BlockStore(str(tmp_path))
+    for i in range(10):
+        store.append(payload(i))
+    store.truncate(4)
+    assert store.count == 4
+    with pytest.raises(IndexError):
+        store.read(4)
+    store.append(b"novo")
+    assert store.read(4) == b"novo"
+
+def test_reads_are_safe_while_the_index_grows(tmp_path):
+    store = SmallIndexStore(str(tmp_path), fsync_policy="interval")
+    store.append(payload(0))
+    errors, done = [], threading.Event()
+
+    def reader():
+        while not done.is_set():
+            try:
+                count = store.count
+                for i in range(max(0, count - 16), count):
+                    assert store.read(i) == payload(i)
+            except Exception as e:
+                errors.append(e)
+                return
+
+    threads = [threading.Thread(target=reader) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for i in range(1, 600):
+        store.append(payload(i))
+    done.set()
+    for thread in threads:
+        thread.join()
+    store.close()
+    assert errors == []
+
+def test_stored_chain_reopens_blockchain(tmp_path):
+    chain = Blockchain(store=BlockStore(str(tmp_path)))
+    chain.add_batch_block(["a", "b"], epoch=1)
+    chain.add_block("c", epoch=1)
+    head = chain.get_head()
+    chain.chain.store.close()
+    reopened = Blockchain(store=BlockStore(str(tmp_path)))
+    assert isinstance(reopened.chain, StoredChain)
+    assert reopened.get_head() == head
+    assert reopened.find_document(document_leaf("b"))["block_index"] == 1
@@ -0,0 +1,69 @@
+import pytest
+from blockchain import Blockchain
+from replication import SyncReceiver, ReplicationManager, backfill_payload
+from follower_server import FollowerServer
+
+@pytest.fixture
+def leader():
+    chain = Blockchain()
+    for i in range(6):
+        chain.add_block(f"documento {i}")
+    return chain
+
+def blocks(chain, *indexes):
+    return [chain.get_block(i) for i in indexes]
+
+def test_out_of_order_blocks_wait_for_the_gap(leader):
+    receiver = SyncReceiver(Blockchain())
+    result = receiver.receive(blocks(leader, 3, 4), known_epoch=0)
+    assert result == {"applied": 0, "tip_index": 0, "buffered": 2, "error": "Lacuna: falta o bloco 1"}
+    result = receiver.receive(blocks(leader, 1, 2), known_epoch=0)
+    assert result == {"applied": 2, "tip_index": 4, "buffered": 0}
+    assert receiver.blockchain.get_block(4).hash == leader.get_block(4).hash
+
+def test_resends_are_accepted_and_divergent_blocks_refused(leader):
+    receiver = SyncReceiver(Blockchain())
+    receiver.receive(blocks(leader, 1, 2), known_epoch=0)
+    assert receiver.receive(blocks(leader, 1, 2, 3), known_epoch=0) == {"applied": 3, "tip_index": 3, "buffered": 0}
+
+    other = Blockchain()
+    other.add_block("outro documento")
+    result = receiver.receive(blocks(other, 1), known_epoch=0)
+    assert result["error"] == "Bloco inválido ou fora de ordem" and result["tip_index"] == 3
+
+def test_blocks_beyond_the_buffer_are_refused(leader):
+    receiver = SyncReceiver(Blockchain(), buffer_size=2)
+    result = receiver.receive(blocks(leader, 4), known_epoch=0)
+    assert result["error"] == "Lacuna: falta o bloco 1" and result["buffered"] == 0
+
+def test_backfill_payload(leader):
+    batch = blocks(leader, 5, 6)
+    assert [b.index for b in backfill_payload(leader, batch, 2, False, 10)] == [3, 4, 5, 6]
+    # O seguidor guardou o lote: só segue a lacuna
+    assert [b.index for b in backfill_payload(leader, batch, 2, True, 10)] == [3, 4]
+    assert [b.index for b in backfill_payload(leader, batch, 2, False, 1)] == [3]
+    assert [b.index for b in backfill_payload(leader, batch, 5, False, 10)] == [6]
+    assert backfill_payload(leader, batch, 6, False, 10) == []
+
+def test_lagging_follower_is_backfilled(leader):
+    follower = FollowerServer(Blockchain())
+    try:
+        manager = ReplicationManager("leader:5000", lambda: [follower.address], blockchain=leader, track_lag=False)
+        receipt = manager.replicate(leader.add_block("novo"))
+        assert receipt.wait(2, timeout=5) == 2
+        assert follower.blockchain.length() == leader.length()
+        assert manager.lag_report()[follower.address]["lag_blocks"] == 0
+    finally:
+        follower.close()
+
+def test_gap_is_filled_with_blocks_from_before_a_failover():
+    leader = Blockchain()
+    for epoch in (3, 3, 5, 5):
+        leader.add_block(f"época {epoch}", epoch=epoch)
+    receiver = SyncReceiver(Blockchain())
+    # Os blocos do novo líder ficam à espera; o reenvio dos da época 3 preenche a lacuna e liberta-os
+    result = receiver.receive(blocks(leader, 3, 4), known_epoch=5, leader_epoch=5)
+    assert result["buffered"] == 2 and result["tip_index"] == 0
+    result = receiver.receive(blocks(leader, 1, 2), known_epoch=5, leader_epoch=5)
+    assert result == {"applied": 2, "tip_index": 4, "buffered": 0}
+    assert receiver.blockchain.get_block(4).hash == leader.get_block(4).hash
@@ -0,0 +1,69 @@
+import os
+import sys
+import subprocess
+import threading
+from conftest import ROOT
+from blockchain import Block, Blockchain
+from validation import ChainValidator
+
+def make_blocks(count):
+    genesis = Blockchain().create_genesis_block()
+    blocks = [genesis]
+    for i in range(1, count + 1):
+        blocks.append(Block(i, blocks[-1].timestamp_us + 1, f"doc {i}", blocks[-1].hash_bytes, epoch=1))
+    return blocks
+
+def tamper(block):
+    block.data_bytes = b'"alterado"'
+
+def test_serial_validation_reports_first_bad_block():
+    blocks = make_blocks(20)
+    validator = ChainValidator(workers=1)
+    assert validator.find_invalid(blocks[0], blocks[1:]) is None
+    tamper(blocks[12])
+    assert validator.find_invalid(blocks[0], blocks[1:]) == 12
+    blocks[5].epoch = 0
+    assert validator.find_invalid(blocks[0], blocks[1:]) == 5
+
+def test_pool_is_not_forked_from_a_threaded_process():
+    stop = threading.Event()
+    thread = threading.Thread(target=stop.wait)
+    thread.start()
+    try:
+        validator = ChainValidator(workers=2)
+        assert not validator.start()
+        assert validator.find_invalid(make_blocks(1)[0], make_blocks(1)[1:]) is None
+    finally:
+        stop.set()
+        thread.join()
+
+# Corre num processo novo, sem threads, onde o pool pode ser criado
+POOL_SCRIPT = """
+import os, signal, time
+from test_validation import make_blocks, tamper
+from validation import ChainValidator
+
+validator = ChainValidator(workers=2, chunk_size=16, parallel_threshold=32)
+assert validator.start()
+blocks = make_blocks(200)
+assert validator.find_invalid(blocks[0], blocks[1:]) is None
+tamper(blocks[150])
+assert validator.find_invalid(blocks[0], blocks[1:]) == 150
+
+# Um processo do pool que morre não pode deixar a validação pendurada: passa a ser em série
+process = next(iter(validator._pool._processes.values()))
+os.kill(process.pid, signal.SIGKILL)
+process.join()
+deadline = time.monotonic() + 10
+while not validator._pool._broken and time.monotonic() < deadline:
+    time.sleep(0.01)
+assert validator.find_invalid(blocks[0], blocks[1:]) == 150
+assert validator._pool is None
+print("ok")
+"""
+
+def test_parallel_validation_and_fallback_when_the_pool_breaks():
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([os.path.join(ROOT, "app"), os.path.dirname(__file__)]))
+    result = subprocess.run([sys.executable, "-c", POOL_SCRIPT], env=env, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "ok"
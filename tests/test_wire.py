@@ -0,0 +1,60 @@
+import zlib
+import pytest
+from blockchain import Blockchain
+from wire import (
+    BlockDecoder, BodyTooLarge, encode_blocks, encode_stream, encode_sync_body, decode_blocks, decode_sync_body,
+    compress, decompress, compress_stream, decompress_stream, choose_encoding, ENCODINGS
+)
+
+def make_blocks(count=20):
+    chain = Blockchain()
+    for i in range(count):
+        chain.add_block(f"documento {i}" * 50, epoch=1)
+    return [chain.get_block(i) for i in range(chain.length())]
+
+def test_sync_body_round_trip_with_and_without_compression():
+    blocks = make_blocks()
+    for compress_min_bytes in (0, 10 ** 9):
+        body, headers = encode_sync_body(blocks, compress_min_bytes=compress_min_bytes)
+        decoded = decode_sync_body(body, headers.get("Content-Encoding"))
+        assert [block.to_dict() for block in decoded] == [block.to_dict() for block in blocks]
+    assert headers.get("Content-Encoding") is None
+
+def test_decoder_accepts_arbitrary_chunks_and_detects_truncation():
+    blocks = make_blocks(5)
+    payload = encode_blocks(blocks)
+    decoder, decoded = BlockDecoder(), []
+    for offset in range(0, len(payload), 7):
+        decoded += decoder.feed(payload[offset:offset + 7])
+    decoder.close()
+    assert [block.hash for block in decoded] == [block.hash for block in blocks]
+    with pytest.raises(ValueError):
+        decode_blocks(payload[:-1])
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_compressed_stream_round_trip(encoding):
+    blocks = make_blocks()
+    chunks = compress_stream(encode_stream(blocks, chunk_size=512), encoding)
+    assert b"".join(decompress_stream(chunks, encoding)) == encode_blocks(blocks)
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_decompress_rejects_output_above_the_limit(encoding):
+    bomb = compress(b"\0" * (8 * 1024 * 1024), encoding)
+    assert len(bomb) < 64 * 1024
+    with pytest.raises(BodyTooLarge):
+        decompress(bomb, encoding, max_length=1024 * 1024)
+    assert decompress(compress(b"x" * 1000, encoding), encoding, max_length=1000) == b"x" * 1000
+
+def test_sync_body_limit_applies_to_compressed_and_plain_bodies():
+    body = encode_blocks(make_blocks())
+    with pytest.raises(BodyTooLarge):
+        decode_sync_body(zlib.compress(body), "deflate", max_length=len(body) - 1)
+    with pytest.raises(BodyTooLarge):
+        decode_sync_body(body, None, max_length=len(body) - 1)
+    assert len(decode_sync_body(zlib.compress(body), "deflate", max_length=len(body))) == 21
+
+def test_unknown_encoding_is_rejected():
+    with pytest.raises(ValueError):
+        decode_sync_body(b"", "br")
+    assert choose_encoding("gzip, deflate;q=0.5") == "deflate"
+    assert choose_encoding(None) is None
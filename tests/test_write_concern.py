@@ -0,0 +1,80 @@
+import socket
+import threading
+import pytest
+from blockchain import Blockchain
+from replication import ReplicationReceipt, ReplicationManager
+from follower_server import FollowerServer
+
+def test_required_replicas():
+    receipt = ReplicationReceipt(1, followers=2)
+    assert [receipt.required_replicas(level) for level in ("leader", "majority", "all")] == [1, 2, 3]
+    assert ReplicationReceipt(1, followers=3).required_replicas("majority") == 3
+
+def test_quorum_uses_the_configured_replication_factor():
+    # Num cluster de 5 nós com apenas 1 seguidor vivo, a maioria continua a ser 3
+    receipt = ReplicationReceipt(1, followers=1, replication_factor=5)
+    assert [receipt.required_replicas(level) for level in ("leader", "majority", "all")] == [1, 3, 5]
+    assert ReplicationReceipt(1, followers=5, replication_factor=3).cluster_size == 6
+
+def test_wait_ends_when_every_follower_answered():
+    receipt = ReplicationReceipt(1, followers=2)
+    threading.Timer(0.05, receipt.ack, ["a"]).start()
+    threading.Timer(0.1, receipt.fail, ["b"]).start()
+    assert receipt.wait(3, timeout=10) == 2
+    assert receipt.wait(2, timeout=0) == 2
+
+def unused_address():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return f"127.0.0.1:{sock.getsockname()[1]}"
+
+@pytest.fixture
+def cluster(node, monkeypatch):
+    """Dá ao nó de teste os seguidores indicados (o líder repõe-lhes os blocos em falta)."""
+    servers = []
+
+    def with_followers(*addresses, replication_factor=None):
+        monkeypatch.setattr(node.replication_manager, "get_node_addresses", lambda: [node.NODE_ADDRESS, *addresses])
+        monkeypatch.setattr(node.replication_manager, "replication_factor", replication_factor or len(addresses) + 1)
+    yield with_followers, servers
+    for server in servers:
+        server.close()
+
+def test_register_waits_for_the_requested_write_concern(client, cluster):
+    with_followers, servers = cluster
+    servers.append(FollowerServer(Blockchain()))
+    with_followers(servers[0].address)
+    response = client.post("/register", json={"document": "escritura", "write_concern": "all", "timeout_ms": 5000})
+    assert response.status_code == 201
+    assert response.get_json()["write_concern"] == {"level": "all", "required_replicas": 2, "replicas": 2, "satisfied": True}
+
+def test_unreachable_follower_gives_202(client, cluster):
+    with_followers, _ = cluster
+    with_followers(unused_address())
+    response = client.post("/register", json={"document": "procuração", "write_concern": "majority", "timeout_ms": 200})
+    assert response.status_code == 202
+    assert response.get_json()["write_concern"]["satisfied"] is False
+
+def test_invalid_write_concern(client):
+    assert client.post("/register", json={"document": "x", "write_concern": "quorum"}).status_code == 400
+    assert client.post("/register", json={"document": "x", "timeout_ms": -1}).status_code == 400
+
+def test_quorum_does_not_shrink_when_followers_leave(client, cluster):
+    with_followers, servers = cluster
+    servers.extend(FollowerServer(Blockchain()) for _ in range(2))
+    with_followers(servers[0].address, servers[1].address, replication_factor=3)
+    response = client.post("/register", json={"document": "ata", "write_concern": "all", "timeout_ms": 5000})
+    assert response.get_json()["write_concern"] == {"level": "all", "required_replicas": 3, "replicas": 3, "satisfied": True}
+
+    # Saem os dois seguidores: a maioria do cluster de 3 nós continua a exigir 2 réplicas
+    with_followers(replication_factor=3)
+    response = client.post("/register", json={"document": "ata 2", "write_concern": "majority", "timeout_ms": 200})
+    assert response.status_code == 202
+    assert response.get_json()["write_concern"] == {"level": "majority", "required_replicas": 2, "replicas": 1, "satisfied": False}
+
+def test_replication_manager_passes_the_replication_factor_to_its_receipts():
+    leader = Blockchain()
+    manager = ReplicationManager("leader:5000", lambda: ["leader:5000"], blockchain=leader, track_lag=False, replication_factor=3)
+    receipt = manager.replicate(leader.add_block("sem seguidores"))
+    assert receipt.followers == 0 and receipt.required_replicas("majority") == 2
+    assert receipt.wait(2, timeout=0.1) == 1